@@ -8,52 +8,34 @@ import os
 import sys
 import cv2
 import torch
-import numpy as np
-import math
 import json
 import datetime
 import time
+import argparse
 import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
 try:
     from tkcalendar import Calendar
     HAS_TKCAL = True
 except Exception:
     HAS_TKCAL = False
-from ultralytics import YOLO
 from ultralytics.utils.plotting import Annotator, Colors
 from copy import deepcopy
-
-# 运动配置
-SPORT_CONFIG = {
-    'squat': {
-        'name': '深蹲',
-        'left_points_idx': [11, 13, 15],
-        'right_points_idx': [12, 14, 16],
-        'maintaining': 100,  # 更宽松：进入<100
-        'relaxing': 160,    # 更宽松：退出>160
-        'side_mode': 'avg',  # 可选: 'avg' | 'left' | 'right'
-    },
-    'pushup': {
-        'name': '俯卧撑',
-        'left_points_idx': [6, 8, 10],
-        'right_points_idx': [5, 7, 9],
-        'maintaining': 150,  # 更宽松：进入>150
-        'relaxing': 120,     # 更宽松：退出<120
-        'side_mode': 'avg',
-    },
-    'situp': {
-        'name': '仰卧起坐',
-        'left_points_idx': [6, 12, 14],
-        'right_points_idx': [5, 11, 13],
-        'maintaining': 120,  # 更宽松：进入<120
-        'relaxing': 140,     # 更宽松：退出>140
-        'side_mode': 'avg',
-    }
-}
-
+from counting import SPORT_CONFIG, RepCounter, apply_threshold_config
+from kinematics import keypoints_array, sport_angles
+from keypoint_cache import KeypointCache, KeypointRecorder, replay_keypoints
+from video_io import WRITER_POLICIES, AsyncVideoWriter, FrameGrabber, negotiate_resolution
+from pipeline import Pipeline, iter_batches, stream_predict
+from overlay import InfoPanel
+from display import DisplayBridge
+from pose_backend import BACKENDS, FIXED_SIZE_BACKENDS, load_pose_model
+from governor import LEVELS, FpsGovernor, fixed_size_levels
+from roi import RoiTracker, predict_with_roi
+from keyframe import KeyframeTracker, infer_keyframes
+from multi_person import MultiPersonCounter
+from latency import STAGES, StageLatency, draw_latency
+from sampling_profiler import SamplingProfiler
 
 class ExerciseCounterApp:
     """运动计数器主应用程序"""
@@ -68,7 +50,10 @@ class ExerciseCounterApp:
         self.is_running = False
         self.is_paused = False
         self.cap = None
+        self.grabber = None
+        self.pipeline = None
         self.model = None
+        self.model_name = None
         self.detector_model = None
         self.counter = 0
         self.fps = 0
@@ -77,6 +62,10 @@ class ExerciseCounterApp:
         self.save_results = False
         self.save_dir = None
         self.video_writer = None
+        # 录制：后台编码队列长度与队列满时的策略（block/drop/downscale）
+        self.writer_policy = 'block'
+        self.writer_queue_size = 64
+        self.writer_stats = None
 
         # 性能参数
         self.device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
@@ -84,15 +73,60 @@ class ExerciseCounterApp:
         # 在CPU上降低输入尺寸可显著提升FPS
         self.imgsz = 416 if not torch.cuda.is_available() else 640
         self.conf_thres = 0.5
+        # 自适应帧率：目标FPS（0=关闭），实时输入时按负载调节推理尺寸/步长/绘制细节
+        self.target_fps = 0
+        self.governor = None
+        self.active_governor = None
+        self.frame_index = 0
+        self.last_pose = None
+        # ROI 裁剪推理：围绕上一帧人体范围裁剪后以完整 imgsz 推理，定期/低置信度时回退全图
+        self.roi_mode = False
+        self.roi_tracker = RoiTracker()
+        # 关键帧推理：每 N 帧（或画面突变时）推理一次，中间帧用卡尔曼滤波预测关键点（1=每帧推理）
+        self.keyframe_interval = 1
+        self.keyframe_tracker = KeyframeTracker()
+        # 多人计数：跨帧稳定 ID，每人独立平滑/迟滞/计数（ROI 裁剪与关键帧预测只跟踪一人，多人模式下不启用）
+        self.multi_person = False
+        self.people_counter = MultiPersonCounter()
+        self.people_counts = {}
+        self.active_roi = False
+        self.active_keyframes = False
+        # 姿态推理后端：pytorch | onnxruntime | openvino | opencv
+        self.pose_backend = 'pytorch'
+        # 视频文件逐帧处理（不丢帧）；摄像头始终只处理最新帧
+        self.lossless_file = True
+        self.file_batch_size = 8
+        self.dropped_frames = 0
+        self.last_render_tick = None
+        # 信息面板：字体/文字贴图缓存，仅在数值变化时重新合成
+        self.info_panel = InfoPanel()
+        # 多人标签颜色（按 ID 取调色板）
+        self.colors = Colors()
+        # 界面刷新率：超过此频率的帧只编码不显示
+        self.display_fps = 60
+        # 各级延迟统计：界面面板（可保存到配置）与 F 键画面叠加（不写入录像）
+        self.latency = StageLatency()
+        self.latency_panel = False
+        self.latency_overlay = False
+        # 按需性能采样：P 键（或启动参数 --profile）采样处理线程 N 秒，结果写入会话目录
+        self.profiler = SamplingProfiler()
+        self.profile_seconds = 10
+        self.profile_on_start = False
+
+        # 关键点缓存（视频文件逐帧模式）：同一视频/模型/参数下跳过姿态推理
+        self.use_keypoint_cache = True
+        self.cache_max_mb = 2048
+        self.keypoint_cache = None
+        self.keypoint_recorder = None
+        self.cache_key = None
+        self.source_path = None
+        self.source_fps = 30.0
+        self.replay = None
+        self.replay_index = 0
         
-        # 计数状态
-        self.reaching = False
-        self.reaching_last = False
-        self.state_keep = False
-        # 去抖/平滑相关
-        self.prev_angle = None
+        # 计数状态（平滑/迟滞/去抖）
         self.min_reach_frames = 3  # 至少连续N帧处于“到位”状态才计数
-        self.reach_frames = 0
+        self.rep_counter = RepCounter(self.min_reach_frames)
         self.show_angle = False
         self.current_angle = 0.0
 
@@ -101,9 +135,14 @@ class ExerciseCounterApp:
         self.stat_labels = {}
         self.session_start_time = None
         
-        # 自动识别相关
-        self.pose_key_point_frames = []
+        # 自动识别相关：流式分类器（预分配滑动窗口，随运动识别模型一起加载）
+        self.sport_classifier = None
         self.idx_2_category = {}
+        # 识别限频与投票：每 N 帧（或动作能量突变时）识别一次，置信度加权投票，新运动需持续胜出若干帧才切换
+        self.sport_voter = None
+        self.classify_stride = 5
+        self.classify_votes = 5
+        self.classify_min_dwell = 30
 
         # 配置文件与统计默认（需在构建UI之前准备）
         self.config_path = os.path.join('config', 'thresholds.json')
@@ -126,6 +165,10 @@ class ExerciseCounterApp:
         # 创建界面
         self.create_widgets()
 
+        # 显示桥：处理线程只投递帧，Tk 主线程负责绘制
+        self.display = DisplayBridge(self.root, self.video_label, fps=self.display_fps,
+                                     on_refresh=self.update_status_display).start()
+
         # 加载模型
         self.load_models()
         
@@ -195,6 +238,33 @@ class ExerciseCounterApp:
         ttk.Label(status_frame, text="FPS:").grid(row=2, column=0, sticky=tk.W)
         self.fps_label = ttk.Label(status_frame, text="0")
         self.fps_label.grid(row=2, column=1, sticky=tk.W, padx=5)
+        ttk.Label(status_frame, text="丢帧:").grid(row=3, column=0, sticky=tk.W)
+        self.dropped_label = ttk.Label(status_frame, text="0")
+        self.dropped_label.grid(row=3, column=1, sticky=tk.W, padx=5)
+        ttk.Label(status_frame, text="自适应:").grid(row=4, column=0, sticky=tk.W)
+        self.governor_label = ttk.Label(status_frame, text="关闭")
+        self.governor_label.grid(row=4, column=1, sticky=tk.W, padx=5)
+        ttk.Label(status_frame, text="多人计数:").grid(row=5, column=0, sticky=tk.W)
+        self.people_label = ttk.Label(status_frame, text="关闭", wraplength=160)
+        self.people_label.grid(row=5, column=1, sticky=tk.W, padx=5)
+        row += 1
+
+        # 各级延迟面板（滚动窗口 P50/P95/P99，毫秒）
+        self.latency_frame = ttk.LabelFrame(control_frame, text="各级延迟 (ms)", padding="5")
+        self.latency_frame.grid(row=row, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        for col, text in enumerate(("阶段", "P50", "P95", "P99")):
+            ttk.Label(self.latency_frame, text=text, font=('Arial', 9, 'bold')).grid(row=0, column=col, sticky=tk.E if col else tk.W, padx=3)
+        self.latency_cells = {}
+        for i, (key, name) in enumerate(STAGES, start=1):
+            ttk.Label(self.latency_frame, text=name, font=('Arial', 9)).grid(row=i, column=0, sticky=tk.W, padx=3)
+            cells = [ttk.Label(self.latency_frame, text="-", font=('Arial', 9)) for _ in range(3)]
+            for col, cell in enumerate(cells, start=1):
+                cell.grid(row=i, column=col, sticky=tk.E, padx=3)
+            self.latency_cells[key] = cells
+        self.latency_group_label = ttk.Label(self.latency_frame, text="", font=('Arial', 9))
+        self.latency_group_label.grid(row=len(STAGES) + 1, column=0, columnspan=4, sticky=tk.W, padx=3)
+        if not self.latency_panel:
+            self.latency_frame.grid_remove()
         row += 1
 
         # 输入源选择
@@ -307,6 +377,44 @@ class ExerciseCounterApp:
         self.show_angle_var = tk.BooleanVar(value=self.show_angle)
         ttk.Checkbutton(settings_frame, text="显示角度/阈值", variable=self.show_angle_var,
                         command=self.on_show_angle_change).grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=5)
+        self.lossless_file_var = tk.BooleanVar(value=self.lossless_file)
+        ttk.Checkbutton(settings_frame, text="视频文件逐帧处理", variable=self.lossless_file_var,
+                        command=self.on_lossless_change).grid(row=1, column=2, columnspan=3, sticky=tk.W, pady=5)
+        self.keypoint_cache_var = tk.BooleanVar(value=self.use_keypoint_cache)
+        ttk.Checkbutton(settings_frame, text="关键点缓存", variable=self.keypoint_cache_var,
+                        command=self.on_keypoint_cache_change).grid(row=0, column=2, columnspan=3, sticky=tk.W)
+        self.roi_mode_var = tk.BooleanVar(value=self.roi_mode)
+        ttk.Checkbutton(settings_frame, text="ROI裁剪推理", variable=self.roi_mode_var,
+                        command=self.on_roi_mode_change).grid(row=6, column=3, columnspan=2, sticky=tk.W, pady=(6, 0))
+        ttk.Label(settings_frame, text="录制策略:").grid(row=5, column=0, sticky=tk.E, pady=(6, 0))
+        self.writer_policy_var = tk.StringVar(value=self.writer_policy)
+        writer_combo = ttk.Combobox(settings_frame, textvariable=self.writer_policy_var, state='readonly', width=9,
+                                    values=list(WRITER_POLICIES))
+        writer_combo.grid(row=5, column=1, sticky=tk.W, pady=(6, 0))
+        writer_combo.bind('<<ComboboxSelected>>', lambda e: self.on_writer_policy_change())
+        ttk.Label(settings_frame, text="推理后端:").grid(row=5, column=2, sticky=tk.E, pady=(6, 0))
+        self.pose_backend_var = tk.StringVar(value=self.pose_backend)
+        backend_combo = ttk.Combobox(settings_frame, textvariable=self.pose_backend_var, state='readonly', width=11,
+                                     values=list(BACKENDS))
+        backend_combo.grid(row=5, column=3, columnspan=2, sticky=tk.W, pady=(6, 0))
+        backend_combo.bind('<<ComboboxSelected>>', lambda e: self.on_pose_backend_change())
+        ttk.Label(settings_frame, text="目标FPS:").grid(row=6, column=0, sticky=tk.E, pady=(6, 0))
+        self.target_fps_var = tk.IntVar(value=self.target_fps)
+        tk.Spinbox(settings_frame, from_=0, to=60, width=4, textvariable=self.target_fps_var,
+                   command=self.on_target_fps_change).grid(row=6, column=1, sticky=tk.W, pady=(6, 0))
+        ttk.Label(settings_frame, text="(0=关闭)").grid(row=6, column=2, sticky=tk.W, pady=(6, 0))
+        ttk.Label(settings_frame, text="关键帧间隔:").grid(row=7, column=0, sticky=tk.E, pady=(6, 0))
+        self.keyframe_interval_var = tk.IntVar(value=self.keyframe_interval)
+        tk.Spinbox(settings_frame, from_=1, to=10, width=4, textvariable=self.keyframe_interval_var,
+                   command=self.on_keyframe_interval_change).grid(row=7, column=1, sticky=tk.W, pady=(6, 0))
+        ttk.Label(settings_frame, text="(1=每帧推理)").grid(row=7, column=2, sticky=tk.W, pady=(6, 0))
+        self.multi_person_var = tk.BooleanVar(value=self.multi_person)
+        ttk.Checkbutton(settings_frame, text="多人计数", variable=self.multi_person_var,
+                        command=self.on_multi_person_change).grid(row=7, column=3, columnspan=2, sticky=tk.W, pady=(6, 0))
+        self.latency_panel_var = tk.BooleanVar(value=self.latency_panel)
+        ttk.Checkbutton(settings_frame, text="各级延迟面板", variable=self.latency_panel_var,
+                        command=self.on_latency_panel_change).grid(row=8, column=0, columnspan=2, sticky=tk.W, pady=(6, 0))
+        ttk.Label(settings_frame, text="(F 键叠加到画面)").grid(row=8, column=2, columnspan=3, sticky=tk.W, pady=(6, 0))
 
         # 动作选择 + 阈值快速调节（所有动作）
         ttk.Label(settings_frame, text="选择动作:").grid(row=2, column=0, sticky=tk.W, pady=(8, 2))
@@ -389,23 +497,11 @@ class ExerciseCounterApp:
     def load_models(self):
         """加载AI模型"""
         try:
-            # 加载更轻量的YOLOv8姿态检测模型（提升FPS）
-            # 首选yolov8n-pose.pt；如未下载，Ultralytics会自动下载
-            try:
-                self.model = YOLO('yolov8n-pose.pt')
-            except Exception:
-                self.model = YOLO('yolov8s-pose.pt')
-
-            # 设置运行设备
-            try:
-                # 新版Ultralytics推荐通过predict时传参device，这里保留以防兼容
-                _ = self.model.to(self.device) if hasattr(self.model, 'to') else None
-            except Exception:
-                pass
+            self.load_pose_model()
             
             # 尝试加载运动识别模型
             try:
-                from for_detect.Inference import LSTM
+                from for_detect.Inference import LSTM, ExerciseVoter, StreamingClassifier
                 checkpoint_path = './for_detect/checkpoint/'
                 if os.path.exists(os.path.join(checkpoint_path, 'best_model.pt')):
                     device = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
@@ -413,6 +509,10 @@ class ExerciseCounterApp:
                     model_weight = torch.load(os.path.join(checkpoint_path, 'best_model.pt'), 
                                              map_location=device)
                     self.detector_model.load_state_dict(model_weight)
+                    self.detector_model.eval()
+                    self.sport_classifier = StreamingClassifier(self.detector_model)
+                    self.sport_voter = ExerciseVoter(self.classify_stride, self.classify_votes,
+                                                     self.classify_min_dwell)
                     
                     with open(os.path.join(checkpoint_path, 'idx_2_category.json'), 'r') as f:
                         self.idx_2_category = json.load(f)
@@ -426,6 +526,24 @@ class ExerciseCounterApp:
         except Exception as e:
             messagebox.showerror("错误", f"模型加载失败：{str(e)}")
             
+    def load_pose_model(self):
+        """按所选推理后端加载姿态模型（非 PyTorch 后端首次使用时导出并缓存在 .pt 旁）"""
+        # 加载更轻量的YOLOv8姿态检测模型（提升FPS）
+        # 首选yolov8n-pose.pt；如未下载，Ultralytics会自动下载
+        try:
+            self.model = load_pose_model('yolov8n-pose.pt', self.pose_backend, self.imgsz)
+        except Exception:
+            self.model = load_pose_model('yolov8s-pose.pt', self.pose_backend, self.imgsz)
+        self.model_name = self.model.name
+
+        # 设置运行设备
+        try:
+            # 新版Ultralytics推荐通过predict时传参device，这里保留以防兼容
+            self.model.to(self.device)
+        except Exception:
+            pass
+        print(f"✓ 推理后端: {self.model.backend} ({self.model_name})")
+
     def on_input_change(self):
         """输入源改变时的回调"""
         if self.input_var.get() == "camera":
@@ -452,6 +570,8 @@ class ExerciseCounterApp:
         """去抖帧数修改"""
         try:
             self.min_reach_frames = int(self.min_reach_frames_var.get())
+            self.rep_counter.min_reach_frames = self.min_reach_frames
+            self.people_counter.set_min_reach_frames(self.min_reach_frames)
         except Exception:
             pass
 
@@ -459,6 +579,62 @@ class ExerciseCounterApp:
         """切换角度显示"""
         self.show_angle = bool(self.show_angle_var.get())
 
+    def on_lossless_change(self):
+        """切换视频文件无损模式（下次开始时生效）"""
+        self.lossless_file = bool(self.lossless_file_var.get())
+
+    def on_keypoint_cache_change(self):
+        """切换关键点缓存（下次开始时生效）"""
+        self.use_keypoint_cache = bool(self.keypoint_cache_var.get())
+
+    def on_writer_policy_change(self):
+        """切换录制队列满时的策略（下次开始时生效）"""
+        self.writer_policy = self.writer_policy_var.get()
+
+    def on_roi_mode_change(self):
+        """切换 ROI 裁剪推理（下次开始时生效）"""
+        self.roi_mode = bool(self.roi_mode_var.get())
+
+    def on_multi_person_change(self):
+        """切换多人计数（下次开始时生效）"""
+        self.multi_person = bool(self.multi_person_var.get())
+
+    def on_latency_panel_change(self):
+        """显示/隐藏各级延迟面板（立即生效）"""
+        self.latency_panel = bool(self.latency_panel_var.get())
+        if self.latency_panel:
+            self.latency_frame.grid()
+        else:
+            self.latency_frame.grid_remove()
+
+    def toggle_latency_overlay(self):
+        """F 键：在画面上叠加/隐藏各级延迟表"""
+        self.latency_overlay = not self.latency_overlay
+
+    def on_keyframe_interval_change(self):
+        """修改关键帧间隔（下次开始时生效）"""
+        try:
+            self.keyframe_interval = max(1, int(self.keyframe_interval_var.get()))
+        except Exception:
+            pass
+
+    def on_target_fps_change(self):
+        """修改目标FPS（下次开始时生效，0 表示关闭自适应）"""
+        try:
+            self.target_fps = max(0, int(self.target_fps_var.get()))
+        except Exception:
+            pass
+
+    def on_pose_backend_change(self):
+        """切换推理后端并重新加载姿态模型（运行中切换则在下次开始时生效）"""
+        self.pose_backend = self.pose_backend_var.get()
+        if self.is_running:
+            return
+        try:
+            self.load_pose_model()
+        except Exception as e:
+            messagebox.showerror("错误", f"模型加载失败：{str(e)}")
+
     def apply_thresholds(self):
         """将阈值应用到选择的动作配置"""
         try:
@@ -493,7 +669,23 @@ class ExerciseCounterApp:
                 } for sid, cfg in SPORT_CONFIG.items()
             },
             'min_reach_frames': self.min_reach_frames,
-            'show_angle': self.show_angle
+            'show_angle': self.show_angle,
+            'lossless_file': self.lossless_file,
+            'file_batch_size': self.file_batch_size,
+            'keypoint_cache': self.use_keypoint_cache,
+            'cache_max_mb': self.cache_max_mb,
+            'writer_policy': self.writer_policy,
+            'writer_queue_size': self.writer_queue_size,
+            'pose_backend': self.pose_backend,
+            'target_fps': self.target_fps,
+            'roi_mode': self.roi_mode,
+            'keyframe_interval': self.keyframe_interval,
+            'multi_person': self.multi_person,
+            'latency_panel': self.latency_panel,
+            'profile_seconds': self.profile_seconds,
+            'classify_stride': self.classify_stride,
+            'classify_votes': self.classify_votes,
+            'classify_min_dwell': self.classify_min_dwell
         }
 
     def save_config(self):
@@ -514,20 +706,54 @@ class ExerciseCounterApp:
                 return
             with open(self.config_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-            sports = data.get('sports', {})
-            for sid, cfg in sports.items():
-                if sid in SPORT_CONFIG:
-                    SPORT_CONFIG[sid]['maintaining'] = int(cfg.get('maintaining', SPORT_CONFIG[sid]['maintaining']))
-                    SPORT_CONFIG[sid]['relaxing'] = int(cfg.get('relaxing', SPORT_CONFIG[sid]['relaxing']))
-                    SPORT_CONFIG[sid]['side_mode'] = cfg.get('side_mode', SPORT_CONFIG[sid].get('side_mode', 'avg'))
+            apply_threshold_config(data)
             # 其它设置
             self.min_reach_frames = int(data.get('min_reach_frames', self.min_reach_frames))
+            if hasattr(self, 'rep_counter'):
+                self.rep_counter.min_reach_frames = self.min_reach_frames
             self.show_angle = bool(data.get('show_angle', self.show_angle))
+            self.lossless_file = bool(data.get('lossless_file', self.lossless_file))
+            self.file_batch_size = max(1, int(data.get('file_batch_size', self.file_batch_size)))
+            self.use_keypoint_cache = bool(data.get('keypoint_cache', self.use_keypoint_cache))
+            self.cache_max_mb = int(data.get('cache_max_mb', self.cache_max_mb))
+            if data.get('writer_policy') in WRITER_POLICIES:
+                self.writer_policy = data['writer_policy']
+            self.writer_queue_size = max(1, int(data.get('writer_queue_size', self.writer_queue_size)))
+            if data.get('pose_backend') in BACKENDS:
+                self.pose_backend = data['pose_backend']
+            self.target_fps = max(0, int(data.get('target_fps', self.target_fps)))
+            self.roi_mode = bool(data.get('roi_mode', self.roi_mode))
+            self.keyframe_interval = max(1, int(data.get('keyframe_interval', self.keyframe_interval)))
+            self.multi_person = bool(data.get('multi_person', self.multi_person))
+            self.latency_panel = bool(data.get('latency_panel', self.latency_panel))
+            self.profile_seconds = max(1, int(data.get('profile_seconds', self.profile_seconds)))
+            self.classify_stride = max(1, int(data.get('classify_stride', self.classify_stride)))
+            self.classify_votes = max(1, int(data.get('classify_votes', self.classify_votes)))
+            self.classify_min_dwell = max(0, int(data.get('classify_min_dwell', self.classify_min_dwell)))
             # 同步到UI
             if hasattr(self, 'min_reach_frames_var'):
                 self.min_reach_frames_var.set(self.min_reach_frames)
             if hasattr(self, 'show_angle_var'):
                 self.show_angle_var.set(self.show_angle)
+            if hasattr(self, 'lossless_file_var'):
+                self.lossless_file_var.set(self.lossless_file)
+            if hasattr(self, 'keypoint_cache_var'):
+                self.keypoint_cache_var.set(self.use_keypoint_cache)
+            if hasattr(self, 'writer_policy_var'):
+                self.writer_policy_var.set(self.writer_policy)
+            if hasattr(self, 'pose_backend_var'):
+                self.pose_backend_var.set(self.pose_backend)
+            if hasattr(self, 'target_fps_var'):
+                self.target_fps_var.set(self.target_fps)
+            if hasattr(self, 'roi_mode_var'):
+                self.roi_mode_var.set(self.roi_mode)
+            if hasattr(self, 'keyframe_interval_var'):
+                self.keyframe_interval_var.set(self.keyframe_interval)
+            if hasattr(self, 'multi_person_var'):
+                self.multi_person_var.set(self.multi_person)
+            if hasattr(self, 'latency_panel_var'):
+                self.latency_panel_var.set(self.latency_panel)
+                self.on_latency_panel_change()
             if hasattr(self, 'config_sport_var'):
                 self.sync_threshold_fields()
             if not startup:
@@ -583,9 +809,38 @@ class ExerciseCounterApp:
             self.root.bind('<R>', lambda e: self.reset_stats())
             self.root.bind('<q>', lambda e: self.on_closing())
             self.root.bind('<Q>', lambda e: self.on_closing())
+            self.root.bind('<f>', lambda e: self.toggle_latency_overlay())
+            self.root.bind('<F>', lambda e: self.toggle_latency_overlay())
+            self.root.bind('<p>', lambda e: self.start_profiling())
+            self.root.bind('<P>', lambda e: self.start_profiling())
         except Exception:
             pass
             
+    def start_profiling(self, seconds=None):
+        """采样处理线程的 Python 调用栈与 torch 算子 N 秒，写出折叠栈文件与热点摘要
+
+        录制中写入本次会话的保存目录，否则写入保存路径下的 profiles 目录
+        """
+        if not self.is_running:
+            print("未在运行，忽略性能采样")
+            return
+        if self.profiler.running:
+            print("性能采样进行中")
+            return
+        seconds = seconds or self.profile_seconds
+        if self.video_writer is not None and self.save_dir:
+            out_dir = self.save_dir
+        else:
+            out_dir = os.path.join(self.save_path_var.get() or './output', 'profiles')
+
+        def done(paths):
+            print(f"性能采样完成: {paths['collapsed']}, {paths['summary']}")
+            self.root.after(0, lambda: messagebox.showinfo(
+                "性能采样", f"火焰图折叠栈: {paths['collapsed']}\n热点摘要: {paths['summary']}"))
+
+        self.profiler.run_for(seconds, out_dir, on_done=done)
+        print(f"开始性能采样 {seconds} 秒 → {out_dir}")
+
     def on_save_change(self):
         """保存选项改变时的回调"""
         if self.save_var.get():
@@ -628,9 +883,14 @@ class ExerciseCounterApp:
             messagebox.showerror("错误", "无法打开视频源")
             return
             
-        # 摄像头分辨率下调以提升性能（仅在CPU上设置）
+        # 摄像头分辨率：开启自适应时按当前画质档位协商，否则仅在CPU上下调以提升性能
         try:
-            if isinstance(source, int) and not torch.cuda.is_available():
+            if isinstance(source, int) and self.target_fps > 0:
+                # 一些摄像头使用MJPG编码更快
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                width, height = negotiate_resolution(self.cap, self.get_governor().camera_resolutions())
+                print(f"摄像头分辨率: {width}x{height}")
+            elif isinstance(source, int) and not torch.cuda.is_available():
                 self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
                 self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
                 # 一些摄像头使用MJPG编码更快
@@ -638,6 +898,34 @@ class ExerciseCounterApp:
         except Exception:
             pass
 
+        # 独立采集线程：摄像头只保留最新帧，视频文件可逐帧无损读取
+        is_camera = isinstance(source, int)
+        self.source_path = None if is_camera else source
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.grabber = FrameGrabber(
+            self.cap,
+            capacity=2 if is_camera else max(8, 2 * self.file_batch_size),
+            lossless=(not is_camera and self.lossless_file)
+        ).start()
+        self.dropped_frames = 0
+
+        # 自适应帧率只用于实时输入（摄像头或非逐帧模式的视频文件）
+        self.active_governor = None
+        if self.target_fps > 0 and not self.grabber.lossless:
+            self.active_governor = self.get_governor()
+            self.active_governor.reset()
+        self.frame_index = 0
+        self.last_pose = None
+        self.active_roi = self.roi_mode and not self.multi_person
+        self.active_keyframes = self.keyframe_interval > 1 and not self.multi_person
+        self.roi_tracker.reset()
+        self.keyframe_tracker.interval = self.keyframe_interval
+        self.keyframe_tracker.reset()
+        self.people_counter.set_min_reach_frames(self.min_reach_frames)
+        self.people_counter.reset()
+        self.people_counts = {}
+        self.latency.reset()
+
         # 设置保存
         if self.save_var.get():
             self.save_dir = os.path.join(self.save_path_var.get(), 
@@ -648,17 +936,20 @@ class ExerciseCounterApp:
             fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 30
             width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            self.video_writer = cv2.VideoWriter(
+            self.video_writer = AsyncVideoWriter(
                 os.path.join(self.save_dir, 'result.mp4'),
-                fourcc, fps, (width, height)
+                fourcc, fps, (width, height),
+                capacity=self.writer_queue_size, policy=self.writer_policy
             )
             
         # 重置状态
         self.counter = 0
-        self.reaching = False
-        self.reaching_last = False
-        self.state_keep = False
-        self.pose_key_point_frames = []
+        if self.sport_classifier is not None:
+            self.sport_classifier.reset()
+            self.sport_voter.stride = max(1, self.classify_stride)
+            self.sport_voter.votes = max(1, self.classify_votes)
+            self.sport_voter.min_dwell = self.classify_min_dwell
+            self.sport_voter.reset()
         
         # 更新UI
         self.is_running = True
@@ -672,28 +963,64 @@ class ExerciseCounterApp:
             text=SPORT_CONFIG[self.current_sport]['name'],
             foreground='green'
         )
-        # 重置去抖状态
-        self.prev_angle = None
-        self.reach_frames = 0
-        self.reaching = False
-        self.reaching_last = False
+        # 重置平滑/去抖状态
+        self.rep_counter = RepCounter(self.min_reach_frames)
+        self.fps = 0
+        self.last_render_tick = None
         
         # 启动处理线程
-        self.process_thread = threading.Thread(target=self.process_video, daemon=True)
+        self.process_thread = threading.Thread(target=self.process_video, name='process-video', daemon=True)
         self.process_thread.start()
+        if self.profile_on_start:
+            self.profile_on_start = False
+            self.start_profiling()
         
     def stop_capture(self):
         """停止视频捕获"""
         self.is_running = False
         self.is_paused = False
-        
+        # 采样中途停止：提前结束并照常写出已采到的样本
+        self.profiler.finish()
+
+        # 先停止采集线程，再释放视频源
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
+
+        # 停止流水线，等待在途帧处理结束后再关闭编码器
+        pipeline, pipeline_done = self.pipeline, True
+        if pipeline:
+            pipeline.stop()
+            pipeline_done = pipeline.join(timeout=1.0)
+            self.pipeline = None
+
         if self.cap:
             self.cap.release()
             self.cap = None
             
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
+        # 写完编码队列中剩余的帧再关闭文件
+        self.writer_stats = None
+        writer, self.video_writer = self.video_writer, None
+        recorded = writer is not None
+        if writer and pipeline_done:
+            self.release_writer(writer)
+        elif writer:
+            # 绘制级仍在处理在途的一批帧：等线程真正退出后再关闭编码器，避免丢帧或写入已关闭的编码器
+            def release_later():
+                pipeline.join()
+                self.release_writer(writer)
+            threading.Thread(target=release_later, name='writer-release', daemon=True).start()
+
+        # 各级延迟：打印会话摘要，录制时与 result.mp4 一起导出 JSON
+        self.export_latency(recorded)
+
+        if self.active_roi:
+            t = self.roi_tracker
+            print(f"ROI统计: 裁剪 {t.roi_frames} 帧, 全图 {t.full_frames} 帧, 回退 {t.fallbacks} 帧")
+        drift = None
+        if self.active_keyframes:
+            drift = self.keyframe_tracker.drift_stats()
+            print(f"关键帧统计: {drift}")
             
         self.start_button.config(state='normal')
         self.pause_button.config(state='disabled')
@@ -707,283 +1034,398 @@ class ExerciseCounterApp:
             messagebox.showinfo("统计结果", 
                               f"运动类型: {SPORT_CONFIG[self.current_sport]['name']}\n"
                               f"完成次数: {self.counter} 次\n" +
-                              (f"结果已保存至: {self.save_dir}" if self.save_dir else ""))
-        
-    def draw_text_with_chinese(self, frame):
-        """使用PIL在图像上绘制支持中文的文本"""
-        # 转换为PIL格式
-        frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        from PIL import ImageDraw, ImageFont
-        draw = ImageDraw.Draw(frame_pil)
-        
-        # 计算缩放比例
-        plot_size_ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
-        
-        # 绘制背景矩形（使用OpenCV更高效）
-        cv2.rectangle(frame, 
-                     (int(20 * plot_size_ratio), int(20 * plot_size_ratio)),
-                     (int(380 * plot_size_ratio), int(180 * plot_size_ratio)),
-                     (55, 104, 0), -1)
-        
-        # 转换回PIL
-        frame_pil = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(frame_pil)
+                              (f"结果已保存至: {self.save_dir}" if self.save_dir else "") +
+                              (f"\n录制: {self.writer_stats['frames_written']} 帧, "
+                               f"丢弃 {self.writer_stats['frames_dropped']} 帧, "
+                               f"编码 {self.writer_stats['encode_fps']} FPS" if self.writer_stats else "") +
+                              (f"\n关键帧: {drift['keyframes']} 帧, 预测 {drift['predicted_frames']} 帧, "
+                               f"漂移 {drift['drift_px_mean']}px (P95 {drift['drift_px_p95']}px)"
+                               if drift and drift['samples'] else ""))
         
-        # 尝试加载字体
-        try:
-            font_size = int(28 * plot_size_ratio)
-            # Windows系统字体
-            font = ImageFont.truetype("msyh.ttc", font_size)  # 微软雅黑
-        except:
-            try:
-                font = ImageFont.truetype("SimHei.ttf", font_size)  # 黑体
-            except:
-                # 如果都失败，使用默认字体（只支持英文）
-                font = ImageFont.load_default()
-        
-        # 获取运动类型（中英文）
-        sport_name_cn = SPORT_CONFIG[self.current_sport]['name']
-        sport_name_en = self.current_sport.capitalize()
-        
-        # 绘制文本
-        y_offset = int(40 * plot_size_ratio)
-        x_start = int(30 * plot_size_ratio)
-        line_height = int(45 * plot_size_ratio)
-        
-        # 运动类型
+    def release_writer(self, writer):
+        """写完编码队列中剩余的帧后关闭录像文件并记录统计"""
+        self.writer_stats = writer.release()
+        print(f"录制统计: {self.writer_stats}")
+
+    def export_latency(self, recorded):
+        """打印本次会话各级延迟；recorded 为真时写入保存目录的 latency.json"""
+        session = self.latency.session_summary()
+        if not session:
+            return
+        print("各级延迟 (ms): " + ", ".join(
+            f"{self.latency.names[key]} P50 {s['p50']} / P95 {s['p95']} / P99 {s['p99']}" for key, s in session.items()))
+        if not (recorded and self.save_dir):
+            return
+        path = os.path.join(self.save_dir, 'latency.json')
         try:
-            draw.text((x_start, y_offset), f'运动: {sport_name_cn}', 
-                     font=font, fill=(255, 255, 255))
-        except:
-            draw.text((x_start, y_offset), f'Exercise: {sport_name_en}', 
-                     font=font, fill=(255, 255, 255))
-        
-        # 计数
-        y_offset += line_height
+            self.latency.export(path, source=self.source_path if self.source_path else 'camera',
+                                model=self.model_name, backend=self.model.backend, device=self.device,
+                                imgsz=self.model.imgsz, batch_size=self.file_batch_size if self.lossless_file else 1,
+                                roi=self.active_roi, keyframe_interval=self.keyframe_interval,
+                                multi_person=self.multi_person, frames=session.get('counting', {}).get('count', 0))
+            print(f"延迟统计已保存: {path}")
+        except OSError as e:
+            print(f"⚠ 延迟统计保存失败: {e}")
+
+    def draw_text_with_chinese(self, frame, sport=None, counter=None):
+        """在图像上原地叠加支持中文的信息面板（sport/counter 默认取当前状态）"""
+        sport = self.current_sport if sport is None else sport
+        counter = self.counter if counter is None else counter
+        return self.info_panel.draw(frame, SPORT_CONFIG[sport]['name'], sport.capitalize(), counter, int(self.fps))
+
+    def process_video(self):
+        """视频处理主循环：采集 → 姿态推理/计数 → 绘制/编码/显示 三级流水线"""
+        grabber = self.grabber
+        self.prepare_keypoint_cache(grabber)
+        if self.replay is not None:
+            # 缓存命中：直接回放关键点，完全跳过姿态模型
+            pipeline = Pipeline(
+                self.iter_frames(grabber),
+                [self.replay_stage, self.render_stage],
+                maxsize=2
+            )
+        elif grabber.lossless and self.file_batch_size > 1:
+            # 视频文件：预解码并按批推理，降低逐帧调用开销
+            pipeline = Pipeline(
+                iter_batches(self.iter_frames(grabber), self.file_batch_size),
+                [self.infer_batch_stage, self.render_batch_stage],
+                maxsize=2
+            )
+        else:
+            pipeline = Pipeline(
+                self.iter_frames(grabber),
+                [self.infer_stage, self.render_stage],
+                maxsize=2
+            )
+        self.pipeline = pipeline.start()
+        pipeline.join()
+        if pipeline.error is not None:
+            print(f"处理线程错误: {pipeline.error}")
+        elif self.is_running and self.keypoint_recorder is not None:
+            # 完整处理完视频文件（未被中途停止）才写入缓存
+            self.save_keypoint_cache()
+
+        # 处理结束
+        if self.is_running:
+            self.root.after(0, self.stop_capture)
+
+    def prepare_keypoint_cache(self, grabber):
+        """视频文件逐帧模式下查找关键点缓存；未命中则记录本次推理结果"""
+        self.replay = None
+        self.keypoint_recorder = None
+        self.cache_key = None
+        # 缓存只保存第一个人的关键点，多人模式不使用
+        if not (self.use_keypoint_cache and self.source_path and grabber.lossless) or self.multi_person:
+            return
         try:
-            draw.text((x_start, y_offset), f'计数: {self.counter}', 
-                     font=font, fill=(255, 255, 255))
-        except:
-            draw.text((x_start, y_offset), f'Count: {self.counter}', 
-                     font=font, fill=(255, 255, 255))
-        
-        # FPS
-        y_offset += line_height
-        draw.text((x_start, y_offset), f'FPS: {int(self.fps)}', 
-                 font=font, fill=(255, 255, 255))
-        
-        # 转换回OpenCV格式
-        frame_with_text = cv2.cvtColor(np.array(frame_pil), cv2.COLOR_RGB2BGR)
-        return frame_with_text
-    
-    def calculate_angle(self, key_points, left_points_idx, right_points_idx):
-        """计算关节角度"""
-        def _calculate_angle(line1, line2):
-            slope1 = math.atan2(line1[3] - line1[1], line1[2] - line1[0])
-            slope2 = math.atan2(line2[3] - line2[1], line2[2] - line2[0])
-            angle1 = math.degrees(slope1)
-            angle2 = math.degrees(slope2)
-            angle_diff = abs(angle1 - angle2)
-            if angle_diff > 180:
-                angle_diff = 360 - angle_diff
-            return angle_diff
-        
+            if self.keypoint_cache is None:
+                self.keypoint_cache = KeypointCache(max_bytes=self.cache_max_mb * 1024 ** 2)
+            # ROI / 关键帧模式的关键点与逐帧全图推理略有差异，单独缓存
+            model_name = self.model_name + ('+roi' if self.active_roi else '')
+            if self.active_keyframes:
+                model_name += f'+kf{self.keyframe_interval}'
+            self.cache_key = self.keypoint_cache.make_key(
+                self.source_path, model_name, self.model.imgsz, self.conf_thres)
+            cached = self.keypoint_cache.load(self.cache_key)
+        except OSError as e:
+            print(f"⚠ 关键点缓存不可用: {e}")
+            return
+        if cached is not None:
+            keypoints, valid, _ = cached
+            self.replay = (keypoints, valid)
+            self.replay_index = 0
+            print("✓ 使用关键点缓存，跳过姿态推理")
+        else:
+            self.keypoint_recorder = KeypointRecorder()
+
+    def save_keypoint_cache(self):
+        """将本次推理记录的关键点写入缓存"""
+        keypoints, valid = self.keypoint_recorder.arrays()
+        meta = {
+            'video': os.path.basename(self.source_path),
+            'model': self.model_name,
+            'imgsz': self.model.imgsz,
+            'conf': self.conf_thres,
+            'fps': self.source_fps,
+            'frames': int(len(valid))
+        }
         try:
-            left_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in left_points_idx]
-            right_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in right_points_idx]
-            
-            line1_left = [left_points[1][0].item(), left_points[1][1].item(),
-                         left_points[0][0].item(), left_points[0][1].item()]
-            line2_left = [left_points[1][0].item(), left_points[1][1].item(),
-                         left_points[2][0].item(), left_points[2][1].item()]
-            angle_left = _calculate_angle(line1_left, line2_left)
-            
-            line1_right = [right_points[1][0].item(), right_points[1][1].item(),
-                          right_points[0][0].item(), right_points[0][1].item()]
-            line2_right = [right_points[1][0].item(), right_points[1][1].item(),
-                          right_points[2][0].item(), right_points[2][1].item()]
-            angle_right = _calculate_angle(line1_right, line2_right)
-            
-            return (angle_left + angle_right) / 2
-        except:
-            return 0
-            
-    def process_video(self):
-        """视频处理主循环"""
-        while self.is_running and self.cap and self.cap.isOpened():
+            self.keypoint_cache.save(self.cache_key, keypoints, valid, meta)
+        except OSError as e:
+            print(f"⚠ 关键点缓存写入失败: {e}")
+        self.keypoint_recorder = None
+
+    def iter_frames(self, grabber):
+        """采集级输出：从环形缓冲取帧（摄像头取最新帧，过时帧计为丢帧）"""
+        # 采集等待：从请求下一帧到取到帧的时间（不含暂停）
+        wait_start = time.perf_counter()
+        while self.is_running and grabber and grabber.is_alive():
             if self.is_paused:
                 time.sleep(0.05)
+                wait_start = time.perf_counter()
                 continue
-            ret, frame = self.cap.read()
+            ret, frame = grabber.read(timeout=0.5)
             if not ret:
-                break
-                
-            start_time = cv2.getTickCount()
-            
-            # 运行姿态检测（控制输入尺寸/设备/半精度/置信度以提升FPS）
-            results = self.model.predict(
-                frame,
-                imgsz=self.imgsz,
-                conf=self.conf_thres,
-                device=self.device,
-                half=self.use_half,
-                verbose=False
-            )
-            
-            if results[0].keypoints.shape[1] == 0:
-                # 没有检测到人
-                annotated_frame = frame
+                continue
+            self.latency.record('capture', time.perf_counter() - wait_start)
+            self.dropped_frames = grabber.frames_dropped
+            yield frame
+            wait_start = time.perf_counter()
+
+    def get_governor(self):
+        """自适应帧率调节器，跨会话保留档位；初始档位与默认推理尺寸一致"""
+        if self.governor is None:
+            self.governor = FpsGovernor(self.target_fps, level=0 if torch.cuda.is_available() else 2)
+        self.governor.target_fps = float(self.target_fps)
+        # OpenCV DNN / INT8 的推理尺寸固定，调节推理尺寸不会生效
+        levels = LEVELS
+        if self.model.backend in FIXED_SIZE_BACKENDS:
+            levels = fixed_size_levels(self.model.imgsz)
+        if levels != self.governor.levels:
+            self.governor.set_levels(levels)
+            if levels is not LEVELS:
+                print(f"自适应调节: {self.model.backend} 后端推理尺寸固定为 {self.model.imgsz}，只调节推理步长与绘制细节")
+        return self.governor
+
+    def predict_kwargs(self):
+        """姿态推理参数（控制输入尺寸/设备/半精度/置信度以提升FPS）"""
+        gov = self.active_governor
+        return dict(
+            imgsz=gov.imgsz if gov else self.imgsz,
+            conf=self.conf_thres,
+            device=self.device,
+            half=self.use_half,
+            verbose=False
+        )
+
+    def infer_stage(self, frame):
+        """推理级：逐帧姿态检测（自适应模式下按步长跳帧）"""
+        gov = self.active_governor
+        start = time.perf_counter()
+        index = self.frame_index
+        self.frame_index += 1
+        if gov and self.last_pose is not None and not gov.should_infer(index):
+            # 跳帧：沿用上一帧关键点绘制，不参与计数
+            item = dict(self.last_pose, frame=frame, result=None, counter=self.counter)
+        elif self.active_roi or self.active_keyframes:
+            with self.latency.measure('inference'):
+                (result, kpts), = self.infer_frames([frame])
+            item = self.last_pose = self.count_result(frame, result, kpts)
+        else:
+            with self.latency.measure('inference'):
+                results = self.model.predict(frame, **self.predict_kwargs())
+            item = self.last_pose = self.count_result(frame, results[0])
+        if gov:
+            gov.record('infer', time.perf_counter() - start)
+        return item
+
+    def infer_batch_stage(self, frames):
+        """推理级（视频文件）：一次推理一批帧，按帧顺序送入计数"""
+        start = time.perf_counter()
+        if self.active_roi or self.active_keyframes:
+            outputs = self.infer_frames(frames)
+        else:
+            outputs = [(result, None) for _, result in
+                       stream_predict(self.model, frames, len(frames), **self.predict_kwargs())]
+        # 整批推理耗时按帧平均分摊
+        self.latency.record('inference', time.perf_counter() - start, count=len(frames))
+        return [self.count_result(frame, result, kpts) for frame, (result, kpts) in zip(frames, outputs)]
+
+    def infer_frames(self, frames):
+        """按设置推理一批连续帧（关键帧预测、ROI 裁剪），返回 [(result 或 None, 原图坐标关键点)]"""
+        def infer(batch):
+            if self.active_roi:
+                return predict_with_roi(self.model, batch, self.roi_tracker, **self.predict_kwargs())
+            results = self.model.predict(batch, stream=True, **self.predict_kwargs())
+            return [(result, keypoints_array(result)) for result in results]
+
+        if self.active_keyframes:
+            # 非关键帧不运行模型，计数与绘制使用预测关键点
+            return infer_keyframes(frames, self.keyframe_tracker, infer)
+        return infer(frames)
+
+    def replay_stage(self, frame):
+        """推理级（缓存回放）：使用缓存的关键点，不运行模型"""
+        kpts = replay_keypoints(*self.replay, self.replay_index)
+        self.replay_index += 1
+        return self.count_keypoints(frame, kpts)
+
+    def count_result(self, frame, result, kpts=None):
+        """推理结果转为关键点数组后计数（ROI 模式直接传入已映射回原图的关键点）"""
+        # 关键点每帧只拷贝一次到主机内存，后续计算均基于 NumPy
+        if kpts is None:
+            with self.latency.measure('transfer'):
+                kpts = keypoints_array(result)
+        if self.keypoint_recorder is not None:
+            self.keypoint_recorder.add(kpts)
+        return self.count_keypoints(frame, kpts, result)
+
+    def count_keypoints(self, frame, kpts, result=None):
+        """运动识别与计数，输出供绘制级使用的帧数据"""
+        start = time.perf_counter()
+        item = {'frame': frame, 'result': None, 'kpts': None, 'angle': None}
+        if len(kpts):
+            # 自动识别运动类型（复用当前结果的关键点，避免二次推理）
+            if self.auto_detect and self.sport_classifier is not None:
+                xy = kpts[0, :, 0:2]
+                ready = self.sport_classifier.push(xy)
+                if self.sport_voter.observe(xy) and ready:
+                    idx = self.sport_voter.vote(self.sport_classifier.predict_proba()[0])
+                    detected_sport = self.idx_2_category[str(idx)]
+                    if detected_sport in SPORT_CONFIG:
+                        self.current_sport = detected_sport
+
+            # 获取运动配置
+            sport_config = SPORT_CONFIG[self.current_sport]
+
+            enter_thr = sport_config['maintaining']
+            exit_thr = sport_config['relaxing']
+            if self.multi_person:
+                # 多人：按稳定 ID 关联后每人独立计数，总计数为所有人之和
+                completed, people = self.people_counter.update(kpts, self.current_sport, SPORT_CONFIG)
+                smooth_angle = people[0].angle if people else None
+                item['people'] = [(t.id, t.count, tuple(t.box)) for t in people]
+                self.people_counts = self.people_counter.counts()
             else:
-                # 自动识别运动类型（复用当前结果的关键点，避免二次推理）
-                if self.auto_detect and self.detector_model:
-                    try:
-                        pose_data = results[0].keypoints.data[0, :, 0:2]
-                        self.pose_key_point_frames.append(pose_data.tolist())
-                    except Exception:
-                        pass
-                    
-                    if len(self.pose_key_point_frames) == 5:
-                        input_data = torch.tensor(self.pose_key_point_frames)
-                        input_data = input_data.reshape(5, 17 * 2)
-                        x_mean, x_std = torch.mean(input_data), torch.std(input_data)
-                        input_data = (input_data - x_mean) / x_std
-                        input_data = input_data.unsqueeze(dim=0)
-                        input_data = input_data.to(self.detector_model.device)
-                        rst_detector = self.detector_model(input_data)
-                        idx = rst_detector.argmax().cpu().item()
-                        detected_sport = self.idx_2_category[str(idx)]
-                        if detected_sport in SPORT_CONFIG:
-                            self.current_sport = detected_sport
-                        del self.pose_key_point_frames[0]
-                
-                # 获取运动配置
-                sport_config = SPORT_CONFIG[self.current_sport]
-                
-                # 计算角度
-                # 根据侧别设置选择角度
-                side_mode = sport_config.get('side_mode', 'avg')
-                if side_mode == 'left':
-                    angle = self.calculate_angle(
-                        results[0].keypoints,
-                        sport_config['left_points_idx'],
-                        sport_config['left_points_idx']  # 只取左侧两段构线
-                    )
-                elif side_mode == 'right':
-                    angle = self.calculate_angle(
-                        results[0].keypoints,
-                        sport_config['right_points_idx'],
-                        sport_config['right_points_idx']
-                    )
-                else:
-                    angle = self.calculate_angle(
-                        results[0].keypoints,
-                        sport_config['left_points_idx'],
-                        sport_config['right_points_idx']
-                    )
-                
-                # 角度平滑，降低抖动
-                if self.prev_angle is None:
-                    smooth_angle = angle
-                else:
-                    smooth_angle = 0.7 * self.prev_angle + 0.3 * angle
-                self.prev_angle = smooth_angle
-
-                # 使用阈值迟滞+方向自适配
-                enter_thr = sport_config['maintaining']
-                exit_thr = sport_config['relaxing']
-                if enter_thr < exit_thr:
-                    # 进入区：小于enter_thr；退出区：大于exit_thr（如深蹲/仰卧起坐）
-                    if smooth_angle < enter_thr:
-                        self.reaching = True
-                    elif smooth_angle > exit_thr:
-                        self.reaching = False
-                else:
-                    # 进入区：大于enter_thr；退出区：小于exit_thr（如俯卧撑）
-                    if smooth_angle > enter_thr:
-                        self.reaching = True
-                    elif smooth_angle < exit_thr:
-                        self.reaching = False
-
-                # 去抖与计数逻辑
-                if self.reaching:
-                    self.reach_frames += 1
+                # 计算角度（按侧别设置，一次算出所有运动所需角度）
+                angle = sport_angles(kpts[0], SPORT_CONFIG)[self.current_sport]
+                # 平滑、迟滞与去抖计数
+                smooth_angle, completed = self.rep_counter.update(angle, enter_thr, exit_thr)
+            if completed:
+                self.counter += int(completed)
+                # 累计到全局统计
+                sid = self.current_sport
+                self.total_counts[sid] = self.total_counts.get(sid, 0) + int(completed)
+                self.todays_counts[sid] = self.todays_counts.get(sid, 0) + int(completed)
+
+            item['result'] = result
+            item['kpts'] = kpts
+            item['angle'] = (smooth_angle, enter_thr, exit_thr) if smooth_angle is not None else None
+        elif self.multi_person:
+            # 无人帧也要更新跟踪，让离开的人累计丢失帧数并按 max_age 过期，避免新来的人继承旧 ID 与计数状态
+            self.people_counter.update(kpts, self.current_sport, SPORT_CONFIG)
+            self.people_counts = self.people_counter.counts()
+
+        # 绘制级在之后才执行，这里记录本帧的计数快照，保证叠加信息与帧一致
+        item['sport'] = self.current_sport
+        item['counter'] = self.counter
+        # 编码器同样随帧传递：停止后 self.video_writer 置空，在途帧仍写入原编码器
+        item['writer'] = self.video_writer
+        self.latency.record('counting', time.perf_counter() - start)
+        return item
+
+    def plot_keypoints(self, frame, kpts):
+        """根据关键点数组绘制骨架（缓存回放时没有推理结果对象）"""
+        annotator = Annotator(frame.copy())
+        for k in reversed(kpts):
+            annotator.kpts(k, frame.shape[:2], kpt_line=True)
+        return annotator.result()
+
+    def draw_people(self, frame, people):
+        """原地绘制每个人的 ID 与计数标签"""
+        ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
+        scale, thickness = 0.7 * ratio, max(1, int(2 * ratio))
+        for track_id, count, (x1, y1, x2, y2) in people:
+            color = self.colors(track_id, True)
+            txt = f"#{track_id}: {count}"
+            (w, h), base = cv2.getTextSize(txt, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+            x, y = int(x1), max(h + base, int(y1) - int(10 * ratio))
+            cv2.rectangle(frame, (x, y - h - base), (x + w, y + base), color, -1)
+            cv2.putText(frame, txt, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (255, 255, 255),
+                        thickness=thickness, lineType=cv2.LINE_AA)
+        return frame
+
+    def render_batch_stage(self, items):
+        """绘制级（视频文件）：逐帧绘制一批推理结果"""
+        for item in items:
+            self.render_stage(item)
+
+    def render_stage(self, item):
+        """绘制级：骨架绘制、信息叠加、视频编码与显示，与下一帧推理并行"""
+        gov = self.active_governor
+        start = time.perf_counter()
+        detail = gov.detail if gov else 'full'
+        frame = item['frame']
+        if item['kpts'] is None or detail == 'minimal':
+            # 没有检测到人（或自适应降为只显示信息面板）
+            annotated_frame = frame
+        else:
+            # 绘制结果（可选：降低绘制复杂度以提升FPS）
+            try:
+                if item['result'] is not None and detail == 'full':
+                    annotated_frame = item['result'].plot()
                 else:
-                    # 从到位状态退出且持续时间达标 -> 记一次
-                    if self.reaching_last and self.reach_frames >= self.min_reach_frames:
-                        self.counter += 1
-                        # 累计到全局统计
-                        sid = self.current_sport
-                        self.total_counts[sid] = self.total_counts.get(sid, 0) + 1
-                        self.todays_counts[sid] = self.todays_counts.get(sid, 0) + 1
-                    self.reach_frames = 0
-
-                self.reaching_last = self.reaching
-                
-                # 绘制结果（可选：降低绘制复杂度以提升FPS）
-                try:
-                    annotated_frame = results[0].plot()
-                except Exception:
-                    annotated_frame = frame
-                
-                # 可选：叠加角度/阈值辅助调参
-                if self.show_angle:
-                    plot_size_ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
-                    txt = f"Angle: {smooth_angle:.1f}  Enter: {enter_thr}  Exit: {exit_thr}"
-                    cv2.putText(annotated_frame, txt, (int(20 * plot_size_ratio), int(210 * plot_size_ratio)),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6 * plot_size_ratio, (0, 255, 255),
-                                thickness=int(2 * plot_size_ratio), lineType=cv2.LINE_AA)
-                
-            # 计算FPS（指数滑动平均，减少抖动）
-            end_time = cv2.getTickCount()
-            inst_fps = cv2.getTickFrequency() / (end_time - start_time)
+                    annotated_frame = self.plot_keypoints(frame, item['kpts'])
+            except Exception:
+                annotated_frame = frame
+
+            # 可选：叠加角度/阈值辅助调参
+            if self.show_angle and item['angle'] is not None:
+                smooth_angle, enter_thr, exit_thr = item['angle']
+                plot_size_ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
+                txt = f"Angle: {smooth_angle:.1f}  Enter: {enter_thr}  Exit: {exit_thr}"
+                cv2.putText(annotated_frame, txt, (int(20 * plot_size_ratio), int(210 * plot_size_ratio)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6 * plot_size_ratio, (0, 255, 255),
+                            thickness=int(2 * plot_size_ratio), lineType=cv2.LINE_AA)
+
+        # 计算FPS（按流水线出帧间隔，指数滑动平均，减少抖动）
+        now = cv2.getTickCount()
+        if self.last_render_tick is not None:
+            inst_fps = cv2.getTickFrequency() / max(1, now - self.last_render_tick)
             self.fps = inst_fps if self.fps == 0 else (0.9 * self.fps + 0.1 * inst_fps)
+        self.last_render_tick = now
 
-            # 添加信息文本（使用PIL支持中文）
-            annotated_frame = self.draw_text_with_chinese(annotated_frame)
-            
-            # 保存视频
-            if self.video_writer:
-                self.video_writer.write(annotated_frame)
-            
-            # 更新显示
+        # 多人模式：在每个人上方标注 ID 与个人计数
+        if item.get('people'):
+            annotated_frame = self.draw_people(annotated_frame, item['people'])
+        self.latency.record('annotate', time.perf_counter() - start)
+
+        # 添加信息文本（缓存的中文信息面板，原地叠加）
+        with self.latency.measure('overlay'):
+            annotated_frame = self.draw_text_with_chinese(
+                annotated_frame, sport=item['sport'], counter=item['counter'])
+
+        # 保存视频
+        writer = item.get('writer')
+        if writer:
+            with self.latency.measure('encode'):
+                writer.write(annotated_frame)
+
+        # F 键延迟叠加只用于显示：编码器异步读取原帧，复制后再绘制，不写入录像
+        if self.latency_overlay:
+            annotated_frame = draw_latency(annotated_frame.copy(), self.latency.rows())
+
+        # 更新显示（同时请求主线程刷新状态标签）
+        with self.latency.measure('display'):
             self.update_video_display(annotated_frame)
-            self.update_status_display()
-            
-        # 处理结束
-        if self.is_running:
-            self.root.after(0, self.stop_capture)
-            
+
+        if gov:
+            gov.record('render', time.perf_counter() - start)
+            if gov.update():
+                print(f"自适应调整: {gov.describe()}")
+
     def update_video_display(self, frame):
-        """更新视频显示"""
-        try:
-            # 转换颜色空间
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # 调整大小以适应显示区域
-            label_width = self.video_label.winfo_width()
-            label_height = self.video_label.winfo_height()
-            
-            if label_width > 1 and label_height > 1:
-                h, w = frame_rgb.shape[:2]
-                scale = min(label_width / w, label_height / h)
-                new_w, new_h = int(w * scale), int(h * scale)
-                frame_rgb = cv2.resize(frame_rgb, (new_w, new_h))
-            
-            # 转换为PIL Image
-            img = Image.fromarray(frame_rgb)
-            img_tk = ImageTk.PhotoImage(image=img)
-            
-            # 更新显示
-            self.video_label.configure(image=img_tk, text='')
-            self.video_label.image = img_tk
-        except Exception as e:
-            print(f"显示更新错误: {e}")
-            
+        """投递最新一帧给显示桥，由 Tk 主线程按刷新率取走显示（可在任意线程调用）"""
+        self.display.post(frame)
+
     def update_status_display(self):
-        """更新状态显示"""
+        """更新状态显示（由显示桥在 Tk 主线程调用）"""
         try:
             self.counter_label.config(text=str(self.counter))
             self.fps_label.config(text=f"{int(self.fps)}")
+            self.dropped_label.config(text=str(self.dropped_frames))
+            gov = self.active_governor
+            self.governor_label.config(text=gov.describe() if gov else "关闭")
+            if self.multi_person:
+                items = list(self.people_counts.items())
+                people = "  ".join(f"#{pid}: {count}" for pid, count in items[:8])
+                if len(items) > 8:
+                    people += f"  …(共{len(items)}人)"
+                self.people_label.config(text=people or "无人")
+            else:
+                self.people_label.config(text="关闭")
+            if self.latency_panel:
+                self.update_latency_panel()
             if self.auto_detect:
                 sport_name = SPORT_CONFIG[self.current_sport]['name']
                 self.current_sport_label.config(text=sport_name)
@@ -1003,10 +1445,21 @@ class ExerciseCounterApp:
         except Exception as e:
             print(f"状态更新错误: {e}")
             
+    def update_latency_panel(self):
+        """刷新各级延迟面板（滚动窗口快照）"""
+        stats = self.latency.live()
+        for key, cells in self.latency_cells.items():
+            s = stats.get(key)
+            for cell, name in zip(cells, ('p50', 'p95', 'p99')):
+                cell.config(text=f"{s[name]:.1f}" if s else "-")
+        groups = self.latency.group_means(stats)
+        self.latency_group_label.config(text=f"推理级 {groups['inference']:.1f} / 绘制级 {groups['rendering']:.1f} ms")
+
     def on_closing(self):
         """关闭窗口时的处理"""
         if self.is_running:
             self.stop_capture()
+        self.display.stop()
         # 退出时保存配置与历史
         try:
             self.save_history()
@@ -1032,10 +1485,21 @@ class ExerciseCounterApp:
             self.pause_button.config(text="⏸ 暂停/继续", style='Pause.TButton')
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='健身检测系统 GUI')
+    parser.add_argument('--profile', default=0, type=int, metavar='SECONDS',
+                        help='开始处理后自动采样 N 秒，写出火焰图折叠栈与热点摘要（运行中也可按 P 键）')
+    return parser.parse_args()
+
+
 def main():
     """主函数"""
+    args = parse_args()
     root = tk.Tk()
     app = ExerciseCounterApp(root)
+    if args.profile > 0:
+        app.profile_seconds = args.profile
+        app.profile_on_start = True
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.mainloop()
 
@@ -0,0 +1,273 @@
+import os
+import csv
+import glob
+import json
+import time
+import datetime
+import argparse
+import multiprocessing as mp
+
+from counting import SPORT_CONFIG, RepCounter, load_threshold_config
+from kinematics import keypoints_array, sport_angle
+from keypoint_cache import DEFAULT_CACHE_DIR, KeypointCache, KeypointRecorder, replay_keypoints
+from pose_backend import BACKENDS, EXPORT_BACKENDS, model_imgsz, model_tag
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv')
+
+# Per-process state, filled once by init_worker
+_worker = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Headless rep counting for many videos')
+    parser.add_argument('inputs', nargs='+', type=str, help='video files, directories or glob patterns')
+    parser.add_argument('--model', default='yolov8n-pose.pt', type=str, help='path to model weight')
+    parser.add_argument('--sport', default='squat', type=str,
+                        help='"squat", "pushup", "situp", or "dir" to use each video\'s parent directory name')
+    parser.add_argument('--config', default=os.path.join('config', 'thresholds.json'), type=str,
+                        help='thresholds file shared with the GUI')
+    parser.add_argument('--output', default=None, type=str,
+                        help='summary file (.json or .csv), default ./output/batch_<time>.json')
+    parser.add_argument('--workers', default=max(1, (os.cpu_count() or 2) // 2), type=int,
+                        help='number of worker processes')
+    parser.add_argument('--batch_size', default=8, type=int, help='frames per inference call')
+    parser.add_argument('--imgsz', default=640, type=int, help='inference size')
+    parser.add_argument('--conf', default=0.5, type=float, help='confidence threshold')
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS,
+                        help='pose inference backend; exported models are cached beside the .pt file')
+    parser.add_argument('--device', default=None, type=str, help='inference device, e.g. cpu or cuda:0')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, type=str, help='keypoint cache directory')
+    parser.add_argument('--no_cache', action='store_true', help='always run pose inference')
+    args = parser.parse_args()
+    return args
+
+
+def collect_videos(inputs):
+    """Expand files, directories (recursively) and glob patterns into a sorted list of videos"""
+    videos = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                videos.update(os.path.join(root, f) for f in files if f.lower().endswith(VIDEO_EXTS))
+        elif os.path.isfile(item):
+            videos.add(item)
+        else:
+            videos.update(p for p in glob.glob(item, recursive=True) if p.lower().endswith(VIDEO_EXTS))
+    return sorted(videos)
+
+
+def init_worker(options):
+    """Per-process setup; the pose model is loaded once, on the first cache miss"""
+    import torch
+
+    # Share the cores between workers instead of oversubscribing them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, options['workers'])))
+    load_threshold_config(options['config'])
+    _worker['model'] = None
+    _worker['options'] = options
+    _worker['cache'] = KeypointCache(options['cache_dir']) if options['cache_dir'] else None
+
+
+def count_cached(summary, cached, sport_config, min_reach_frames):
+    """Re-score a video from cached keypoints without decoding or inference"""
+    keypoints, valid, meta = cached
+    fps = meta.get('fps') or 30.0
+    counter = RepCounter(min_reach_frames)
+    rep_times = []
+    start = time.perf_counter()
+    for frame_idx in range(len(valid)):
+        kpts = replay_keypoints(keypoints, valid, frame_idx)
+        if len(kpts):
+            angle = sport_angle(kpts[0], sport_config)
+            _, completed = counter.update(angle, sport_config['maintaining'], sport_config['relaxing'])
+            if completed:
+                rep_times.append(round(frame_idx / fps, 3))
+    elapsed = time.perf_counter() - start
+    summary.update({
+        'count': counter.count,
+        'rep_timestamps': rep_times,
+        'frames': int(len(valid)),
+        'frames_without_person': int(len(valid) - valid.sum()),
+        'video_seconds': round(len(valid) / fps, 3),
+        'processing_seconds': round(elapsed, 3),
+        'inference_seconds': 0.0,
+        'processing_fps': round(len(valid) / elapsed, 2) if elapsed > 0 else 0.0,
+        'cached': True,
+    })
+    return summary
+
+
+def process_video(job):
+    """Count reps in one whole video file; runs inside a worker process"""
+    import cv2
+    from pipeline import stream_predict
+    from video_io import iter_frames
+
+    path, sport = job
+    options = _worker['options']
+    summary = {'video': path, 'sport': sport, 'worker': os.getpid()}
+    if sport not in SPORT_CONFIG:
+        summary['error'] = f'unknown sport: {sport}'
+        return summary
+    sport_config = SPORT_CONFIG[sport]
+    min_reach_frames = int(options['min_reach_frames'])
+
+    cache = _worker['cache']
+    recorder = None
+    if cache is not None:
+        cache_key = cache.make_key(path, model_tag(options['model'], options['backend'], options['imgsz']),
+                                   model_imgsz(options['model'], options['backend'], options['imgsz']),
+                                   options['conf'])
+        cached = cache.load(cache_key)
+        if cached is not None:
+            return count_cached(summary, cached, sport_config, min_reach_frames)
+        recorder = KeypointRecorder()
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        summary['error'] = 'cannot open video'
+        return summary
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    if _worker['model'] is None:
+        from pose_backend import load_pose_model
+        _worker['model'] = load_pose_model(options['model'], options['backend'], options['imgsz'])
+    model = _worker['model']
+    if recorder is not None:
+        # Key the recording by the model that actually runs (the backend may fall back to PyTorch)
+        cache_key = cache.make_key(path, model.name, model.imgsz, options['conf'])
+
+    counter = RepCounter(min_reach_frames)
+    rep_times = []
+    frame_idx = 0
+    no_person = 0
+    infer_ms = 0.0
+
+    start = time.perf_counter()
+    frames = iter_frames(cap, lossless=True, capacity=2 * options['batch_size'])
+    predict_kwargs = dict(imgsz=options['imgsz'], conf=options['conf'], verbose=False)
+    if options['device']:
+        predict_kwargs['device'] = options['device']
+    try:
+        for frame, result in stream_predict(model, frames, options['batch_size'], **predict_kwargs):
+            infer_ms += sum(result.speed.values())
+            kpts = keypoints_array(result)
+            if recorder is not None:
+                recorder.add(kpts)
+            if len(kpts) == 0:
+                no_person += 1
+            else:
+                angle = sport_angle(kpts[0], sport_config)
+                _, completed = counter.update(angle, sport_config['maintaining'], sport_config['relaxing'])
+                if completed:
+                    rep_times.append(round(frame_idx / fps, 3))
+            frame_idx += 1
+    except Exception as e:
+        summary['error'] = str(e)
+    finally:
+        frames.close()
+        cap.release()
+    elapsed = time.perf_counter() - start
+
+    if recorder is not None and 'error' not in summary:
+        cache.save(cache_key, *recorder.arrays(), meta={'video': os.path.basename(path), 'model': model.name,
+                                                        'imgsz': model.imgsz, 'conf': options['conf'],
+                                                        'fps': fps})
+
+    summary.update({
+        'count': counter.count,
+        'rep_timestamps': rep_times,
+        'frames': frame_idx,
+        'frames_without_person': no_person,
+        'video_seconds': round(frame_idx / fps, 3),
+        'processing_seconds': round(elapsed, 3),
+        'inference_seconds': round(infer_ms / 1000, 3),
+        'processing_fps': round(frame_idx / elapsed, 2) if elapsed > 0 else 0.0,
+    })
+    return summary
+
+
+def write_summary(path, summaries, totals):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.lower().endswith('.csv'):
+        fields = ['video', 'sport', 'count', 'rep_timestamps', 'frames', 'frames_without_person',
+                  'video_seconds', 'processing_seconds', 'inference_seconds', 'processing_fps', 'cached', 'worker',
+                  'error']
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            writer.writeheader()
+            for s in summaries:
+                row = dict(s)
+                row['rep_timestamps'] = ' '.join(str(t) for t in s.get('rep_timestamps', []))
+                writer.writerow(row)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'totals': totals, 'videos': summaries}, f, ensure_ascii=False, indent=2)
+
+
+def main():
+    args = parse_args()
+    videos = collect_videos(args.inputs)
+    if not videos:
+        print('No videos found')
+        return
+
+    config = load_threshold_config(args.config)
+    jobs = []
+    for path in videos:
+        sport = os.path.basename(os.path.dirname(os.path.abspath(path))) if args.sport == 'dir' else args.sport
+        jobs.append((path, sport))
+
+    workers = max(1, min(args.workers, len(jobs)))
+    options = {
+        'model': args.model,
+        'config': args.config,
+        'min_reach_frames': config.get('min_reach_frames', 3),
+        'workers': workers,
+        'batch_size': max(1, args.batch_size),
+        'imgsz': args.imgsz,
+        'conf': args.conf,
+        'backend': args.backend,
+        'device': args.device,
+        'cache_dir': None if args.no_cache else args.cache_dir,
+    }
+
+    # Export once up front so workers never race to convert the same model
+    if args.backend in EXPORT_BACKENDS:
+        from pose_backend import export_model
+        try:
+            export_model(args.model, args.backend, args.imgsz)
+        except Exception as e:
+            print(f'{args.backend} export failed, using pytorch: {e}')
+            args.backend = options['backend'] = 'pytorch'
+
+    output = args.output or os.path.join(
+        'output', 'batch_' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+
+    start = time.perf_counter()
+    summaries = []
+    # spawn keeps CUDA/torch state out of forked children
+    ctx = mp.get_context('spawn')
+    with ctx.Pool(workers, initializer=init_worker, initargs=(options,)) as pool:
+        for summary in pool.imap_unordered(process_video, jobs):
+            summaries.append(summary)
+            status = summary.get('error') or f"{summary['count']} reps, {summary['processing_fps']} fps"
+            print(f"[{len(summaries)}/{len(jobs)}] {summary['video']}: {status}")
+    elapsed = time.perf_counter() - start
+
+    summaries.sort(key=lambda s: s['video'])
+    total_frames = sum(s.get('frames', 0) for s in summaries)
+    totals = {
+        'videos': len(summaries),
+        'failed': sum(1 for s in summaries if 'error' in s),
+        'workers': workers,
+        'frames': total_frames,
+        'wall_seconds': round(elapsed, 3),
+        'throughput_fps': round(total_frames / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    write_summary(output, summaries, totals)
+    print(f"Processed {totals['videos']} videos ({totals['frames']} frames) in {totals['wall_seconds']} s "
+          f"-> {output}")
+
+
+if __name__ == '__main__':
+    main()
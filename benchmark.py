@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import platform
+import tempfile
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import torch
+
+from counting import SPORT_CONFIG, RepCounter
+from for_detect.keypoint_store import read_csv_series
+from kinematics import sport_angle, sport_angles
+from overlay import InfoPanel
+
+FIXTURES = {sport: os.path.join('for_detect', 'data', sport, '001.csv') for sport in ('pushup', 'situp', 'squat')}
+FRAME_SIZE = (1280, 720)
+CASES = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for the per-frame counting and rendering path')
+    parser.add_argument('--cases', default=None, nargs='+', help='cases to run (default: all)')
+    parser.add_argument('--repeat', default=7, type=int, help='timed rounds per case (median is reported)')
+    parser.add_argument('--out', default=None, type=str, help='write results to this JSON file')
+    parser.add_argument('--compare', default=None, type=str, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', default=0.2, type=float,
+                        help='allowed slowdown of the median against the baseline (0.2 = 20%%)')
+    parser.add_argument('--threads', default=1, type=int, help='torch threads, fixed for reproducible timings')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    args = parser.parse_args()
+    return args
+
+
+def case(name, unit='frame'):
+    """Register a benchmark: fn(fixtures) -> (run, n); run() does n units of work"""
+    def register(fn):
+        CASES[name] = (fn, unit)
+        return fn
+    return register
+
+
+def load_fixtures():
+    """Recorded keypoints of every exercise as (N, 17, 3) with confidence 1, plus copies fitted to FRAME_SIZE"""
+    series, fitted = {}, {}
+    w, h = FRAME_SIZE
+    for sport, path in FIXTURES.items():
+        xy = read_csv_series(path)
+        series[sport] = np.concatenate([xy, np.ones(xy.shape[:2] + (1,), dtype=np.float32)], axis=-1)
+        scale = min(w / (xy[..., 0].max() * 1.05), h / (xy[..., 1].max() * 1.05))
+        fitted[sport] = series[sport].copy()
+        fitted[sport][..., :2] *= scale
+    return SimpleNamespace(series=series, fitted=fitted, frames=sum(len(s) for s in series.values()))
+
+
+@case('sport_angle')
+def bench_sport_angle(fx):
+    """One exercise's joint angle per frame (replaces calculate_angle)"""
+    items = [(frame, SPORT_CONFIG[sport]) for sport, s in fx.series.items() for frame in s]
+
+    def run():
+        for frame, config in items:
+            sport_angle(frame, config)
+    return run, len(items)
+
+
+@case('sport_angles_all')
+def bench_sport_angles_all(fx):
+    """All exercises' angles per frame in one vectorized call, as the app does"""
+    frames = [frame for s in fx.series.values() for frame in s]
+
+    def run():
+        for frame in frames:
+            sport_angles(frame, SPORT_CONFIG)
+    return run, len(frames)
+
+
+@case('rep_counter')
+def bench_rep_counter(fx):
+    """Angle smoothing, hysteresis and debounce from process_video"""
+    series = [(sport_angle(s, SPORT_CONFIG[sport]).tolist(), SPORT_CONFIG[sport]) for sport, s in fx.series.items()]
+
+    def run():
+        for angles, config in series:
+            counter = RepCounter(3)
+            enter_thr, exit_thr = config['maintaining'], config['relaxing']
+            for angle in angles:
+                counter.update(angle, enter_thr, exit_thr)
+    return run, sum(len(angles) for angles, _ in series)
+
+
+@case('draw_text_with_chinese')
+def bench_draw_text(fx):
+    """App info panel on a 720p frame, count changing every 30 frames and FPS every frame"""
+    from app import ExerciseCounterApp
+    frame = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 96, dtype=np.uint8)
+    app = SimpleNamespace(info_panel=InfoPanel(), current_sport='squat', counter=0, fps=30.0)
+
+    def run():
+        for i in range(fx.frames):
+            app.counter = i // 30
+            app.fps = 25 + i % 10
+            ExerciseCounterApp.draw_text_with_chinese(app, frame)
+    return run, fx.frames
+
+
+@case('demo_plot')
+def bench_demo_plot(fx):
+    """Skeleton drawing of demo.py on a 720p frame"""
+    from demo import plot
+    frame = np.full((FRAME_SIZE[1], FRAME_SIZE[0], 3), 96, dtype=np.uint8)
+    ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
+    poses = [kpts[None] for s in fx.fitted.values() for kpts in s]
+
+    def run():
+        for kpts in poses:
+            plot(frame, kpts, ratio)
+    return run, len(poses)
+
+
+def classifier_fixture():
+    from for_detect.Inference import LSTM, StreamingClassifier
+    torch.manual_seed(0)
+    model = LSTM(17*2, 8, 2, 3, torch.device('cpu')).eval()
+    return model, StreamingClassifier
+
+
+@case('classifier_every_frame')
+def bench_classifier(fx):
+    """LSTM exercise classifier: push and predict on every frame (worst case)"""
+    model, StreamingClassifier = classifier_fixture()
+    frames = [frame[:, :2] for s in fx.series.values() for frame in s]
+
+    def run():
+        classifier = StreamingClassifier(model)
+        for xy in frames:
+            if classifier.push(xy):
+                classifier.predict_proba()
+    return run, len(frames)
+
+
+@case('classifier_voted')
+def bench_classifier_voted(fx):
+    """LSTM exercise classifier gated by ExerciseVoter with its default stride"""
+    from for_detect.Inference import ExerciseVoter
+    model, StreamingClassifier = classifier_fixture()
+    frames = [frame[:, :2] for s in fx.series.values() for frame in s]
+
+    def run():
+        classifier = StreamingClassifier(model)
+        voter = ExerciseVoter()
+        for xy in frames:
+            ready = classifier.push(xy)
+            if voter.observe(xy) and ready:
+                voter.vote(classifier.predict_proba()[0])
+    return run, len(frames)
+
+
+def history_fixture(root, days=365):
+    """App-like state with a year of history on disk"""
+    today = datetime.date.today()
+    data = {'days': {}, 'streak_days': days}
+    for d in range(days):
+        date = (today - datetime.timedelta(days=d)).isoformat()
+        data['days'][date] = {'counts': {sport: d % 40 for sport in SPORT_CONFIG}, 'checked_in': d % 3 == 0}
+    path = os.path.join(root, 'history.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return SimpleNamespace(history_path=path, date_str=today.isoformat(), checked_in=True, streak_days=days,
+                           todays_counts={sport: 0 for sport in SPORT_CONFIG})
+
+
+@case('history_save', unit='call')
+def bench_history_save(fx):
+    """App history save (read-modify-write of a year of history)"""
+    from app import ExerciseCounterApp
+    app = history_fixture(fx.tmp)
+
+    def run():
+        for i in range(20):
+            app.todays_counts['squat'] = i
+            ExerciseCounterApp.save_history(app)
+    return run, 20
+
+
+@case('history_load', unit='call')
+def bench_history_load(fx):
+    """App history load of a year of history"""
+    from app import ExerciseCounterApp
+    app = history_fixture(fx.tmp)
+
+    def run():
+        for _ in range(20):
+            ExerciseCounterApp.load_history(app)
+    return run, 20
+
+
+def measure(run, n, repeat):
+    """Per-unit times in microseconds over `repeat` rounds, after one warm-up round"""
+    run()
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        rounds.append((time.perf_counter() - start) / n * 1e6)
+    rounds = np.array(rounds)
+    median = float(np.median(rounds))
+    return {'n': n, 'median_us': round(median, 3), 'min_us': round(float(rounds.min()), 3),
+            'max_us': round(float(rounds.max()), 3), 'per_second': round(1e6 / median, 1)}
+
+
+def environment():
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'platform': platform.platform(),
+            'processor': platform.processor(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'torch': torch.__version__, 'opencv': cv2.__version__, 'torch_threads': torch.get_num_threads()}
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every case against the baseline; returns the names that regressed"""
+    regressions = []
+    print(f'\n{"case":<24}{"baseline us":>14}{"now us":>12}{"change":>10}')
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f'{name:<24}{"-":>14}{result["median_us"]:>12.2f}{"new":>10}')
+            continue
+        change = result['median_us'] / base['median_us'] - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<24}{base["median_us"]:>14.2f}{result["median_us"]:>12.2f}{change:>+10.1%}{flag}')
+    return regressions
+
+
+def main():
+    args = parse_args()
+    if args.list:
+        for name, (fn, unit) in CASES.items():
+            print(f'{name:<24} per {unit:<6} {fn.__doc__}')
+        return
+    names = args.cases or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        raise SystemExit(f'unknown cases: {", ".join(unknown)} (see --list)')
+
+    torch.set_num_threads(args.threads)
+    fx = load_fixtures()
+    fx.tmp = tempfile.mkdtemp(prefix='bench_')
+    results = {}
+    try:
+        print(f'{fx.frames} fixture frames, {args.repeat} rounds per case')
+        for name in names:
+            fn, unit = CASES[name]
+            run, n = fn(fx)
+            result = dict(measure(run, n, args.repeat), unit=unit)
+            results[name] = result
+            print(f'{name:<24}{result["median_us"]:>10.2f} us/{unit:<6}{result["per_second"]:>12.0f}/s')
+    finally:
+        shutil.rmtree(fx.tmp, ignore_errors=True)
+
+    report = dict(environment(), repeat=args.repeat, results=results)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\nSaved to {args.out}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) above {args.tolerance:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+        print(f'\nNo regressions above {args.tolerance:.0%}')
+
+
+if __name__ == '__main__':
+    main()
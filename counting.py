@@ -0,0 +1,157 @@
+"""
+运动配置与计数逻辑
+Sport configuration and rep counting
+GUI 与命令行工具共用，不依赖界面
+"""
+
+import json
+import os
+
+import numpy as np
+
+# 运动配置
+SPORT_CONFIG = {
+    'squat': {
+        'name': '深蹲',
+        'left_points_idx': [11, 13, 15],
+        'right_points_idx': [12, 14, 16],
+        'maintaining': 100,  # 更宽松：进入<100
+        'relaxing': 160,    # 更宽松：退出>160
+        'side_mode': 'avg',  # 可选: 'avg' | 'left' | 'right'
+    },
+    'pushup': {
+        'name': '俯卧撑',
+        'left_points_idx': [6, 8, 10],
+        'right_points_idx': [5, 7, 9],
+        'maintaining': 150,  # 更宽松：进入>150
+        'relaxing': 120,     # 更宽松：退出<120
+        'side_mode': 'avg',
+    },
+    'situp': {
+        'name': '仰卧起坐',
+        'left_points_idx': [6, 12, 14],
+        'right_points_idx': [5, 11, 13],
+        'maintaining': 120,  # 更宽松：进入<120
+        'relaxing': 140,     # 更宽松：退出>140
+        'side_mode': 'avg',
+    }
+}
+
+DEFAULT_CONFIG_PATH = os.path.join('config', 'thresholds.json')
+
+
+def apply_threshold_config(data, sport_config=SPORT_CONFIG):
+    """将 thresholds.json 内容应用到运动配置"""
+    sports = data.get('sports', {})
+    for sid, cfg in sports.items():
+        if sid in sport_config:
+            sport_config[sid]['maintaining'] = int(cfg.get('maintaining', sport_config[sid]['maintaining']))
+            sport_config[sid]['relaxing'] = int(cfg.get('relaxing', sport_config[sid]['relaxing']))
+            sport_config[sid]['side_mode'] = cfg.get('side_mode', sport_config[sid].get('side_mode', 'avg'))
+
+
+def load_threshold_config(path=DEFAULT_CONFIG_PATH, sport_config=SPORT_CONFIG):
+    """读取并应用阈值配置文件，返回原始配置字典（文件不存在时为空）"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    apply_threshold_config(data, sport_config)
+    return data
+
+
+class RepCounter:
+    """角度平滑 + 阈值迟滞 + 去抖计数"""
+
+    def __init__(self, min_reach_frames=3, smoothing=0.3):
+        self.min_reach_frames = min_reach_frames  # 至少连续N帧处于“到位”状态才计数
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.prev_angle = None
+        self.reaching = False
+        self.reaching_last = False
+        self.reach_frames = 0
+
+    def update(self, angle, enter_thr, exit_thr):
+        """输入一帧原始角度，返回 (平滑角度, 本帧是否完成一次)"""
+        # 角度平滑，降低抖动
+        if self.prev_angle is None:
+            smooth_angle = angle
+        else:
+            smooth_angle = (1 - self.smoothing) * self.prev_angle + self.smoothing * angle
+        self.prev_angle = smooth_angle
+
+        # 使用阈值迟滞+方向自适配
+        if enter_thr < exit_thr:
+            # 进入区：小于enter_thr；退出区：大于exit_thr（如深蹲/仰卧起坐）
+            if smooth_angle < enter_thr:
+                self.reaching = True
+            elif smooth_angle > exit_thr:
+                self.reaching = False
+        else:
+            # 进入区：大于enter_thr；退出区：小于exit_thr（如俯卧撑）
+            if smooth_angle > enter_thr:
+                self.reaching = True
+            elif smooth_angle < exit_thr:
+                self.reaching = False
+
+        # 去抖与计数逻辑
+        completed = False
+        if self.reaching:
+            self.reach_frames += 1
+        else:
+            # 从到位状态退出且持续时间达标 -> 记一次
+            if self.reaching_last and self.reach_frames >= self.min_reach_frames:
+                self.count += 1
+                completed = True
+            self.reach_frames = 0
+
+        self.reaching_last = self.reaching
+        return smooth_angle, completed
+
+
+def smooth_angles(angles, smoothing=0.3):
+    """对整段角度序列做与 RepCounter 相同的指数平滑，angles 形如 (..., T)"""
+    angles = np.asarray(angles, dtype=np.float64)
+    out = np.empty_like(angles)
+    if angles.shape[-1] == 0:
+        return out
+    out[..., 0] = angles[..., 0]
+    for t in range(1, angles.shape[-1]):
+        out[..., t] = (1 - smoothing) * out[..., t - 1] + smoothing * angles[..., t]
+    return out
+
+
+def count_reps_grid(smoothed, enter_thr, exit_thr, min_reach_frames, series_idx=None):
+    """一次遍历平滑角度序列，同时模拟 G 组参数下 RepCounter 的计数结果
+
+    - smoothed: (T,) 或 (S, T) 平滑角度序列（S 如不同侧别）
+    - enter_thr / exit_thr / min_reach_frames: (G,) 参数数组
+    - series_idx: (G,) 每组参数使用 smoothed 的哪一行，默认第 0 行
+    返回 (G,) 计数
+    """
+    smoothed = np.atleast_2d(np.asarray(smoothed, dtype=np.float64))
+    enter_thr = np.asarray(enter_thr, dtype=np.float64)
+    exit_thr = np.asarray(exit_thr, dtype=np.float64)
+    min_reach_frames = np.asarray(min_reach_frames)
+    low_enter = enter_thr < exit_thr
+
+    n = enter_thr.shape[0]
+    series_idx = np.zeros(n, dtype=np.intp) if series_idx is None else np.asarray(series_idx, dtype=np.intp)
+    reaching = np.zeros(n, dtype=bool)
+    reaching_last = np.zeros(n, dtype=bool)
+    reach_frames = np.zeros(n, dtype=np.int64)
+    counts = np.zeros(n, dtype=np.int64)
+    for t in range(smoothed.shape[1]):
+        a = smoothed[series_idx, t]
+        # 与 RepCounter.update 相同的迟滞判断：先判进入，再判退出
+        entered = np.where(low_enter, a < enter_thr, a > enter_thr)
+        exited = np.where(low_enter, a > exit_thr, a < exit_thr)
+        reaching = entered | (reaching & ~exited)
+        counts += ~reaching & reaching_last & (reach_frames >= min_reach_frames)
+        reach_frames = np.where(reaching, reach_frames + 1, 0)
+        reaching_last = reaching
+    return counts
@@ -1,12 +1,17 @@
 import os
 import cv2
 import numpy as np
-import math
 import datetime
+import time
 import argparse
-from ultralytics import YOLO
 from ultralytics.utils.plotting import Annotator, Colors
 from copy import deepcopy
+from kinematics import keypoints_array, sport_angle
+from keypoint_cache import DEFAULT_CACHE_DIR, KeypointCache, KeypointRecorder, replay_keypoints
+from pipeline import stream_predict
+from pose_backend import BACKENDS, load_pose_model, model_imgsz, model_tag
+from video_io import WRITER_POLICIES, AsyncVideoWriter, iter_frames
+from sampling_profiler import SamplingProfiler
 
 sport_list = {
     'sit-up': {
@@ -36,50 +41,7 @@ sport_list = {
 }
 
 
-def calculate_angle(key_points, left_points_idx, right_points_idx):
-    def _calculate_angle(line1, line2):
-        # Calculate the slope of two straight lines
-        slope1 = math.atan2(line1[3] - line1[1], line1[2] - line1[0])
-        slope2 = math.atan2(line2[3] - line2[1], line2[2] - line2[0])
-
-        # Convert radians to angles
-        angle1 = math.degrees(slope1)
-        angle2 = math.degrees(slope2)
-
-        # Calculate angle difference
-        angle_diff = abs(angle1 - angle2)
-
-        # Ensure the angle is between 0 and 180 degrees
-        if angle_diff > 180:
-            angle_diff = 360 - angle_diff
-
-        return angle_diff
-
-    left_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in left_points_idx]
-    right_points = [[key_points.data[0][i][0], key_points.data[0][i][1]] for i in right_points_idx]
-    line1_left = [
-        left_points[1][0].item(), left_points[1][1].item(),
-        left_points[0][0].item(), left_points[0][1].item()
-    ]
-    line2_left = [
-        left_points[1][0].item(), left_points[1][1].item(),
-        left_points[2][0].item(), left_points[2][1].item()
-    ]
-    angle_left = _calculate_angle(line1_left, line2_left)
-    line1_right = [
-        right_points[1][0].item(), right_points[1][1].item(),
-        right_points[0][0].item(), right_points[0][1].item()
-    ]
-    line2_right = [
-        right_points[1][0].item(), right_points[1][1].item(),
-        right_points[2][0].item(), right_points[2][1].item()
-    ]
-    angle_right = _calculate_angle(line1_right, line2_right)
-    angle = (angle_left + angle_right) / 2
-    return angle
-
-
-def plot(pose_result, plot_size_redio, show_points=None, show_skeleton=None):
+def plot(image, key_points, plot_size_redio, show_points=None, show_skeleton=None):
     class _Annotator(Annotator):
 
         def kpts(self, kpts, shape=(640, 640), radius=5, line_thickness=2, kpt_line=True):
@@ -139,10 +101,9 @@ def plot(pose_result, plot_size_redio, show_points=None, show_skeleton=None):
                 # Convert im back to PIL and update draw
                 self.fromarray(self.im)
 
-    annotator = _Annotator(deepcopy(pose_result.orig_img))
-    if pose_result.keypoints is not None:
-        for k in reversed(pose_result.keypoints.data):
-            annotator.kpts(k, pose_result.orig_shape, kpt_line=True)
+    annotator = _Annotator(deepcopy(image))
+    for k in reversed(key_points):
+        annotator.kpts(k, image.shape[:2], kpt_line=True)
     return annotator.result()
 
 
@@ -180,6 +141,19 @@ def parse_args():
     parser.add_argument('--input', default="0", type=str, help='path to input video')
     parser.add_argument('--save_dir', default=None, type=str, help='path to save output')
     parser.add_argument('--show', default=True, type=bool, help='show the result')
+    parser.add_argument('--batch_size', default=8, type=int, help='frames per inference call for video files')
+    parser.add_argument('--imgsz', default=640, type=int, help='inference size')
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS,
+                        help='pose inference backend; exported models are cached beside the .pt file')
+    parser.add_argument('--conf', default=0.25, type=float, help='confidence threshold')
+    parser.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, type=str, help='keypoint cache directory')
+    parser.add_argument('--no_cache', action='store_true', help='always run pose inference on video files')
+    parser.add_argument('--writer_policy', default='block', choices=WRITER_POLICIES,
+                        help='when the encode queue is full: wait, drop the frame, or record at half resolution')
+    parser.add_argument('--writer_queue', default=64, type=int, help='frames buffered for the background encoder')
+    parser.add_argument('--profile', default=0, type=int, metavar='SECONDS',
+                        help='sample Python stacks and torch ops for the first N seconds; writes a collapsed-stack '
+                             'flamegraph file and a top-functions summary to the save directory (or ./profiles)')
     args = parser.parse_args()
     return args
 
@@ -187,8 +161,6 @@ def parse_args():
 def main():
     # Obtain relevant parameters
     args = parse_args()
-    # Load the YOLOv8 model
-    model = YOLO(args.model)
 
     # Open the video file or camera
     if args.input.isnumeric():
@@ -206,7 +178,8 @@ def main():
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
         fps = cap.get(cv2.CAP_PROP_FPS)
         size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
-        output = cv2.VideoWriter(os.path.join(save_dir, 'result.mp4'), fourcc, fps, size)
+        output = AsyncVideoWriter(os.path.join(save_dir, 'result.mp4'), fourcc, fps, size,
+                                  capacity=args.writer_queue, policy=args.writer_policy)
 
     # Set variables to record motion status
     reaching = False
@@ -214,85 +187,131 @@ def main():
     state_keep = False
     counter = 0
 
+    # Decode ahead in a background thread; video files are inferred in batches,
+    # camera input always uses the newest frame
+    is_camera = args.input.isnumeric()
+    batch_size = 1 if is_camera else max(1, args.batch_size)
+    frames = iter_frames(cap, lossless=not is_camera, capacity=2 if is_camera else 2 * batch_size)
+
+    # Video files: replay keypoints cached by an earlier run with the same model settings,
+    # otherwise record this run's keypoints for the next one
+    cache = cached = recorder = None
+    if not is_camera and not args.no_cache:
+        cache = KeypointCache(args.cache_dir)
+        cache_key = cache.make_key(args.input, model_tag(args.model, args.backend, args.imgsz),
+                                   model_imgsz(args.model, args.backend, args.imgsz), args.conf)
+        cached = cache.load(cache_key)
+        if cached is None:
+            recorder = KeypointRecorder()
+        else:
+            print('Using cached keypoints, pose inference skipped')
+
+    # Each item is (frame, keypoints (P, 17, 3), inference ms or None when replayed)
+    if cached is not None:
+        cached_points, cached_valid, _ = cached
+        poses = ((frame, replay_keypoints(cached_points, cached_valid, i), None) for i, frame in enumerate(frames))
+    else:
+        # Load the YOLOv8 model with the selected backend
+        model = load_pose_model(args.model, args.backend, args.imgsz)
+        if recorder is not None:
+            # Key the recording by the model that actually runs (the backend may fall back to PyTorch)
+            cache_key = cache.make_key(args.input, model.name, model.imgsz, args.conf)
+        poses = (
+            (frame, keypoints_array(result), result.speed['inference'])
+            for frame, result in stream_predict(model, frames, batch_size, imgsz=args.imgsz, conf=args.conf)
+        )
+
+    # On-demand profile of the processing loop
+    profiler = profile_thread = None
+    if args.profile > 0:
+        profiler = SamplingProfiler()
+        profile_dir = save_dir if args.save_dir is not None else 'profiles'
+        profile_thread = profiler.run_for(args.profile, profile_dir, on_done=lambda paths: print(
+            f"Profile written: {paths['collapsed']}, {paths['summary']}"))
+
     # Loop through the video frames
-    while cap.isOpened():
-        # Read a frame from the video
-        success, frame = cap.read()
-
-        if success:
-            # Set plot size redio for inputs with different resolutions
-            plot_size_redio = max(frame.shape[1] / 960, frame.shape[0] / 540)
-
-            # Run YOLOv8 inference on the frame
-            results = model(frame)
-
-            # Preventing errors caused by special scenarios
-            if results[0].keypoints.shape[1] == 0:
-                if args.show:
-                    put_text(frame, 'No Object', counter,
-                             round(1000 / results[0].speed['inference'], 2), plot_size_redio)
-                    scale = 640 / max(frame.shape[0], frame.shape[1])
-                    show_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
-                    cv2.imshow("YOLOv8 Inference", show_frame)
-                if args.save_dir is not None:
-                    output.write(frame)
-                # Break the loop if 'q' is pressed
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-                continue
-
-            # Get hyperparameters
-            left_points_idx = sport_list[args.sport]['left_points_idx']
-            right_points_idx = sport_list[args.sport]['right_points_idx']
-
-            # Calculate angle
-            angle = calculate_angle(results[0].keypoints, left_points_idx, right_points_idx)
-
-            # Determine whether to complete once
-            if angle < sport_list[args.sport]['maintaining']:
-                reaching = True
-            if angle > sport_list[args.sport]['relaxing']:
-                reaching = False
-
-            if reaching != reaching_last:
-                reaching_last = reaching
-                if reaching:
-                    state_keep = True
-                if not reaching and state_keep:
-                    counter += 1
-                    state_keep = False
-
-            # Visualize the results on the frame
-            annotated_frame = plot(
-                results[0], plot_size_redio,
-                # sport_list[args.sport]['concerned_key_points_idx'],
-                # sport_list[args.sport]['concerned_skeletons_idx']
-            )
-            # annotated_frame = results[0].plot(boxes=False)
-
-            # add relevant information to frame
-            put_text(
-                annotated_frame, args.sport, counter, round(1000 / results[0].speed['inference'], 2), plot_size_redio)
-
-            # Display the annotated frame
+    last_time = time.perf_counter()
+    for frame, key_points, infer_ms in poses:
+        # Set plot size redio for inputs with different resolutions
+        plot_size_redio = max(frame.shape[1] / 960, frame.shape[0] / 540)
+        if recorder is not None:
+            recorder.add(key_points)
+
+        # Inference FPS, or loop FPS when keypoints come from the cache
+        now = time.perf_counter()
+        fps_value = round(1000 / infer_ms, 2) if infer_ms else round(1 / max(now - last_time, 1e-6), 2)
+        last_time = now
+
+        # Preventing errors caused by special scenarios
+        if len(key_points) == 0:
             if args.show:
-                scale = 640 / max(annotated_frame.shape[0], annotated_frame.shape[1])
-                show_frame = cv2.resize(annotated_frame, (0, 0), fx=scale, fy=scale)
+                put_text(frame, 'No Object', counter, fps_value, plot_size_redio)
+                scale = 640 / max(frame.shape[0], frame.shape[1])
+                show_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
                 cv2.imshow("YOLOv8 Inference", show_frame)
-
             if args.save_dir is not None:
-                output.write(annotated_frame)
+                output.write(frame)
             # Break the loop if 'q' is pressed
             if cv2.waitKey(1) & 0xFF == ord("q"):
                 break
-        else:
-            # Break the loop if the end of the video is reached
+            continue
+
+        # Calculate angle
+        angle = sport_angle(key_points[0], sport_list[args.sport])
+
+        # Determine whether to complete once
+        if angle < sport_list[args.sport]['maintaining']:
+            reaching = True
+        if angle > sport_list[args.sport]['relaxing']:
+            reaching = False
+
+        if reaching != reaching_last:
+            reaching_last = reaching
+            if reaching:
+                state_keep = True
+            if not reaching and state_keep:
+                counter += 1
+                state_keep = False
+
+        # Visualize the results on the frame
+        annotated_frame = plot(
+            frame, key_points, plot_size_redio,
+            # sport_list[args.sport]['concerned_key_points_idx'],
+            # sport_list[args.sport]['concerned_skeletons_idx']
+        )
+
+        # add relevant information to frame
+        put_text(annotated_frame, args.sport, counter, fps_value, plot_size_redio)
+
+        # Display the annotated frame
+        if args.show:
+            scale = 640 / max(annotated_frame.shape[0], annotated_frame.shape[1])
+            show_frame = cv2.resize(annotated_frame, (0, 0), fx=scale, fy=scale)
+            cv2.imshow("YOLOv8 Inference", show_frame)
+
+        if args.save_dir is not None:
+            output.write(annotated_frame)
+        # Break the loop if 'q' is pressed
+        if cv2.waitKey(1) & 0xFF == ord("q"):
             break
+    else:
+        # Only a fully processed video is cached
+        if recorder is not None:
+            cache.save(cache_key, *recorder.arrays(), meta={'video': os.path.basename(args.input),
+                                                            'model': model.name, 'imgsz': model.imgsz,
+                                                            'conf': args.conf, 'fps': cap.get(cv2.CAP_PROP_FPS)})
+
+    # A profile still running when the input ends keeps the samples taken so far
+    if profiler is not None:
+        profiler.finish()
+        profile_thread.join()
 
     # Release the video capture object and close the display window
+    frames.close()
     cap.release()
     if args.save_dir is not None:
-        output.release()
+        # Flush the frames still queued for encoding
+        print(f'Recording: {output.release()}')
     cv2.destroyAllWindows()
 
 
@@ -0,0 +1,93 @@
+"""
+Tk 视频显示桥
+Thread-safe video display bridge for Tk
+处理线程只投递最新一帧；Tk 主循环按显示刷新率用 root.after 取帧，
+在主线程完成缩放/颜色转换并复用同一个 PhotoImage，来不及显示的帧直接跳过
+"""
+
+import threading
+
+import cv2
+from PIL import Image, ImageTk
+
+
+class DisplayBridge:
+    """处理线程 → Tk 主线程的单帧邮箱
+
+    - post(): 任意线程调用，只保留最新一帧，被覆盖的帧计入 frames_skipped
+    - 每个刷新周期在主线程显示最新帧，并调用 on_refresh（如刷新状态标签）
+    - 显示尺寸不变时复用 PhotoImage 缓冲，只 paste 新像素
+    """
+
+    def __init__(self, root, widget, fps=60, on_refresh=None):
+        self.root = root
+        self.widget = widget
+        self.interval_ms = max(1, int(1000 / max(1, fps)))
+        self.on_refresh = on_refresh
+
+        self.frames_shown = 0
+        self.frames_skipped = 0
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._dirty = False
+        self._photo = None
+        self._after_id = None
+
+    def start(self):
+        """开始按刷新率轮询"""
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._poll)
+        return self
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def post(self, frame=None):
+        """投递一帧（BGR）；frame 为 None 时只请求刷新状态"""
+        with self._lock:
+            if frame is not None:
+                if self._frame is not None:
+                    self.frames_skipped += 1
+                self._frame = frame
+            self._dirty = True
+
+    def _poll(self):
+        with self._lock:
+            frame, self._frame = self._frame, None
+            dirty, self._dirty = self._dirty, False
+        try:
+            if frame is not None:
+                self._show(frame)
+            if dirty and self.on_refresh is not None:
+                self.on_refresh()
+        except Exception as e:
+            print(f"显示更新错误: {e}")
+        self._after_id = self.root.after(self.interval_ms, self._poll)
+
+    def _show(self, frame):
+        # 先缩放到显示区域再转换颜色空间，减少像素处理量
+        label_width = self.widget.winfo_width()
+        label_height = self.widget.winfo_height()
+        if label_width > 1 and label_height > 1:
+            h, w = frame.shape[:2]
+            scale = min(label_width / w, label_height / h)
+            new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+            if (new_w, new_h) != (w, h):
+                interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+                frame = cv2.resize(frame, (new_w, new_h), interpolation=interpolation)
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        if self._photo is None or (self._photo.width(), self._photo.height()) != img.size:
+            self._photo = ImageTk.PhotoImage(image=img)
+            self.widget.configure(image=self._photo, text='')
+            self.widget.image = self._photo
+        else:
+            # 尺寸不变：原地更新已有缓冲，不再创建新的 Tk 图像
+            self._photo.paste(img)
+        self.frames_shown += 1
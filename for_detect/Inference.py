@@ -1,5 +1,7 @@
 import torch
 import torch.nn as nn
+import numpy as np
+from collections import deque
 import os
 import cv2
 import argparse
@@ -26,12 +28,190 @@ class LSTM(nn.Module):
         return out
 
 
+class StreamingClassifier:
+    """Sliding-window exercise classifier fed one pose per frame, for one or more streams.
+
+    Each stream keeps a preallocated (window, 34) circular buffer with a running sum and
+    sum of squares, so the window mean/std is updated in O(34) per frame. Windows are
+    normalized into a persistent input tensor and all ready streams run in one LSTM call
+    under torch.inference_mode(). Input and normalization match training (whole-window
+    mean and unbiased std).
+    """
+
+    def __init__(self, model, streams=1, window=5, num_points=17, resync_interval=1000):
+        self.model = model
+        self.streams = streams
+        self.window = window
+        self.dim = num_points * 2
+        self.resync_interval = resync_interval
+        self.device = getattr(model, 'device', torch.device('cpu'))
+
+        self.buffer = np.zeros((streams, window, self.dim), dtype=np.float32)
+        self.head = np.zeros(streams, dtype=np.int64)     # next row to overwrite
+        self.filled = np.zeros(streams, dtype=np.int64)
+        self.total = np.zeros(streams, dtype=np.float64)  # running sum over the window
+        self.total_sq = np.zeros(streams, dtype=np.float64)
+        self.pushes = np.zeros(streams, dtype=np.int64)
+
+        pin = torch.device(self.device).type == 'cuda'
+        self.host_input = torch.zeros((streams, window, self.dim), dtype=torch.float32, pin_memory=pin)
+        self.host_view = self.host_input.numpy()
+        self.device_input = self.host_input if not pin else torch.zeros_like(self.host_input, device=self.device)
+        self._row_sums = np.zeros(2, dtype=np.float64)
+
+    def reset(self, stream=None):
+        streams = slice(None) if stream is None else stream
+        self.head[streams] = 0
+        self.filled[streams] = 0
+        self.total[streams] = 0.0
+        self.total_sq[streams] = 0.0
+        self.pushes[streams] = 0
+
+    def push(self, xy, stream=0, scale=None):
+        """Add one frame of (17, 2) keypoint coordinates; returns True once the window is full"""
+        head = self.head[stream]
+        row = self.buffer[stream, head]
+        if self.filled[stream] == self.window:
+            self.total[stream] -= row.sum(dtype=np.float64)
+            self.total_sq[stream] -= np.dot(row, row)
+        target = row.reshape(-1, 2)
+        if scale is None:
+            target[...] = xy
+        else:
+            np.multiply(xy, scale, out=target)
+        self.total[stream] += row.sum(dtype=np.float64)
+        self.total_sq[stream] += np.dot(row, row)
+
+        self.head[stream] = (head + 1) % self.window
+        self.filled[stream] = min(self.filled[stream] + 1, self.window)
+        self.pushes[stream] += 1
+        if self.pushes[stream] % self.resync_interval == 0:
+            # Bound floating point drift of the running sums
+            window = self.buffer[stream]
+            self.total[stream] = window.sum(dtype=np.float64)
+            self.total_sq[stream] = np.square(window, dtype=np.float64).sum()
+        return self.filled[stream] == self.window
+
+    def ready(self, stream=0):
+        return self.filled[stream] == self.window
+
+    def _stage(self, slot, stream):
+        """Copy a stream's window in time order into the input tensor row `slot`, normalized in place"""
+        n = self.window * self.dim
+        mean = self.total[stream] / n
+        var = (self.total_sq[stream] - self.total[stream] * mean) / (n - 1)
+        std = max(np.sqrt(max(var, 0.0)), 1e-6)
+        head = self.head[stream]
+        out = self.host_view[slot]
+        out[:self.window - head] = self.buffer[stream, head:]
+        out[self.window - head:] = self.buffer[stream, :head]
+        out -= mean
+        out /= std
+
+    def predict_proba(self, streams=None):
+        """Class probabilities (len(streams), classes) from one batched LSTM call; streams must be ready"""
+        if streams is None:
+            streams = range(self.streams)
+        count = 0
+        for slot, stream in enumerate(streams):
+            self._stage(slot, stream)
+            count = slot + 1
+        if count == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.device_input is not self.host_input:
+            self.device_input[:count].copy_(self.host_input[:count], non_blocking=True)
+        with torch.inference_mode():
+            probs = self.model(self.device_input[:count])
+        return probs.cpu().numpy()
+
+    def predict(self, stream=0):
+        """Class index for a single ready stream"""
+        return int(self.predict_proba((stream,))[0].argmax())
+
+
+class ExerciseVoter:
+    """Decides when to run the classifier and smooths its decisions for one stream.
+
+    - The classifier runs every `stride` frames, or sooner when the pose motion energy
+      (mean keypoint displacement relative to body size, smoothed) changes by more than
+      `energy_change` relative to its value at the last run.
+    - Decisions are a confidence-weighted vote: class probabilities summed over the last
+      `votes` runs.
+    - The active exercise only switches after another class has won the vote for at
+      least `min_dwell` frames, so a few bad windows can't switch counters mid-rep.
+    """
+
+    def __init__(self, stride=5, votes=5, min_dwell=30, energy_change=0.5, energy_smoothing=0.2):
+        self.stride = max(1, int(stride))
+        self.votes = max(1, int(votes))
+        self.min_dwell = min_dwell
+        self.energy_change = energy_change
+        self.energy_smoothing = energy_smoothing
+        self.reset()
+
+    def reset(self):
+        self.label = None
+        self.frames = 0
+        self.runs = 0
+        self.switches = 0
+        self.energy = 0.0
+        self._history = deque(maxlen=self.votes)
+        self._prev = None
+        self._since_run = self.stride
+        self._energy_at_run = None
+        self._candidate = None
+        self._candidate_since = 0
+
+    def observe(self, xy):
+        """Call once per frame with (17, 2) keypoints; returns True when the classifier should run"""
+        self.frames += 1
+        self._since_run += 1
+        if self._prev is not None:
+            size = max(float(np.ptp(xy[:, 0])), float(np.ptp(xy[:, 1])), 1.0)
+            motion = float(np.abs(xy - self._prev).mean()) / size
+            self.energy += self.energy_smoothing * (motion - self.energy)
+        if self._prev is None:
+            self._prev = np.array(xy, dtype=np.float32)
+        else:
+            self._prev[...] = xy
+
+        due = self._since_run >= self.stride
+        if not due and self._energy_at_run is not None and self._since_run > 1:
+            reference = max(self._energy_at_run, 1e-3)
+            due = abs(self.energy - self._energy_at_run) / reference > self.energy_change
+        if due:
+            self._since_run = 0
+            self._energy_at_run = self.energy
+        return due
+
+    def vote(self, probs):
+        """Add one classifier output (class probabilities); returns the active class index"""
+        self.runs += 1
+        self._history.append(np.asarray(probs, dtype=np.float64))
+        winner = int(np.sum(self._history, axis=0).argmax())
+        if self.label is None:
+            self.label = winner
+        elif winner == self.label:
+            self._candidate = None
+        elif winner != self._candidate:
+            self._candidate = winner
+            self._candidate_since = self.frames
+        elif self.frames - self._candidate_since >= self.min_dwell:
+            self.label = winner
+            self._candidate = None
+            self.switches += 1
+        return self.label
+
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--model_pose', default=r'../yolov8s-pose.pt', type=str, help='Path to pose model weight')
     parser.add_argument('--checkpoint', default=r'./checkpoint/', type=str, help='Path to saved checkpoint')
     parser.add_argument('--device', default='cuda:0', type=str, help='Inference device')
     parser.add_argument('--input', default='0', type=str, help='Path to input video or camera index')
+    parser.add_argument('--stride', default=5, type=int, help='Run the classifier every N frames')
+    parser.add_argument('--votes', default=5, type=int, help='Number of classifier outputs in the vote')
+    parser.add_argument('--min_dwell', default=30, type=int, help='Frames a new exercise must keep winning before switching')
     args = parser.parse_args()
     return args
 
@@ -49,26 +229,20 @@ def inference(args):
     print(idx_2_category)
 
     cap = cv2.VideoCapture(args.input)
-    pose_key_point_frames = []
+    classifier = StreamingClassifier(detect_model)
+    voter = ExerciseVoter(args.stride, args.votes, args.min_dwell)
     while cap.isOpened():
         success, frame = cap.read()
         if success:
             # Get pose key-points by YOLOv8
             # frame = cv2.resize(frame, (512, 512), interpolation=cv2.INTER_CUBIC)
             pose_results = yolo(frame)
-            pose_data = pose_results[0].keypoints.data[0, :, 0:2]
-            pose_key_point_frames.append(pose_data.tolist())
-            if len(pose_key_point_frames) == 5:
-                input_data = torch.tensor(pose_key_point_frames)
-                input_data = input_data.reshape(5, 17 * 2)
-                x_mean, x_std = torch.mean(input_data), torch.std(input_data)
-                input_data = (input_data - x_mean) / x_std
-                input_data = input_data.unsqueeze(dim=0)
-                input_data = input_data.to(device)
-                det_result = detect_model(input_data)
+            pose_data = pose_results[0].keypoints.data[0, :, 0:2].cpu().numpy()
+            ready = classifier.push(pose_data)
+            if voter.observe(pose_data) and ready:
+                det_result = classifier.predict_proba()[0]
                 print(det_result)
-                print(idx_2_category[str(det_result.argmax().cpu().item())])
-                del pose_key_point_frames[0]
+                print(idx_2_category[str(voter.vote(det_result))])
 
             cv2.imshow("YOLOv8 Inference", frame)
             if cv2.waitKey(1) & 0xFF == ord("q"):
@@ -0,0 +1,160 @@
+import os
+import time
+import argparse
+import multiprocessing as mp
+import cv2
+import numpy as np
+import torch
+from keypoint_store import KeypointStore, file_hash
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Per-process state set by init_worker
+_model = None
+_predict_kwargs = {}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract keypoints from <input_dir>/<exercise>/*.mp4 into a keypoint store')
+    parser.add_argument('--input_dir', default=r'../inputs', type=str, help='Folder with one sub-folder of videos per exercise')
+    parser.add_argument('--store', default=r'./data_store', type=str, help='Keypoint store to write')
+    parser.add_argument('--model', default=r'../yolov8s-pose.pt', type=str, help='Path to model weight')
+    parser.add_argument('--workers', default=2, type=int, help='Worker processes, each with its own model')
+    parser.add_argument('--batch', default=16, type=int, help='Frames per inference batch')
+    parser.add_argument('--imgsz', default=640, type=int, help='Inference size')
+    parser.add_argument('--conf', default=0.25, type=float, help='Detection confidence threshold')
+    parser.add_argument('--device', default=None, type=str, help='Inference device (default: auto)')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'int16'], help='Store dtype')
+    parser.add_argument('--force', action='store_true', help='Re-extract videos that are already in the store or were skipped')
+    args = parser.parse_args()
+    return args
+
+
+def find_videos(input_dir):
+    """[(label, path)] for every video in <input_dir>/<label>/, sorted"""
+    videos = []
+    for label in sorted(os.listdir(input_dir)):
+        folder = os.path.join(input_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append((label, os.path.join(folder, filename)))
+    return videos
+
+
+def init_worker(model_path, threads, predict_kwargs):
+    global _model, _predict_kwargs
+    from ultralytics import YOLO
+    # Split the CPU between workers instead of letting every process grab all cores
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    _model = YOLO(model_path)
+    _predict_kwargs = predict_kwargs
+
+
+def first_person(result):
+    """(17, 2) keypoints of the first detected person, or None"""
+    keypoints = result.keypoints
+    if keypoints is None or len(keypoints.data) == 0:
+        return None
+    return keypoints.data[0, :, 0:2].cpu().numpy()
+
+
+def extract(task):
+    """Worker: run batched pose inference over one video, return its (frames, 17, 2) keypoints.
+
+    Frames without a person repeat the previous keypoints so the series stays continuous;
+    leading frames without a person are dropped.
+    """
+    label, path, batch = task
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    series, frames, missing, total = [], [], 0, 0
+    last = None
+
+    def flush():
+        nonlocal last, missing
+        for result in _model.predict(frames, stream=True, verbose=False, **_predict_kwargs):
+            person = first_person(result)
+            if person is None:
+                missing += 1
+                person = last
+            if person is not None:
+                series.append(person)
+                last = person
+        frames.clear()
+
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        total += 1
+        frames.append(frame)
+        if len(frames) == batch:
+            flush()
+    if frames:
+        flush()
+    cap.release()
+    keypoints = np.stack(series) if series else np.zeros((0, 17, 2), dtype=np.float32)
+    return {'label': label, 'path': path, 'keypoints': keypoints, 'frames': total, 'missing': missing,
+            'seconds': time.perf_counter() - start, 'worker': os.getpid()}
+
+
+def build(args):
+    store = KeypointStore(args.store)
+    videos = find_videos(args.input_dir)
+    tasks, seen, skipped = [], set(), 0
+    for label, path in videos:
+        digest = file_hash(path)
+        if digest in seen or (not args.force and store.has_hash(digest)):
+            skipped += 1
+            continue
+        seen.add(digest)
+        tasks.append((label, path, digest))
+    print(f'{len(videos)} videos, {skipped} skipped (already stored, recorded as skipped, or duplicate), {len(tasks)} to process')
+    if not tasks:
+        return store
+
+    workers = max(1, min(args.workers, len(tasks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    predict_kwargs = {'imgsz': args.imgsz, 'conf': args.conf}
+    if args.device is not None:
+        predict_kwargs['device'] = args.device
+    hashes = {path: digest for _, path, digest in tasks}
+    per_worker = {}
+    start = time.perf_counter()
+    # spawn: CUDA cannot be used in forked children
+    context = mp.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker, initargs=(args.model, threads, predict_kwargs)) as pool:
+        jobs = [(label, path, args.batch) for label, path, _ in tasks]
+        for done in pool.imap_unordered(extract, jobs):
+            # Only the main process writes the store, so the index is never written concurrently
+            name = os.path.splitext(os.path.basename(done['path']))[0]
+            source = os.path.relpath(done['path'], args.input_dir).replace(os.sep, '/')
+            if len(done['keypoints']):
+                store.add(done['label'], name, done['keypoints'], dtype=args.dtype,
+                          source=source, hash=hashes[done['path']], missing=done['missing'])
+            else:
+                # Recorded as skipped so later runs do not decode it again (unless --force)
+                store.add_skipped(done['label'], name, source=source, hash=hashes[done['path']],
+                                  frames=done['frames'], reason='no person detected')
+                print(f'{done["path"]}: no person detected, recorded as skipped')
+            fps = done['frames'] / max(done['seconds'], 1e-9)
+            print(f'[worker {done["worker"]}] {done["path"]}: {done["frames"]} frames, '
+                  f'{done["missing"]} without a person, {fps:.1f} fps')
+            frames, seconds = per_worker.get(done['worker'], (0, 0.0))
+            per_worker[done['worker']] = (frames + done['frames'], seconds + done['seconds'])
+    elapsed = time.perf_counter() - start
+
+    total = 0
+    for worker, (frames, seconds) in sorted(per_worker.items()):
+        total += frames
+        print(f'worker {worker}: {frames} frames in {seconds:.1f} s, {frames / max(seconds, 1e-9):.1f} fps')
+    print(f'total: {total} frames in {elapsed:.1f} s, {total / max(elapsed, 1e-9):.1f} fps with {workers} workers')
+    return store
+
+
+if __name__ == '__main__':
+    cfg = parse_args()
+    build(cfg)
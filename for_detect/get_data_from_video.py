@@ -3,6 +3,7 @@ import cv2
 import os
 from ultralytics import YOLO
 import argparse
+from keypoint_store import KeypointStore, file_hash
 
 
 def parse_args():
@@ -11,6 +12,11 @@ def parse_args():
     parser.add_argument('--input_video', default=r'../inputs/pushup.mp4', type=str, help='Path to input video')
     parser.add_argument('--data_save_path', default=r'./data_without_resize/pushup/001.csv', type=str, help='Path to save data')
     parser.add_argument('--data_len', default=5, type=int, help='Sequence length')
+    parser.add_argument('--store', default=None, type=str,
+                        help='Write per-frame keypoints into this keypoint store instead of a CSV')
+    parser.add_argument('--label', default=None, type=str,
+                        help='Exercise label in the store (default: parent folder of --data_save_path)')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'int16'], help='Store dtype')
     args = parser.parse_args()
     return args
 
@@ -18,8 +24,10 @@ def parse_args():
 def collect_data(args):
     model = YOLO(args.model)
     cap = cv2.VideoCapture(args.input_video)
-    data = open(args.data_save_path, 'w', newline='')
-    writer = csv.writer(data)
+    if args.store is None:
+        data = open(args.data_save_path, 'w', newline='')
+        writer = csv.writer(data)
+    frames = []
     data_row = []
     while cap.isOpened():
         # Read a frame from the video
@@ -29,10 +37,13 @@ def collect_data(args):
             results = model(frame)
             ori_data = results[0].keypoints.data[0, :, 0:2]
             ori_data = ori_data.tolist()
-            data_row.append(ori_data)
-            if len(data_row) == args.data_len:
-                writer.writerow(data_row)
-                del data_row[0]
+            if args.store is not None:
+                frames.append(ori_data)
+            else:
+                data_row.append(ori_data)
+                if len(data_row) == args.data_len:
+                    writer.writerow(data_row)
+                    del data_row[0]
 
             frame = results[0].plot(boxes=False)
 
@@ -42,7 +53,13 @@ def collect_data(args):
         else:
             break
 
-    data.close()
+    if args.store is not None:
+        label = args.label or os.path.basename(os.path.dirname(os.path.abspath(args.data_save_path)))
+        name = os.path.splitext(os.path.basename(args.input_video))[0]
+        KeypointStore(args.store).add(label, name, frames, dtype=args.dtype,
+                                      source=os.path.basename(args.input_video), hash=file_hash(args.input_video))
+    else:
+        data.close()
     cap.release()
     cv2.destroyAllWindows()
 
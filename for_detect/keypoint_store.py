@@ -0,0 +1,175 @@
+import os
+import csv
+import json
+import hashlib
+import argparse
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+INDEX_FILE = 'index.json'
+STORE_VERSION = 1
+# int16 stores coordinates in units of 1/4 pixel, enough for frames up to 8191 px wide
+INT16_SCALE = 0.25
+
+
+def read_csv_series(path):
+    """Rebuild the per-frame (N, 17, 2) series from a legacy sliding-window CSV.
+
+    Each row holds consecutive frames as JSON-style lists and advances by one frame, so the
+    series is the first row followed by the last frame of every later row. Cells are parsed
+    with json.loads, never eval.
+    """
+    frames = []
+    with open(path, 'r', newline='') as f:
+        for row in csv.reader(f):
+            if not row:
+                continue
+            cells = [json.loads(cell) for cell in row]
+            if frames:
+                frames.append(cells[-1])
+            else:
+                frames.extend(cells)
+    return np.asarray(frames, dtype=np.float32).reshape(-1, 17, 2)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 of a file's content, used to skip sources that are already in the store"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class KeypointStore:
+    """Per-frame keypoint dataset: one .npy array (frames, 17, 2) per video plus an index.
+
+    Layout:
+        <root>/index.json          version, per-video metadata (label, file, frames, dtype, scale, ...)
+                                   and sources that yielded no keypoints ("skipped")
+        <root>/<label>/<name>.npy  float32 pixels, or int16 in units of `scale` pixels
+
+    Arrays are opened with memory mapping, and training windows are zero-copy stride views
+    over them, so a frame is stored once instead of once per window.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.videos = []
+        self.skipped = []
+        self._arrays = {}
+        path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') != STORE_VERSION:
+                raise ValueError(f'unsupported keypoint store version: {index.get("version")}')
+            self.videos = index['videos']
+            self.skipped = index.get('skipped', [])
+
+    @staticmethod
+    def exists(root):
+        return os.path.exists(os.path.join(root, INDEX_FILE))
+
+    @property
+    def labels(self):
+        """Sorted label names; a label's position is its class index"""
+        return sorted({video['label'] for video in self.videos})
+
+    def has_hash(self, digest):
+        """Whether a source with this hash was already processed, stored or skipped"""
+        return any(entry.get('hash') == digest for entry in self.videos + self.skipped)
+
+    def add_skipped(self, label, name, **meta):
+        """Record a source that yielded no keypoints, so incremental builds do not decode it again"""
+        if meta.get('hash'):
+            self.skipped = [entry for entry in self.skipped if entry.get('hash') != meta['hash']]
+        self.skipped.append(dict(meta, label=label, name=name))
+        self.save_index()
+
+    def add(self, label, name, keypoints, dtype='float32', **meta):
+        """Write one video's (frames, 17, 2) keypoints and record it in the index"""
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 17, 2)
+        if dtype == 'int16':
+            data = np.clip(np.round(keypoints / INT16_SCALE), -32768, 32767).astype(np.int16)
+            scale = INT16_SCALE
+        elif dtype == 'float32':
+            data, scale = keypoints, 1.0
+        else:
+            raise ValueError(f'unsupported dtype: {dtype}')
+        rel = os.path.join(label, name + '.npy')
+        os.makedirs(os.path.join(self.root, label), exist_ok=True)
+        np.save(os.path.join(self.root, rel), data)
+        self.videos = [video for video in self.videos if video['file'] != rel.replace(os.sep, '/')]
+        self.videos.append(dict(meta, label=label, file=rel.replace(os.sep, '/'), frames=int(len(data)),
+                                dtype=dtype, scale=scale))
+        if meta.get('hash'):
+            self.skipped = [entry for entry in self.skipped if entry.get('hash') != meta['hash']]
+        self._arrays.pop(rel.replace(os.sep, '/'), None)
+        self.save_index()
+
+    def save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            index = {'version': STORE_VERSION, 'videos': self.videos}
+            if self.skipped:
+                index['skipped'] = self.skipped
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+
+    def raw(self, video):
+        """Memory-mapped stored array (float32 pixels or scaled int16)"""
+        key = video['file']
+        if key not in self._arrays:
+            self._arrays[key] = np.load(os.path.join(self.root, key), mmap_mode='r')
+        return self._arrays[key]
+
+    def keypoints(self, video):
+        """(frames, 17, 2) float32 pixels; zero-copy for float32 stores"""
+        data = self.raw(video)
+        if data.dtype == np.float32:
+            return data
+        return data.astype(np.float32) * np.float32(video['scale'])
+
+    def windows(self, video, length=5):
+        """(frames - length + 1, length, 34) zero-copy sliding-window view of the stored array"""
+        data = self.raw(video)
+        flat = data.reshape(len(data), -1)
+        if len(flat) < length:
+            return np.empty((0, length, flat.shape[1]), dtype=data.dtype)
+        return sliding_window_view(flat, length, axis=0).transpose(0, 2, 1)
+
+
+def convert(data_path, out, dtype='float32'):
+    """Convert legacy data/<label>/*.csv windows into a keypoint store"""
+    store = KeypointStore(out)
+    for label in sorted(os.listdir(data_path)):
+        folder = os.path.join(data_path, label)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith('.csv'):
+                continue
+            path = os.path.join(folder, filename)
+            series = read_csv_series(path)
+            store.add(label, os.path.splitext(filename)[0], series, dtype=dtype,
+                      source=os.path.relpath(path, data_path).replace(os.sep, '/'), hash=file_hash(path))
+            print(f'{path}: {len(series)} frames')
+    return store
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert sliding-window CSV keypoint data into a keypoint store')
+    parser.add_argument('--data_path', default=r'./data', type=str, help='Folder with <label>/*.csv files')
+    parser.add_argument('--out', default=r'./data_store', type=str, help='Keypoint store to write')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'int16'],
+                        help='float32, or int16 in 1/4 pixel units for half the size')
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    cfg = parse_args()
+    convert(cfg.data_path, cfg.out, cfg.dtype)
@@ -1,11 +1,14 @@
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, TensorDataset
 from torch.utils.data.dataloader import DataLoader
+import numpy as np
 import os
 import csv
 import json
+import time
 import argparse
+from keypoint_store import KeypointStore
 
 
 class LSTM(nn.Module):
@@ -28,81 +31,201 @@ class LSTM(nn.Module):
 
 
 class ExerciseData(Dataset):
-    def __init__(self, path):
+    """5-frame keypoint windows from a keypoint store (see keypoint_store.py) or legacy CSV folders"""
+
+    def __init__(self, path, seq_len=5):
         self.data_path = path
+        self.seq_len = seq_len
 
-        self.data_list = []
+        # Per source: (windows (n, seq_len, 34) array or view, coordinate scale, label index)
+        self.sources = []
         self.category_2_idx = {}
         self.idx_2_category = {}
-        for idx, cls in enumerate(os.listdir(path)):
-            self.category_2_idx[cls] = idx
-            self.idx_2_category[idx] = cls
-            for csv_files in os.listdir(os.path.join(path, cls)):
-                with open(os.path.join(path, cls, csv_files), "r") as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        row = [eval(element) for element in row]
-                        self.data_list.append({'poses': row, 'label': idx})
+        if KeypointStore.exists(path):
+            store = KeypointStore(path)
+            for idx, cls in enumerate(store.labels):
+                self.category_2_idx[cls] = idx
+                self.idx_2_category[idx] = cls
+            for video in store.videos:
+                windows = store.windows(video, seq_len)
+                if len(windows):
+                    self.sources.append((windows, video['scale'], self.category_2_idx[video['label']]))
+        else:
+            for idx, cls in enumerate(sorted(os.listdir(path))):
+                self.category_2_idx[cls] = idx
+                self.idx_2_category[idx] = cls
+                for csv_files in sorted(os.listdir(os.path.join(path, cls))):
+                    with open(os.path.join(path, cls, csv_files), "r") as f:
+                        rows = [[json.loads(element) for element in row] for row in csv.reader(f) if row]
+                    if rows:
+                        windows = np.asarray(rows, dtype=np.float32).reshape(len(rows), seq_len, 17 * 2)
+                        self.sources.append((windows, 1.0, idx))
+        self.offsets = np.cumsum([0] + [len(windows) for windows, _, _ in self.sources])
         print('Successfully collected data')
 
+    def window(self, item):
+        """Raw (seq_len, 34) float32 window and its label index"""
+        source = int(np.searchsorted(self.offsets, item, side='right')) - 1
+        windows, scale, label = self.sources[source]
+        data = np.array(windows[item - self.offsets[source]], dtype=np.float32)
+        if scale != 1.0:
+            data = data * np.float32(scale)
+        return data, label
+
     def __getitem__(self, item):
-        input_data = self.data_list[item]['poses']
-        input_data = torch.tensor(input_data)
-        input_data = input_data.reshape(5, 17*2)
+        data, label_idx = self.window(item)
+        input_data = torch.from_numpy(data)
         x_mean, x_std = torch.mean(input_data), torch.std(input_data)
         input_data = (input_data - x_mean) / x_std
 
         label = torch.zeros((1, len(self.category_2_idx)))
-        label[0, self.data_list[item]['label']] = 1
+        label[0, label_idx] = 1
 
         return input_data, label
 
     def __len__(self):
-        return len(self.data_list)
+        return int(self.offsets[-1])
+
+    def tensors(self):
+        """All windows z-score normalized once: (N, seq_len, 34) float32 and (N,) label indexes"""
+        data = np.concatenate([np.asarray(windows, dtype=np.float32) * np.float32(scale)
+                               for windows, scale, _ in self.sources])
+        labels = np.concatenate([np.full(len(windows), label, dtype=np.int64) for windows, _, label in self.sources])
+        # Same normalization as __getitem__: mean and unbiased std over each whole window
+        data -= data.mean(axis=(1, 2), keepdims=True)
+        data /= data.std(axis=(1, 2), ddof=1, keepdims=True)
+        return torch.from_numpy(data), torch.from_numpy(labels)
+
+    def split(self, val_split, seed=0):
+        """Train/validation window indexes.
+
+        Neighbouring windows share frames, so a random split would leak. The validation set is the
+        last `val_split` of every recording, and the seq_len - 1 training windows that overlap it
+        are dropped.
+        """
+        train_idx, val_idx = [], []
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            n_val = int((end - start) * val_split)
+            if n_val == 0:
+                train_idx.append(np.arange(start, end))
+                continue
+            val_idx.append(np.arange(end - n_val, end))
+            train_idx.append(np.arange(start, max(start, end - n_val - (self.seq_len - 1))))
+        train_idx = np.concatenate(train_idx) if train_idx else np.zeros(0, dtype=np.int64)
+        val_idx = np.concatenate(val_idx) if val_idx else np.zeros(0, dtype=np.int64)
+        return train_idx, val_idx
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--device', default='cuda:0', type=str, help='Training device')
     parser.add_argument('--data_path', default=r'./data_without_resize', type=str, help='Path to input data')
-    parser.add_argument('--batch_size', default=4, type=int, help='Batch size')
+    parser.add_argument('--batch_size', default=64, type=int, help='Batch size')
     parser.add_argument('--epoch', default=150, type=int, help='Training epoch')
+    parser.add_argument('--lr', default=0.003, type=float, help='Learning rate')
+    parser.add_argument('--val_split', default=0.2, type=float,
+                        help='Fraction at the end of every recording held out for validation (0 = none)')
+    parser.add_argument('--min_delta', default=1e-5, type=float,
+                        help='Minimum validation loss improvement for a new checkpoint')
+    parser.add_argument('--workers', default=0, type=int,
+                        help='DataLoader workers; 0 batches the pre-normalized tensor directly on the device')
+    parser.add_argument('--seed', default=0, type=int, help='Random seed')
     parser.add_argument('--save_dir', default='./checkpoint/without_resize', type=str, help='Path to save checkpoint')
     args = parser.parse_args()
     return args
 
 
+def iterate_batches(data, labels, batch_size, generator):
+    """Shuffled mini-batches by indexing tensors that already live on the training device"""
+    order = torch.randperm(len(data), generator=generator).to(data.device)
+    for start in range(0, len(data), batch_size):
+        idx = order[start:start + batch_size]
+        yield data[idx], labels[idx]
+
+
+def evaluate(model, data, labels, loss_function, batch_size=4096):
+    """Mean loss and accuracy over a pre-normalized set"""
+    total_loss, correct = 0.0, 0
+    with torch.inference_mode():
+        for start in range(0, len(data), batch_size):
+            seq_data, target = data[start:start + batch_size], labels[start:start + batch_size]
+            predict = model(seq_data)
+            total_loss += loss_function(predict, target).item() * len(seq_data)
+            correct += (predict.argmax(dim=1) == target.argmax(dim=1)).sum().item()
+    return total_loss / max(1, len(data)), correct / max(1, len(data))
+
+
 def train(args):
     device = torch.device(args.device)
+    torch.manual_seed(args.seed)
     if not os.path.exists(args.save_dir):
         os.makedirs(args.save_dir)
     dataset = ExerciseData(args.data_path)
     with open(os.path.join(args.save_dir, 'idx_2_category.json'), 'w') as file:
         file.write(json.dumps(dataset.idx_2_category))
-    dataloader = DataLoader(dataset=dataset, batch_size=args.batch_size, shuffle=True)
-    model = LSTM(17*2, 8, 2, 3).to(device)
+
+    # Normalize once, then train from one contiguous tensor
+    data, label_idx = dataset.tensors()
+    labels = nn.functional.one_hot(label_idx, len(dataset.idx_2_category)).float()
+    train_idx, val_idx = dataset.split(args.val_split)
+    train_idx, val_idx = torch.from_numpy(train_idx), torch.from_numpy(val_idx)
+    print(f'train windows: {len(train_idx)}, validation windows: {len(val_idx)}')
+    val_data, val_labels = data[val_idx].to(device), labels[val_idx].to(device)
+    generator = torch.Generator().manual_seed(args.seed)
+    if args.workers > 0:
+        dataloader = DataLoader(TensorDataset(data[train_idx], labels[train_idx]), batch_size=args.batch_size,
+                                shuffle=True, num_workers=args.workers, pin_memory=device.type == 'cuda',
+                                persistent_workers=True, generator=generator)
+    else:
+        train_data, train_labels = data[train_idx].to(device), labels[train_idx].to(device)
+
+    model = LSTM(17*2, 8, 2, 3, device)
     loss_function = nn.MSELoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
 
+    best_model_loss = float('inf')
+    history = []
     for i in range(args.epoch):
-        total_loss = 0
-        best_model_loss = 99999
-        for seq_data, labels in dataloader:
-            seq_data = seq_data.to(device)
-            labels = labels.to(device)
+        model.train()
+        start = time.perf_counter()
+        total_loss, seen = 0.0, 0
+        batches = dataloader if args.workers > 0 else \
+            iterate_batches(train_data, train_labels, args.batch_size, generator)
+        for seq_data, target in batches:
+            seq_data = seq_data.to(device, non_blocking=True)
+            target = target.to(device, non_blocking=True)
             optimizer.zero_grad()
             predict = model(seq_data)
-            loss = loss_function(predict, labels)
+            loss = loss_function(predict, target)
             loss.backward()
             optimizer.step()
-            total_loss += loss.item()
-        total_loss = total_loss / len(dataloader)
-        print(f'epoch: {i:3} loss: {total_loss:10.8f}')
-        if best_model_loss > total_loss:
-            best_model_loss = total_loss
+            total_loss += loss.item() * len(seq_data)
+            seen += len(seq_data)
+        elapsed = time.perf_counter() - start
+        train_loss = total_loss / max(1, seen)
+        samples_per_sec = seen / max(elapsed, 1e-9)
+
+        model.eval()
+        if len(val_idx):
+            val_loss, val_acc = evaluate(model, val_data, val_labels, loss_function)
+        else:
+            val_loss, val_acc = train_loss, None
+        improved = val_loss < best_model_loss - args.min_delta
+        history.append({'epoch': i, 'train_loss': train_loss, 'val_loss': val_loss, 'val_acc': val_acc,
+                        'samples_per_sec': round(samples_per_sec, 1), 'saved': improved})
+        print(f'epoch: {i:3} loss: {train_loss:10.8f} val_loss: {val_loss:10.8f}'
+              + (f' val_acc: {val_acc:.4f}' if val_acc is not None else '')
+              + f' {samples_per_sec:9.0f} samples/s' + (' *' if improved else ''))
+        # Checkpoint only on a real validation improvement
+        if improved:
+            best_model_loss = val_loss
             save_path = os.path.join(args.save_dir, 'best_model.pt')
             torch.save(model.state_dict(), save_path)
 
+    with open(os.path.join(args.save_dir, 'train_log.json'), 'w') as file:
+        json.dump(history, file, indent=1)
+    print(f'best val_loss: {best_model_loss:.8f}')
+
 
 if __name__ == '__main__':
     cfg = parse_args()
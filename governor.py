@@ -0,0 +1,143 @@
+"""
+自适应帧率调节
+Adaptive FPS governor
+根据各级耗时在运行时调节推理尺寸、推理步长与绘制细节，带迟滞与冷却，避免来回抖动
+"""
+
+# 画质档位，从高到低：(推理尺寸, 推理步长, 绘制细节)
+# 绘制细节：full=完整结果图，skeleton=仅骨架，minimal=仅信息面板
+LEVELS = (
+    (640, 1, 'full'),
+    (512, 1, 'full'),
+    (416, 1, 'full'),
+    (416, 1, 'skeleton'),
+    (320, 1, 'skeleton'),
+    (320, 2, 'skeleton'),
+    (256, 2, 'minimal'),
+    (256, 3, 'minimal'),
+)
+
+
+
+def fixed_size_levels(imgsz, levels=LEVELS):
+    """推理尺寸固定的后端只能调节步长与绘制细节：各档尺寸统一为 imgsz，并去掉因此重复的档位"""
+    fixed = []
+    for _, stride, detail in levels:
+        if (imgsz, stride, detail) not in fixed:
+            fixed.append((imgsz, stride, detail))
+    return tuple(fixed)
+
+
+# 摄像头候选分辨率，从高到低
+CAMERA_RESOLUTIONS = ((1920, 1080), (1280, 720), (960, 540), (640, 480))
+
+
+class FpsGovernor:
+    """按目标帧率选择画质档位
+
+    - record(stage, seconds)：各级每帧耗时（指数滑动平均）
+    - 流水线各级并行，可达帧率由最慢的一级决定
+    - 低于目标 down_margin 倍并持续 window 帧 -> 降一档
+    - 按推理耗时随尺寸平方、随步长反比估算上一档帧率，仍高于目标 up_margin 倍并持续 window 帧 -> 升一档
+    - 每次调整后冷却 cooldown 帧，期间只统计不调整
+    """
+
+    def __init__(self, target_fps=25, levels=LEVELS, level=0, window=30, cooldown=60,
+                 down_margin=0.95, up_margin=1.15, smoothing=0.1):
+        self.target_fps = float(target_fps)
+        self.levels = levels
+        self.level = max(0, min(int(level), len(levels) - 1))
+        self.window = window
+        self.cooldown = cooldown
+        self.down_margin = down_margin
+        self.up_margin = up_margin
+        self.smoothing = smoothing
+        self.reset()
+
+    def set_levels(self, levels):
+        """更换档位表（如切换到尺寸固定的推理后端）；保持当前的步长与绘制细节，有多档时取最低的一档"""
+        _, stride, detail = self.levels[self.level]
+        same = [i for i, (_, s, d) in enumerate(levels) if (s, d) == (stride, detail)]
+        self.levels = levels
+        self.level = same[-1] if same else min(self.level, len(levels) - 1)
+
+    def reset(self):
+        """新的采集会话：清空耗时统计，保留当前档位"""
+        self.stage_seconds = {}
+        self.frame_index = 0
+        self.changes = 0
+        self._below = 0
+        self._above = 0
+        self._hold = self.cooldown
+
+    @property
+    def imgsz(self):
+        return self.levels[self.level][0]
+
+    @property
+    def stride(self):
+        return self.levels[self.level][1]
+
+    @property
+    def detail(self):
+        return self.levels[self.level][2]
+
+    def describe(self):
+        return f"{self.imgsz}/{self.stride}/{self.detail}"
+
+    def should_infer(self, index):
+        """第 index 帧是否需要推理（其余帧沿用上一帧关键点）"""
+        return index % self.stride == 0
+
+    def record(self, stage, seconds):
+        prev = self.stage_seconds.get(stage)
+        self.stage_seconds[stage] = seconds if prev is None else \
+            (1 - self.smoothing) * prev + self.smoothing * seconds
+
+    def achievable_fps(self, infer_scale=1.0):
+        """由最慢一级估算的可达帧率；infer_scale 为推理耗时的缩放系数"""
+        costs = [s * infer_scale if stage == 'infer' else s for stage, s in self.stage_seconds.items()]
+        slowest = max(costs, default=0.0)
+        return 1.0 / slowest if slowest > 0 else float('inf')
+
+    def update(self):
+        """每输出一帧调用一次，档位变化时返回 True"""
+        self.frame_index += 1
+        if self._hold > 0 or not self.stage_seconds:
+            self._hold -= 1
+            return False
+
+        fps = self.achievable_fps()
+        if fps < self.target_fps * self.down_margin and self.level < len(self.levels) - 1:
+            self._below += 1
+            self._above = 0
+            if self._below >= self.window:
+                return self._set_level(self.level + 1)
+            return False
+        self._below = 0
+
+        if self.level > 0:
+            imgsz, stride, _ = self.levels[self.level]
+            up_imgsz, up_stride, _ = self.levels[self.level - 1]
+            scale = (up_imgsz / imgsz) ** 2 * (stride / up_stride)
+            if self.achievable_fps(scale) >= self.target_fps * self.up_margin:
+                self._above += 1
+                if self._above >= self.window:
+                    return self._set_level(self.level - 1)
+                return False
+        self._above = 0
+        return False
+
+    def _set_level(self, level):
+        self.level = level
+        self.changes += 1
+        self._below = self._above = 0
+        self._hold = self.cooldown
+        # 耗时与档位相关，换档后重新统计推理级
+        self.stage_seconds.pop('infer', None)
+        return True
+
+    def camera_resolutions(self):
+        """当前档位适合的摄像头分辨率候选：长边不超过推理尺寸的 2 倍（至少 640）"""
+        limit = max(640, 2 * self.imgsz)
+        return [r for r in CAMERA_RESOLUTIONS if r[0] <= limit]
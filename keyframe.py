@@ -0,0 +1,183 @@
+"""
+关键帧推理与关键点预测
+Keyframe pose inference with predicted keypoints
+每 N 帧（或画面突变时）运行一次姿态模型，中间帧用逐关节匀速卡尔曼滤波预测关键点，
+计数与叠加仍按完整帧率更新；关键帧到来时统计预测关键点的漂移
+"""
+
+from collections import deque
+
+import cv2
+import numpy as np
+
+_EMPTY = np.zeros((0, 17, 3), dtype=np.float32)
+
+
+class KeypointKalman:
+    """17 个关节 x/y 坐标各自独立的匀速卡尔曼滤波
+
+    所有坐标同时观测、噪声参数相同，因此协方差矩阵 (2x2) 全部一致，只需维护一份
+    """
+
+    def __init__(self, process_noise=25.0, measurement_noise=9.0):
+        self.q = process_noise       # 加速度方差（像素²/帧⁴）
+        self.r = measurement_noise   # 观测方差（像素²）
+        self.reset()
+
+    def reset(self):
+        self.pos = None  # (17, 2)
+        self.vel = None  # (17, 2)
+        self.conf = None  # (17,) 最近一次观测的置信度
+        self.P = None
+
+    @property
+    def initialized(self):
+        return self.pos is not None
+
+    def predict(self):
+        """前进一帧"""
+        if self.pos is None:
+            return
+        self.pos = self.pos + self.vel
+        p00, p01, p11 = self.P[0, 0], self.P[0, 1], self.P[1, 1]
+        q = self.q
+        self.P = np.array([[p00 + 2 * p01 + p11 + q / 4, p01 + p11 + q / 2],
+                           [p01 + p11 + q / 2, p11 + q]])
+
+    def correct(self, person):
+        """用一帧观测 (17, 3) 校正状态"""
+        z = person[:, :2].astype(np.float64)
+        if self.pos is None:
+            self.pos = z
+            self.vel = np.zeros_like(z)
+            self.P = np.array([[self.r, 0.0], [0.0, 100.0]])
+        else:
+            s = self.P[0, 0] + self.r
+            k0, k1 = self.P[0, 0] / s, self.P[1, 0] / s
+            innovation = z - self.pos
+            self.pos = self.pos + k0 * innovation
+            self.vel = self.vel + k1 * innovation
+            self.P = np.array([[(1 - k0) * self.P[0, 0], (1 - k0) * self.P[0, 1]],
+                               [self.P[1, 0] - k1 * self.P[0, 0], self.P[1, 1] - k1 * self.P[0, 1]]])
+        self.conf = person[:, 2].astype(np.float32)
+
+    def keypoints(self):
+        """当前估计，格式与 keypoints_array 相同 (1, 17, 3)；未初始化时为空"""
+        if self.pos is None:
+            return _EMPTY
+        return np.concatenate([self.pos, self.conf[:, None]], axis=1).astype(np.float32)[None]
+
+
+class KeyframeTracker:
+    """决定哪些帧需要推理，并为其余帧提供预测关键点
+
+    - 每 interval 帧推理一次；没有跟踪目标时每帧推理
+    - 缩小灰度图的帧间平均差超过 motion_threshold（0~255）时立即推理
+    - 关键帧的预测误差（按人体尺寸归一化）记录在 drift 中
+    """
+
+    def __init__(self, interval=3, motion_threshold=12.0, process_noise=25.0, measurement_noise=9.0,
+                 history=10000):
+        self.interval = max(1, int(interval))
+        self.motion_threshold = motion_threshold
+        self.filter = KeypointKalman(process_noise, measurement_noise)
+        self.drift_px = deque(maxlen=history)
+        self.drift_rel = deque(maxlen=history)
+        self.reset()
+
+    def reset(self):
+        self.filter.reset()
+        self.since_keyframe = 0
+        self.keyframes = 0
+        self.predicted_frames = 0
+        self.motion_keyframes = 0
+        self._last_small = None
+        self.drift_px.clear()
+        self.drift_rel.clear()
+
+    def _motion(self, frame):
+        small = cv2.cvtColor(cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        small = small.astype(np.int16)
+        prev, self._last_small = self._last_small, small
+        if prev is None:
+            return 0.0
+        return float(np.abs(small - prev).mean())
+
+    def plan(self, frames):
+        """一批连续帧中哪些需要推理（只依赖画面与计数，可在推理前整批确定）"""
+        mask = []
+        for frame in frames:
+            motion = self._motion(frame)
+            self.since_keyframe += 1
+            need = not self.filter.initialized or self.since_keyframe >= self.interval
+            if not need and motion > self.motion_threshold:
+                need = True
+                self.motion_keyframes += 1
+            if need:
+                self.since_keyframe = 0
+            mask.append(need)
+        return mask
+
+    def observe(self, kpts):
+        """关键帧：先前进一帧并记录预测漂移，再用真实关键点校正；返回用于计数的关键点"""
+        self.keyframes += 1
+        if len(kpts) == 0:
+            # 目标丢失：清空状态，下一帧重新推理
+            self.filter.reset()
+            self.since_keyframe = self.interval
+            return kpts
+        person = kpts[0]
+        if self.filter.initialized:
+            self.filter.predict()
+            visible = (person[:, 2] > 0.5) & (self.filter.conf > 0.5)
+            if visible.sum() >= 2:
+                err = np.linalg.norm(self.filter.pos[visible] - person[visible, :2], axis=-1).mean()
+                xy = person[visible, :2]
+                size = max(float(np.ptp(xy[:, 0])), float(np.ptp(xy[:, 1])), 1.0)
+                self.drift_px.append(float(err))
+                self.drift_rel.append(float(err) / size)
+        self.filter.correct(person)
+        return kpts
+
+    def predict(self):
+        """非关键帧：前进一帧并返回预测关键点"""
+        self.predicted_frames += 1
+        self.filter.predict()
+        return self.filter.keypoints()
+
+    def drift_stats(self):
+        """漂移统计：像素与相对人体尺寸的均值/P95/最大值"""
+        if not self.drift_px:
+            return {'keyframes': self.keyframes, 'predicted_frames': self.predicted_frames,
+                    'motion_keyframes': self.motion_keyframes, 'samples': 0}
+        px = np.array(self.drift_px)
+        rel = np.array(self.drift_rel)
+        return {
+            'keyframes': self.keyframes,
+            'predicted_frames': self.predicted_frames,
+            'motion_keyframes': self.motion_keyframes,
+            'samples': int(len(px)),
+            'drift_px_mean': round(float(px.mean()), 2),
+            'drift_px_p95': round(float(np.percentile(px, 95)), 2),
+            'drift_px_max': round(float(px.max()), 2),
+            'drift_rel_mean': round(float(rel.mean()), 4),
+            'drift_rel_p95': round(float(np.percentile(rel, 95)), 4),
+        }
+
+
+def infer_keyframes(frames, tracker, infer):
+    """对一批连续帧只推理关键帧，返回与 frames 等长的 [(result 或 None, 关键点 (P, 17, 3))]
+
+    infer(frames) -> [(result, kpts)]，可以是普通推理或 ROI 推理
+    """
+    mask = tracker.plan(frames)
+    keyframes = [frame for frame, need in zip(frames, mask) if need]
+    inferred = iter(infer(keyframes) if keyframes else [])
+    outputs = []
+    for need in mask:
+        if need:
+            result, kpts = next(inferred)
+            outputs.append((result, tracker.observe(kpts)))
+        else:
+            outputs.append((None, tracker.predict()))
+    return outputs
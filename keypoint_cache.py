@@ -0,0 +1,156 @@
+"""
+关键点磁盘缓存
+On-disk keypoint cache
+同一视频在模型/输入尺寸/置信度不变时复用已推理的关键点，跳过 YOLO 推理
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+from for_detect.keypoint_store import file_hash
+
+DEFAULT_CACHE_DIR = os.path.join('cache', 'keypoints')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# 坐标以 1/8 像素为单位存为 uint16（最大 8191 像素），置信度存为 uint8
+XY_SCALE = 8.0
+_EMPTY = np.zeros((0, 17, 3), dtype=np.float32)
+
+
+class KeypointCache:
+    """按 (文件内容哈希, 模型, imgsz, conf) 存储每帧 (17, 3) 关键点
+
+    - 每个条目一个 .npz 文件；读取时更新修改时间，用于按最近使用淘汰
+    - 总大小超过 max_bytes 时删除最久未使用的条目
+    - 文件哈希按 (路径, 大小, 修改时间) 记忆，未改动的大文件不必重复计算
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hash_index_path = os.path.join(cache_dir, 'file_hashes.json')
+
+    def content_hash(self, video_path):
+        """视频内容哈希（带记忆）"""
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        with self._lock:
+            index = self._read_hash_index()
+            entry = index.get(path)
+            if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                return entry['sha1']
+        digest = file_hash(path)
+        with self._lock:
+            index = self._read_hash_index()
+            index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': digest}
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{self._hash_index_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self._hash_index_path)
+        return digest
+
+    def make_key(self, video_path, model_name, imgsz, conf_thres):
+        """缓存键：内容哈希 + 模型文件名 + 输入尺寸 + 置信度阈值"""
+        parts = [self.content_hash(video_path), os.path.basename(str(model_name)), str(int(imgsz)),
+                 f'{float(conf_thres):.4f}']
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _read_hash_index(self):
+        try:
+            with open(self._hash_index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, key):
+        """读取缓存，返回 (keypoints (N, 17, 3) float32, valid (N,) bool, meta)；未命中返回 None"""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                xy = data['xy'].astype(np.float32) / XY_SCALE
+                conf = data['conf'].astype(np.float32) / 255.0
+                valid = data['valid'].astype(bool)
+                meta = json.loads(str(data['meta']))
+        except Exception:
+            # 损坏或不完整的条目按未命中处理
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return np.concatenate([xy, conf[..., None]], axis=-1), valid, meta
+
+    def save(self, key, keypoints, valid, meta=None):
+        """写入缓存并按总大小淘汰旧条目"""
+        keypoints = np.asarray(keypoints, dtype=np.float32).reshape(-1, 17, 3)
+        xy = np.clip(np.round(keypoints[..., :2] * XY_SCALE), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+        conf = np.clip(np.round(keypoints[..., 2] * 255), 0, 255).astype(np.uint8)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        # 临时文件名按进程/线程区分，多个进程同时写同一条目时互不干扰
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+        np.savez_compressed(tmp_path, xy=xy, conf=conf, valid=np.asarray(valid, dtype=bool),
+                            meta=np.array(json.dumps(meta or {}, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """总大小超过上限时，按最近使用时间删除最旧的条目"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class KeypointRecorder:
+    """推理过程中逐帧记录第一个人的关键点，结束后写入缓存"""
+
+    def __init__(self):
+        self.frames = []
+
+    def add(self, kpts):
+        """kpts: (P, 17, 3) 数组；P == 0 表示该帧无人"""
+        self.frames.append(np.array(kpts[0], dtype=np.float32) if len(kpts) else None)
+
+    def arrays(self):
+        keypoints = np.zeros((len(self.frames), 17, 3), dtype=np.float32)
+        valid = np.zeros(len(self.frames), dtype=bool)
+        for i, k in enumerate(self.frames):
+            if k is not None:
+                keypoints[i] = k
+                valid[i] = True
+        return keypoints, valid
+
+
+def replay_keypoints(keypoints, valid, index):
+    """取缓存中第 index 帧，返回与 keypoints_array 相同格式的 (P, 17, 3) 数组"""
+    if index < len(valid) and valid[index]:
+        return keypoints[index:index + 1]
+    return _EMPTY
@@ -0,0 +1,74 @@
+"""
+关节角度计算（NumPy 向量化）
+Vectorized joint-angle kinematics
+app.py / demo.py / demo_pro.py 及离线工具共用
+"""
+
+import numpy as np
+
+
+def keypoints_array(result):
+    """将一帧 YOLO 姿态结果的关键点一次性拷贝到主机内存
+
+    返回 (P, 17, 3) float32 数组（x, y, conf）；未检测到人时 P == 0
+    """
+    kpts = getattr(result, 'keypoints', None)
+    if kpts is None:
+        return np.zeros((0, 17, 3), dtype=np.float32)
+    data = kpts.data
+    if hasattr(data, 'cpu'):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+    if data.ndim != 3 or data.shape[1] == 0:
+        return np.zeros((0, 17, 3), dtype=np.float32)
+    return data
+
+
+def joint_angles(points, triplets):
+    """计算以中间点为顶点的夹角（0~180 度）
+
+    - points: (..., 17, 2) 或 (..., 17, 3) 数组，可为单帧或 (N, 17, 2) 序列
+    - triplets: (K, 3) 关键点索引 [端点A, 顶点B, 端点C]
+    返回 (..., K) 角度数组
+    """
+    points = np.asarray(points, dtype=np.float32)
+    triplets = np.asarray(triplets, dtype=np.intp).reshape(-1, 3)
+    a = points[..., triplets[:, 0], :2]
+    b = points[..., triplets[:, 1], :2]
+    c = points[..., triplets[:, 2], :2]
+    ba = a - b
+    bc = c - b
+    angle1 = np.degrees(np.arctan2(ba[..., 1], ba[..., 0]))
+    angle2 = np.degrees(np.arctan2(bc[..., 1], bc[..., 0]))
+    diff = np.abs(angle1 - angle2)
+    return np.where(diff > 180, 360 - diff, diff)
+
+
+def side_triplets(sport_config):
+    """按侧别设置（avg/left/right）返回该运动需要计算的关节三元组"""
+    side_mode = sport_config.get('side_mode', 'avg')
+    if side_mode == 'left':
+        return [sport_config['left_points_idx']]
+    if side_mode == 'right':
+        return [sport_config['right_points_idx']]
+    return [sport_config['left_points_idx'], sport_config['right_points_idx']]
+
+
+def sport_angle(points, sport_config):
+    """计算一个运动的关节角度；单帧返回 float，(N, 17, 2) 序列返回 (N,) 数组"""
+    angles = joint_angles(points, side_triplets(sport_config)).mean(axis=-1)
+    return float(angles) if angles.ndim == 0 else angles
+
+
+def sport_angles(points, sport_configs):
+    """一次向量化调用算出所有运动的关节角度，返回 {运动: 角度}"""
+    names = list(sport_configs.keys())
+    triplets = [side_triplets(sport_configs[name]) for name in names]
+    angles = joint_angles(points, [t for group in triplets for t in group])
+    out = {}
+    start = 0
+    for name, group in zip(names, triplets):
+        value = angles[..., start:start + len(group)].mean(axis=-1)
+        out[name] = float(value) if value.ndim == 0 else value
+        start += len(group)
+    return out
@@ -0,0 +1,183 @@
+"""
+各级延迟统计
+Per-stage latency instrumentation
+记录处理流水线每一级的逐帧耗时：滚动窗口给出实时 P50/P95/P99，对数分桶直方图累计整个会话，
+可叠加到画面、显示在界面面板，并在会话结束时导出 JSON
+"""
+
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# (键, 中文名)，按流水线顺序
+STAGES = (
+    ('capture', '采集等待'),
+    ('inference', '姿态推理'),
+    ('transfer', '关键点拷贝'),
+    ('counting', '角度与计数'),
+    ('annotate', '骨架绘制'),
+    ('overlay', '信息面板'),
+    ('encode', '编码入队'),
+    ('display', '显示投递'),
+)
+
+# 推理级线程与绘制级线程各自负责的阶段；两级并行，较慢的一级决定帧率
+GROUPS = {
+    'inference': ('inference', 'transfer', 'counting'),
+    'rendering': ('annotate', 'overlay', 'encode', 'display'),
+}
+
+# 直方图桶上边界（毫秒）：0.01ms ~ 10s，每十倍 20 个对数桶，最后一个桶收集更慢的样本
+BUCKET_EDGES_MS = np.logspace(-2, 4, 6 * 20 + 1)
+
+
+class StageLatency:
+    """各级耗时统计（线程安全，推理级与绘制级线程同时写入）
+
+    - record(stage, seconds, count)：记录耗时；按批推理时 count 帧平均分摊
+    - measure(stage)：上下文管理器，记录 with 块的耗时
+    - 滚动窗口（最近 window 帧）给出实时分位数
+    - 整个会话的样本累计在固定大小的对数分桶直方图中，导出时由直方图估算分位数
+    """
+
+    def __init__(self, window=300, stages=STAGES, refresh_interval=0.5):
+        self.window = window
+        self.stages = stages
+        self.names = dict(stages)
+        self.refresh_interval = refresh_interval
+        self._edges = BUCKET_EDGES_MS.tolist()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """新的会话：清空所有样本"""
+        with self._lock:
+            self.recent = {key: deque(maxlen=self.window) for key, _ in self.stages}
+            self.histograms = {key: [0] * (len(self._edges) + 1) for key, _ in self.stages}
+            self.totals = {key: 0.0 for key, _ in self.stages}
+            self.counts = {key: 0 for key, _ in self.stages}
+            self.started = time.time()
+        self._snapshot = None
+        self._snapshot_time = 0.0
+
+    def record(self, stage, seconds, count=1):
+        ms = seconds * 1000.0 / max(1, count)
+        bucket = bisect.bisect_left(self._edges, ms)
+        with self._lock:
+            self.recent[stage].extend([ms] * count)
+            self.histograms[stage][bucket] += count
+            self.totals[stage] += ms * count
+            self.counts[stage] += count
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """滚动窗口内各级 {键: {'p50', 'p95', 'p99', 'mean'}}（毫秒），没有样本的级省略"""
+        with self._lock:
+            recent = {key: np.array(values) for key, values in self.recent.items() if values}
+        out = {}
+        for key, values in recent.items():
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            out[key] = {'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+                        'p99': round(float(p99), 2), 'mean': round(float(values.mean()), 2)}
+        return out
+
+    def live(self):
+        """供界面与画面叠加使用的快照，最多每 refresh_interval 秒重新计算一次"""
+        now = time.perf_counter()
+        if self._snapshot is None or now - self._snapshot_time >= self.refresh_interval:
+            self._snapshot = self.snapshot()
+            self._snapshot_time = now
+        return self._snapshot
+
+    def session_summary(self):
+        """整个会话各级的样本数、均值与直方图估算的分位数（取所在桶的上边界）"""
+        with self._lock:
+            histograms = {key: np.array(hist) for key, hist in self.histograms.items()}
+            totals, counts = dict(self.totals), dict(self.counts)
+        out = {}
+        for key, hist in histograms.items():
+            total = int(hist.sum())
+            if total == 0:
+                continue
+            cumulative = np.cumsum(hist)
+            stats = {'count': total, 'mean': round(totals[key] / counts[key], 3)}
+            for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+                bucket = int(np.searchsorted(cumulative, q * total))
+                stats[name] = round(float(BUCKET_EDGES_MS[min(bucket, len(BUCKET_EDGES_MS) - 1)]), 3)
+            stats['histogram'] = hist.tolist()
+            out[key] = stats
+        return out
+
+    @staticmethod
+    def group_means(stats):
+        """推理级 / 绘制级每帧平均耗时之和（毫秒）"""
+        return {group: round(sum(stats[key]['mean'] for key in keys if key in stats), 2)
+                for group, keys in GROUPS.items()}
+
+    def rows(self):
+        """画面叠加用的英文表格行（cv2 不能绘制中文）；最后一行为推理级/绘制级合计"""
+        stats = self.live()
+        rows = [['stage (ms)', 'p50', 'p95', 'p99']]
+        for key, _ in self.stages:
+            if key in stats:
+                s = stats[key]
+                rows.append([key, f"{s['p50']:.1f}", f"{s['p95']:.1f}", f"{s['p99']:.1f}"])
+        groups = self.group_means(stats)
+        rows.append([f"infer {groups['inference']:.1f} / render {groups['rendering']:.1f} ms"])
+        return rows
+
+    def export(self, path, **meta):
+        """把会话统计写入 JSON 文件，meta 为附加的会话信息"""
+        session = self.session_summary()
+        data = dict(meta)
+        data.update({
+            'duration_s': round(time.time() - self.started, 2),
+            'stages': {key: dict(stats, name=self.names[key]) for key, stats in session.items()},
+            'groups_mean_ms': self.group_means(session),
+            'window': self.snapshot(),
+            'bucket_edges_ms': [round(float(edge), 4) for edge in BUCKET_EDGES_MS],
+        })
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
+
+
+def draw_latency(frame, rows):
+    """在画面右上角原地绘制半透明的延迟表；首列左对齐、数值列右对齐，只有一个单元格的行占满整行"""
+    ratio = max(frame.shape[1] / 960, frame.shape[0] / 540)
+    font, scale, thickness = cv2.FONT_HERSHEY_SIMPLEX, 0.5 * ratio, max(1, int(ratio))
+
+    def text_width(text):
+        return cv2.getTextSize(text, font, scale, thickness)[0][0]
+
+    columns = max(len(row) for row in rows)
+    gap, pad, line_height = int(12 * ratio), int(10 * ratio), int(22 * ratio)
+    widths = [max(text_width(row[c]) for row in rows if len(row) == columns) for c in range(columns)]
+    width = max([sum(widths) + gap * (columns - 1)] + [text_width(row[0]) for row in rows if len(row) == 1])
+    x1 = frame.shape[1] - pad
+    x0 = max(0, x1 - width - 2 * pad)
+    y0, y1 = pad, min(frame.shape[0], 2 * pad + line_height * len(rows))
+    roi = frame[y0:y1, x0:x1]
+    roi[...] = (roi * 0.35).astype(np.uint8)
+    for i, row in enumerate(rows):
+        y = y0 + pad + line_height * (i + 1) - int(6 * ratio)
+        x = x0 + pad
+        for c, text in enumerate(row):
+            offset = widths[c] - text_width(text) if 0 < c < columns else 0
+            cv2.putText(frame, text, (x + offset, y), font, scale, (255, 255, 255),
+                        thickness=thickness, lineType=cv2.LINE_AA)
+            x += widths[c] + gap
+    return frame
@@ -0,0 +1,136 @@
+"""
+多人跟踪与独立计数
+Multi-person tracking with per-person rep counters
+按关键点外接框 IoU 在帧间关联人体，分配稳定 ID；每个 ID 拥有独立的角度平滑、迟滞与去抖计数状态
+"""
+
+import numpy as np
+
+from counting import RepCounter
+from kinematics import sport_angles
+
+
+def person_boxes(kpts, min_kpt_conf=0.3, min_visible=3):
+    """每个人的可见关键点外接框 (P, 4)；可见点过少的人为 NaN"""
+    boxes = np.full((len(kpts), 4), np.nan, dtype=np.float32)
+    for i, person in enumerate(kpts):
+        visible = person[:, 2] > min_kpt_conf
+        if visible.sum() >= min_visible:
+            xy = person[visible, :2]
+            boxes[i, :2] = xy.min(axis=0)
+            boxes[i, 2:] = xy.max(axis=0)
+    return boxes
+
+
+def box_iou(a, b):
+    """两组框的 IoU 矩阵 (len(a), len(b))"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+class Track:
+    """一个被跟踪的人：稳定 ID、最近位置与独立计数器"""
+
+    def __init__(self, track_id, box, min_reach_frames):
+        self.id = track_id
+        self.box = box
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.misses = 0
+        self.kpts = None
+        self.angle = None
+        self.counter = RepCounter(min_reach_frames)
+
+    @property
+    def count(self):
+        return self.counter.count
+
+    def predicted_box(self):
+        return self.box + self.velocity * (self.misses + 1)
+
+
+class MultiPersonCounter:
+    """多人跟踪 + 每人独立计数
+
+    - 关联：上一帧框按速度外推后与本帧框计算 IoU，贪心匹配（IoU 高者优先）
+    - 未匹配的检测新建 ID；连续 max_age 帧未出现的 ID 删除
+    - 每个 ID 的 RepCounter 独立维护平滑角度、迟滞状态与次数
+    """
+
+    def __init__(self, min_reach_frames=3, iou_threshold=0.3, max_age=30):
+        self.min_reach_frames = min_reach_frames
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
+
+    def associate(self, boxes):
+        """返回 {检测下标: Track}；顺带更新/新建/删除轨迹"""
+        valid = [i for i in range(len(boxes)) if not np.isnan(boxes[i, 0])]
+        matches = {}
+        if self.tracks and valid:
+            predicted = np.stack([t.predicted_box() for t in self.tracks])
+            iou = box_iou(predicted, boxes[valid])
+            for flat in np.argsort(-iou, axis=None):
+                ti, di = np.unravel_index(flat, iou.shape)
+                if iou[ti, di] < self.iou_threshold:
+                    break
+                track, det = self.tracks[ti], valid[di]
+                if det in matches or any(m is track for m in matches.values()):
+                    continue
+                matches[det] = track
+
+        for det, track in matches.items():
+            box = boxes[det]
+            track.velocity = 0.5 * track.velocity + 0.5 * (box - track.box) / (track.misses + 1)
+            track.box = box
+            track.misses = 0
+        matched = set(id(t) for t in matches.values())
+        for track in self.tracks:
+            if id(track) not in matched:
+                track.misses += 1
+                track.kpts = None
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_age]
+        for det in valid:
+            if det not in matches:
+                track = Track(self.next_id, boxes[det], self.min_reach_frames)
+                self.next_id += 1
+                self.tracks.append(track)
+                matches[det] = track
+        return matches
+
+    def update(self, kpts, sport, sport_configs):
+        """输入本帧所有人的关键点 (P, 17, 3)，返回 (本帧完成的次数, 可见的轨迹列表)"""
+        matches = self.associate(person_boxes(kpts))
+        if not matches:
+            return 0, []
+        config = sport_configs[sport]
+        enter_thr, exit_thr = config['maintaining'], config['relaxing']
+        # 一次向量化计算所有人的角度
+        angles = np.atleast_1d(sport_angles(kpts, sport_configs)[sport])
+        completed = 0
+        for det, track in matches.items():
+            track.kpts = kpts[det]
+            smooth_angle, done = track.counter.update(float(angles[det]), enter_thr, exit_thr)
+            track.angle = smooth_angle
+            completed += done
+        visible = sorted(matches.values(), key=lambda t: t.id)
+        return completed, visible
+
+    def set_min_reach_frames(self, min_reach_frames):
+        self.min_reach_frames = min_reach_frames
+        for track in self.tracks:
+            track.counter.min_reach_frames = min_reach_frames
+
+    def counts(self):
+        """所有仍在跟踪的人的次数 {ID: 次数}"""
+        return {t.id: t.count for t in sorted(self.tracks, key=lambda t: t.id)}
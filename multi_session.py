@@ -0,0 +1,345 @@
+"""
+多路输入会话管理
+Multi-camera session manager
+一个进程内打开多路摄像头/视频文件，共享同一个姿态模型：
+每轮从各路取最新帧拼成一批推理，结果分发回各路的计数器、叠加与显示；
+每路每批至多一帧并按最久未服务优先，慢速输入不会拖住其它路，快速输入也不会独占模型
+
+命令行：
+    python multi_session.py --sources 0 1 videos/squat.mp4 --sport squat squat pushup
+"""
+
+import os
+import json
+import time
+import datetime
+import argparse
+import threading
+
+import cv2
+import torch
+
+from counting import SPORT_CONFIG, RepCounter, load_threshold_config
+from kinematics import keypoints_array, sport_angle
+from overlay import InfoPanel
+from pipeline import Pipeline
+from pose_backend import BACKENDS, load_pose_model
+from video_io import WRITER_POLICIES, AsyncVideoWriter, FrameGrabber
+from ultralytics.utils.plotting import Annotator
+
+
+class Station:
+    """一路输入：采集线程、独立计数器、信息面板、录制与最新显示帧"""
+
+    def __init__(self, index, source, sport='squat', min_reach_frames=3, lossless_file=True):
+        self.index = index
+        self.source = source
+        self.sport = sport
+        self.is_camera = isinstance(source, int)
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise RuntimeError(f'无法打开视频源: {source}')
+        self.grabber = FrameGrabber(
+            self.cap,
+            capacity=2 if self.is_camera else 8,
+            lossless=(not self.is_camera and lossless_file)
+        ).start()
+        self.counter = RepCounter(min_reach_frames)
+        self.panel = InfoPanel()
+        self.voter = None  # 自动识别时的限频投票器
+        self.writer = None
+        self.fps = 0.0
+
+        self.frames_processed = 0
+        self.last_served = -1  # 最近一次进入推理批次的批序号
+        self._last_tick = None
+        self._lock = threading.Lock()
+        self._display = None
+
+    @property
+    def name(self):
+        return f'#{self.index} {self.source}'
+
+    def open_writer(self, save_dir, policy='block', capacity=64):
+        fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 30
+        size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        path = os.path.join(save_dir, f'station{self.index}.mp4')
+        self.writer = AsyncVideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size,
+                                       capacity=capacity, policy=policy)
+
+    def process(self, frame, kpts):
+        """计数并绘制一帧，返回带叠加的画面"""
+        sport_config = SPORT_CONFIG[self.sport]
+        annotated = frame
+        if len(kpts):
+            angle = sport_angle(kpts[0], sport_config)
+            self.counter.update(angle, sport_config['maintaining'], sport_config['relaxing'])
+            annotator = Annotator(frame.copy())
+            for k in reversed(kpts):
+                annotator.kpts(k, frame.shape[:2], kpt_line=True)
+            annotated = annotator.result()
+
+        # 每路按自己的出帧间隔统计FPS
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            inst_fps = 1.0 / max(now - self._last_tick, 1e-6)
+            self.fps = inst_fps if self.fps == 0 else 0.9 * self.fps + 0.1 * inst_fps
+        self._last_tick = now
+        self.frames_processed += 1
+
+        self.panel.draw(annotated, sport_config['name'], self.sport.capitalize(), self.counter.count, int(self.fps))
+        if self.writer is not None:
+            self.writer.write(annotated)
+        with self._lock:
+            self._display = annotated
+        return annotated
+
+    def take_display(self):
+        """取走最新待显示帧（没有新帧时返回 None）"""
+        with self._lock:
+            frame, self._display = self._display, None
+            return frame
+
+    def alive(self):
+        return self.grabber.is_alive()
+
+    def close(self):
+        self.grabber.stop()
+        self.cap.release()
+        stats = self.writer.release() if self.writer is not None else None
+        self.writer = None
+        return stats
+
+    def stats(self):
+        return {
+            'source': self.source,
+            'sport': self.sport,
+            'count': self.counter.count,
+            'frames': self.frames_processed,
+            'dropped': self.grabber.frames_dropped,
+            'fps': round(self.fps, 1),
+        }
+
+
+class SessionManager:
+    """多路输入共享一个姿态模型
+
+    - 调度：按最久未服务优先轮询各路，每路每批至多取一帧（摄像头取最新帧）
+    - 凑批：首帧就绪后最多再等 max_wait 秒，其余路没有新帧就不等待，慢速输入不会拖慢其它路
+    - 流水线：凑批/推理 与 计数/绘制/编码 并行；显示在主线程按各路最新帧刷新
+    - 自动识别：classifier 为多路 StreamingClassifier 时，各路窗口合成一批运行一次 LSTM
+    """
+
+    def __init__(self, model, stations, max_batch=None, max_wait=0.005, classifier=None, categories=None,
+                 **predict_kwargs):
+        self.model = model
+        self.stations = list(stations)
+        self.classifier = classifier
+        self.categories = categories or {}
+        self.max_batch = max(1, int(max_batch or len(self.stations)))
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs
+        self.batches = 0
+        self.batch_frames = 0
+        self.pipeline = None
+        self._stop = threading.Event()
+
+    def gather(self):
+        """凑一批 [(station, frame)]；所有输入都结束时返回空列表"""
+        batch = []
+        deadline = None
+        while not self._stop.is_set():
+            taken = set(id(s) for s, _ in batch)
+            active = [s for s in self.stations if s.alive()]
+            if not active:
+                return batch
+            for station in sorted(active, key=lambda s: s.last_served):
+                if len(batch) >= self.max_batch:
+                    break
+                if id(station) in taken:
+                    continue
+                ret, frame = station.grabber.read(timeout=0)
+                if ret:
+                    batch.append((station, frame))
+            if len(batch) >= min(self.max_batch, len(active)):
+                break
+            now = time.perf_counter()
+            if batch:
+                if deadline is None:
+                    deadline = now + self.max_wait
+                elif now >= deadline:
+                    break
+            time.sleep(0.001)
+        for station, _ in batch:
+            station.last_served = self.batches
+        self.batches += 1
+        self.batch_frames += len(batch)
+        return batch
+
+    def iter_batches(self):
+        while not self._stop.is_set():
+            batch = self.gather()
+            if not batch:
+                return
+            yield batch
+
+    def infer_stage(self, batch):
+        """一次推理所有路的帧"""
+        frames = [frame for _, frame in batch]
+        results = self.model.predict(frames, stream=True, **self.predict_kwargs)
+        return [(station, frame, keypoints_array(result)) for (station, frame), result in zip(batch, results)]
+
+    def render_stage(self, items):
+        if self.classifier is not None:
+            self.classify(items)
+        for station, frame, kpts in items:
+            station.process(frame, kpts)
+
+    def classify(self, items):
+        """更新各路滑动窗口，窗口已满的路一次批量识别运动类型"""
+        ready = []
+        for station, _, kpts in items:
+            if not len(kpts):
+                continue
+            xy = kpts[0, :, 0:2]
+            full = self.classifier.push(xy, stream=station.index)
+            if station.voter.observe(xy) and full:
+                ready.append(station)
+        if not ready:
+            return
+        probs = self.classifier.predict_proba([station.index for station in ready])
+        for station, p in zip(ready, probs):
+            sport = self.categories.get(str(station.voter.vote(p)))
+            if sport in SPORT_CONFIG:
+                station.sport = sport
+
+    def start(self):
+        self.pipeline = Pipeline(self.iter_batches(), [self.infer_stage, self.render_stage], maxsize=2).start()
+        return self
+
+    def running(self):
+        return self.pipeline is not None and not self.pipeline.join(timeout=0)
+
+    def stop(self):
+        self._stop.set()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline.join(timeout=1.0)
+
+    def close(self):
+        """停止处理并释放所有输入，返回各路统计"""
+        self.stop()
+        report = []
+        for station in self.stations:
+            stats = station.stats()
+            stats['recording'] = station.close()
+            report.append(stats)
+        return report
+
+    def stats(self):
+        return {
+            'stations': len(self.stations),
+            'batches': self.batches,
+            'mean_batch': round(self.batch_frames / max(1, self.batches), 2),
+        }
+
+
+def parse_source(value):
+    return int(value) if value.isnumeric() else value
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Count reps on several cameras or videos with one shared pose model')
+    parser.add_argument('--sources', nargs='+', required=True, type=str, help='camera indexes or video paths')
+    parser.add_argument('--sport', nargs='+', default=['squat'], choices=list(SPORT_CONFIG),
+                        help='exercise per source (the last one is reused for the remaining sources)')
+    parser.add_argument('--model', default='yolov8n-pose.pt', type=str, help='path to model weight')
+    parser.add_argument('--backend', default='pytorch', choices=BACKENDS, help='pose inference backend')
+    parser.add_argument('--imgsz', default=640, type=int, help='inference size')
+    parser.add_argument('--conf', default=0.5, type=float, help='confidence threshold')
+    parser.add_argument('--config', default=os.path.join('config', 'thresholds.json'), type=str,
+                        help='thresholds and min_reach_frames')
+    parser.add_argument('--auto', action='store_true',
+                        help='recognize the exercise per source with the LSTM classifier (overrides --sport)')
+    parser.add_argument('--detector_model', default='./for_detect/checkpoint/', type=str,
+                        help='path to the exercise classifier checkpoint')
+    parser.add_argument('--classify_stride', default=5, type=int, help='run the classifier every N frames per source')
+    parser.add_argument('--classify_min_dwell', default=30, type=int,
+                        help='frames a new exercise must keep winning the vote before switching')
+    parser.add_argument('--max_batch', default=0, type=int, help='frames per inference call (0 = one per source)')
+    parser.add_argument('--max_wait', default=5, type=float,
+                        help='ms to wait for the other sources once the first frame of a batch is ready')
+    parser.add_argument('--save_dir', default=None, type=str, help='record each source to station<N>.mp4 here')
+    parser.add_argument('--writer_policy', default='block', choices=WRITER_POLICIES,
+                        help='when the encode queue is full: wait, drop the frame, or record at half resolution')
+    parser.add_argument('--no_show', action='store_true', help='do not open display windows')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+    config = load_threshold_config(args.config)
+    min_reach_frames = int(config.get('min_reach_frames', 3))
+
+    device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
+    model = load_pose_model(args.model, args.backend, args.imgsz).to(device)
+
+    sports = args.sport + [args.sport[-1]] * (len(args.sources) - len(args.sport))
+    stations = [Station(i, parse_source(src), sport, min_reach_frames)
+                for i, (src, sport) in enumerate(zip(args.sources, sports))]
+    if args.save_dir is not None:
+        save_dir = os.path.join(args.save_dir, datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
+        os.makedirs(save_dir, exist_ok=True)
+        for station in stations:
+            station.open_writer(save_dir, args.writer_policy)
+
+    classifier = categories = None
+    if args.auto:
+        from for_detect.Inference import LSTM, ExerciseVoter, StreamingClassifier
+        detect_model = LSTM(17 * 2, 8, 2, 3, torch.device(device))
+        detect_model.load_state_dict(torch.load(os.path.join(args.detector_model, 'best_model.pt'),
+                                                map_location=device))
+        detect_model.eval()
+        with open(os.path.join(args.detector_model, 'idx_2_category.json'), 'r') as f:
+            categories = json.load(f)
+        classifier = StreamingClassifier(detect_model, streams=len(stations))
+        for station in stations:
+            station.voter = ExerciseVoter(args.classify_stride, min_dwell=args.classify_min_dwell)
+
+    session = SessionManager(model, stations, max_batch=args.max_batch, max_wait=args.max_wait / 1000,
+                             classifier=classifier, categories=categories,
+                             imgsz=args.imgsz, conf=args.conf, device=device,
+                             half=torch.cuda.is_available(), verbose=False).start()
+    start = time.perf_counter()
+    try:
+        # Display runs on the main thread; each window only shows its newest frame
+        while session.running():
+            if args.no_show:
+                time.sleep(0.05)
+                continue
+            for station in stations:
+                frame = station.take_display()
+                if frame is not None:
+                    scale = 960 / max(frame.shape[0], frame.shape[1])
+                    cv2.imshow(station.name, cv2.resize(frame, (0, 0), fx=scale, fy=scale))
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.perf_counter() - start
+    error = session.pipeline.error
+    report = session.close()
+    cv2.destroyAllWindows()
+    if error is not None:
+        print(f'Processing error: {error}')
+
+    print(f'Session: {session.stats()}, {elapsed:.1f}s')
+    for stats in report:
+        print(f"{stats['source']}: {stats['sport']} {stats['count']} reps, {stats['frames']} frames, "
+              f"dropped {stats['dropped']}, {stats['frames'] / max(elapsed, 1e-6):.1f} FPS"
+              + (f", recording {stats['recording']}" if stats['recording'] else ''))
+
+
+if __name__ == '__main__':
+    main()
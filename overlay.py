@@ -0,0 +1,166 @@
+"""
+画面信息叠加
+Cached text overlay
+字体按字号只加载一次，文字渲染为 alpha 贴图并缓存，仅在数值变化时重新合成，
+每帧只需把合成好的信息面板用 NumPy 原地写回画面
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# 依次尝试的中文字体：微软雅黑、黑体
+FONT_CANDIDATES = ('msyh.ttc', 'SimHei.ttf')
+
+
+class FontCache:
+    """按字号缓存字体，返回 (font, 是否支持中文)"""
+
+    def __init__(self, candidates=FONT_CANDIDATES):
+        self.candidates = candidates
+        self._fonts = {}
+
+    def get(self, size):
+        if size not in self._fonts:
+            self._fonts[size] = self._load(size)
+        return self._fonts[size]
+
+    def _load(self, size):
+        for name in self.candidates:
+            try:
+                return ImageFont.truetype(name, size), True
+            except OSError:
+                continue
+        # 如果都失败，使用默认字体（只支持英文）
+        return ImageFont.load_default(), False
+
+
+class SpriteCache:
+    """文字 alpha 贴图的 LRU 缓存，键为 (文字, 字号)"""
+
+    def __init__(self, fonts, max_items=256):
+        self.fonts = fonts
+        self.max_items = max_items
+        self._items = OrderedDict()
+
+    def get(self, text, size):
+        key = (text, size)
+        sprite = self._items.get(key)
+        if sprite is not None:
+            self._items.move_to_end(key)
+            return sprite
+        sprite = render_text_alpha(text, self.fonts.get(size)[0])
+        self._items[key] = sprite
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return sprite
+
+
+def render_text_alpha(text, font):
+    """把文字渲染为 (h, w) uint8 alpha 贴图，原点与 ImageDraw.text((0, 0)) 一致"""
+    left, top, right, bottom = font.getbbox(text)
+    width, height = max(1, int(right)), max(1, int(bottom))
+    image = Image.new('L', (width, height), 0)
+    ImageDraw.Draw(image).text((0, 0), text, font=font, fill=255)
+    return np.asarray(image)
+
+
+def blend_into(dst, bgr, alpha):
+    """按 alpha 把 bgr 原地混合到 dst（三者同尺寸）"""
+    a = alpha[..., None].astype(np.uint16)
+    mixed = bgr.astype(np.uint16) * a + dst.astype(np.uint16) * (255 - a) + 127
+    dst[...] = (mixed // 255).astype(np.uint8)
+
+
+class InfoPanel:
+    """左上角信息面板：运动 / 计数 / FPS
+
+    - 静态标签按字号预渲染，数值文字按内容缓存
+    - 面板（背景 + 文字）只在分辨率或显示内容变化时重新合成
+    - 面板完全不透明时每帧只做一次切片拷贝，否则做 alpha 混合
+    """
+
+    LABELS = (('运动: ', 'Exercise: '), ('计数: ', 'Count: '), ('FPS: ', 'FPS: '))
+
+    def __init__(self, bg_color=(55, 104, 0), text_color=(255, 255, 255), fonts=None):
+        self.bg_color = np.array(bg_color, dtype=np.uint8)
+        self.text_color = np.array(text_color, dtype=np.uint8)
+        self.fonts = fonts or FontCache()
+        self.sprites = SpriteCache(self.fonts)
+        self._labels = {}
+        self._key = None
+        self._panel = None
+
+    def draw(self, frame, sport_cn, sport_en, counter, fps):
+        """把面板原地画到 frame（BGR）上并返回 frame"""
+        key = (frame.shape[:2], sport_cn, sport_en, counter, fps)
+        if key != self._key:
+            self._panel = self._compose(frame.shape[:2], sport_cn, sport_en, counter, fps)
+            self._key = key
+        (y0, y1, x0, x1), bgr, alpha, opaque = self._panel
+        if opaque:
+            frame[y0:y1, x0:x1] = bgr
+        else:
+            blend_into(frame[y0:y1, x0:x1], bgr, alpha)
+        return frame
+
+    def _label_sprites(self, size, chinese):
+        """某字号下的静态标签贴图，只渲染一次"""
+        key = (size, chinese)
+        if key not in self._labels:
+            font = self.fonts.get(size)[0]
+            self._labels[key] = [render_text_alpha(cn if chinese else en, font) for cn, en in self.LABELS]
+        return self._labels[key]
+
+    def _compose(self, shape, sport_cn, sport_en, counter, fps):
+        h, w = shape
+        # 计算缩放比例
+        plot_size_ratio = max(w / 960, h / 540)
+        font_size = int(28 * plot_size_ratio)
+        chinese = self.fonts.get(font_size)[1]
+        rect = (int(20 * plot_size_ratio), int(20 * plot_size_ratio),
+                int(380 * plot_size_ratio), int(180 * plot_size_ratio))
+
+        # 排版：标签 + 数值，各自为独立贴图
+        x_start = int(30 * plot_size_ratio)
+        y_offset = int(40 * plot_size_ratio)
+        line_height = int(45 * plot_size_ratio)
+        values = (sport_cn if chinese else sport_en, str(counter), str(fps))
+        placed = []
+        for label, value in zip(self._label_sprites(font_size, chinese), values):
+            placed.append((x_start, y_offset, label))
+            placed.append((x_start + label.shape[1], y_offset, self.sprites.get(value, font_size)))
+            y_offset += line_height
+
+        # 面板范围：背景矩形与所有文字的并集，裁剪到画面内
+        x0 = max(0, min([rect[0]] + [x for x, _, _ in placed]))
+        y0 = max(0, min([rect[1]] + [y for _, y, _ in placed]))
+        x1 = min(w, max([rect[2] + 1] + [x + s.shape[1] for x, _, s in placed]))
+        y1 = min(h, max([rect[3] + 1] + [y + s.shape[0] for _, y, s in placed]))
+        if x1 <= x0 or y1 <= y0:
+            return (0, 0, 0, 0), np.zeros((0, 0, 3), np.uint8), np.zeros((0, 0), np.uint8), True
+
+        # 背景之外的像素取文字颜色，透明度由文字 alpha 决定
+        under = np.empty((y1 - y0, x1 - x0, 3), dtype=np.float32)
+        under[...] = self.text_color
+        alpha = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        ry0, ry1 = max(rect[1], y0) - y0, min(rect[3] + 1, y1) - y0
+        rx0, rx1 = max(rect[0], x0) - x0, min(rect[2] + 1, x1) - x0
+        under[ry0:ry1, rx0:rx1] = self.bg_color
+        alpha[ry0:ry1, rx0:rx1] = 255
+
+        bgr = under.copy()
+        for x, y, sprite in placed:
+            sx0, sy0 = max(x, x0), max(y, y0)
+            sx1, sy1 = min(x + sprite.shape[1], x1), min(y + sprite.shape[0], y1)
+            if sx1 <= sx0 or sy1 <= sy0:
+                continue
+            a = sprite[sy0 - y:sy1 - y, sx0 - x:sx1 - x]
+            region = (slice(sy0 - y0, sy1 - y0), slice(sx0 - x0, sx1 - x0))
+            af = a[..., None].astype(np.float32) / 255.0
+            bgr[region] = self.text_color * af + bgr[region] * (1 - af)
+            alpha[region] = np.maximum(alpha[region], a)
+
+        bgr = np.round(bgr).astype(np.uint8)
+        return (y0, y1, x0, x1), bgr, alpha, bool(alpha.min() == 255)
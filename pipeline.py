@@ -0,0 +1,117 @@
+"""
+多级流水线引擎
+Pipelined processing engine
+各处理阶段运行在独立线程中，级间使用有界队列传递数据
+"""
+
+import queue
+import threading
+
+_END = object()
+
+
+class Pipeline:
+    """多级流水线：第 i 级处理完第 N 帧后即可处理第 N+1 帧，与下游并行
+
+    - source: 可迭代对象，由第一级线程消费（通常是采集线程的输出）
+    - stages: 处理函数列表，返回值传给下一级；返回 None 表示丢弃该项
+    - 级间队列有界：下游变慢时上游阻塞（背压），不会无限堆积
+    - stop(): 立即停止，丢弃仍在队列中的数据；源耗尽时则会排空所有数据
+    """
+
+    def __init__(self, source, stages, maxsize=2):
+        self.source = source
+        self.stages = list(stages)
+        self.queues = [queue.Queue(maxsize=max(1, maxsize)) for _ in self.stages[1:]]
+        self.error = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """启动各级线程"""
+        for i in range(len(self.stages)):
+            name = f"pipeline-{i}-{getattr(self.stages[i], '__name__', 'stage')}"
+            t = threading.Thread(target=self._run_stage, args=(i,), name=name, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        """请求停止（不等待）"""
+        self._stop.set()
+
+    def stopped(self):
+        return self._stop.is_set()
+
+    def join(self, timeout=None):
+        """等待所有线程结束；timeout 为每个线程的最长等待时间"""
+        for t in self._threads:
+            t.join(timeout)
+        return not any(t.is_alive() for t in self._threads)
+
+    def _iter_input(self, i):
+        if i == 0:
+            for item in self.source:
+                if self._stop.is_set():
+                    return
+                yield item
+            return
+        q = self.queues[i - 1]
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run_stage(self, i):
+        fn = self.stages[i]
+        out_q = self.queues[i] if i < len(self.queues) else None
+        try:
+            for item in self._iter_input(i):
+                result = fn(item)
+                if out_q is not None and result is not None:
+                    if not self._put(out_q, result):
+                        break
+        except Exception as e:
+            # 任一级出错则整体停止，错误留给调用方处理
+            self.error = e
+            self._stop.set()
+        finally:
+            if out_q is not None:
+                self._put(out_q, _END)
+
+
+def iter_batches(iterable, batch_size):
+    """将可迭代对象按 batch_size 分组，最后一组可能不足"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_predict(model, frames, batch_size=8, **kwargs):
+    """按批运行 YOLO 姿态模型，按帧顺序逐个产出 (frame, result)
+
+    每批使用 stream=True 生成器取结果，Results 对象随用随弃，不会整体堆积在内存中
+    """
+    for batch in iter_batches(frames, batch_size):
+        for frame, result in zip(batch, model.predict(batch, stream=True, **kwargs)):
+            yield frame, result
@@ -0,0 +1,181 @@
+"""
+姿态模型推理后端
+Pose inference backends
+PyTorch / ONNX Runtime / OpenVINO / OpenCV DNN / INT8 量化 统一封装，
+导出的模型缓存在 .pt 文件旁，所有后端都输出 Ultralytics Results，关键点格式一致
+
+命令行导出：
+    python pose_backend.py --weights yolov8n-pose.pt --backend openvino --imgsz 640
+"""
+
+import os
+import json
+import shutil
+import argparse
+
+BACKENDS = ('pytorch', 'onnxruntime', 'openvino', 'opencv', 'int8')
+
+# 后端 -> (Ultralytics 导出格式, 是否导出动态输入)
+# OpenCV DNN 对动态形状支持有限，使用固定尺寸、batch=1 的 ONNX
+_EXPORTS = {
+    'onnxruntime': ('onnx', True),
+    'openvino': ('openvino', True),
+    'opencv': ('onnx', False),
+}
+EXPORT_BACKENDS = tuple(_EXPORTS)
+# 输入尺寸在导出/量化时固定、推理时忽略 imgsz 参数的后端
+FIXED_SIZE_BACKENDS = ('opencv', 'int8')
+
+
+def exported_path(weights, backend, imgsz=640):
+    """导出模型在 .pt 旁的缓存路径，按后端与输入尺寸区分"""
+    root = os.path.splitext(weights)[0]
+    fmt, _ = _EXPORTS[backend]
+    if fmt == 'openvino':
+        # Ultralytics 依据 “_openvino_model” 后缀识别 OpenVINO IR 目录
+        return f'{root}_{imgsz}_openvino_model'
+    return f'{root}_{backend}_{imgsz}.onnx'
+
+
+def quantized_path(weights):
+    """INT8 量化模型路径（由 quantize.py 生成，输入尺寸记录在校验报告中）"""
+    return os.path.splitext(weights)[0] + '_int8.onnx'
+
+
+def quantize_report_path(weights):
+    return os.path.splitext(weights)[0] + '_int8.json'
+
+
+def read_quantize_report(weights):
+    """读取量化校验报告；不存在时返回 None"""
+    try:
+        with open(quantize_report_path(weights), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def model_tag(weights, backend='pytorch', imgsz=640):
+    """模型标识（用于关键点缓存键），不需要加载模型即可得到"""
+    if backend == 'pytorch':
+        return os.path.basename(weights)
+    if backend == 'int8':
+        return os.path.basename(quantized_path(weights))
+    return os.path.basename(exported_path(weights, backend, imgsz))
+
+
+def model_imgsz(weights, backend='pytorch', imgsz=640):
+    """实际推理尺寸（用于关键点缓存键）：INT8 模型固定为量化校验报告中的尺寸"""
+    if backend == 'int8':
+        report = read_quantize_report(weights)
+        if report and 'imgsz' in report:
+            return int(report['imgsz'])
+    return imgsz
+
+
+def export_model(weights, backend, imgsz=640, force=False):
+    """导出 .pt 为指定后端的模型并缓存；缓存存在且不旧于 .pt 时直接复用"""
+    if backend not in _EXPORTS:
+        raise ValueError(f'backend {backend} does not need export')
+    target = exported_path(weights, backend, imgsz)
+    if not force and os.path.exists(target) and \
+            (not os.path.exists(weights) or os.path.getmtime(target) >= os.path.getmtime(weights)):
+        return target
+
+    from ultralytics import YOLO
+    fmt, dynamic = _EXPORTS[backend]
+    output = YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=dynamic, device='cpu')
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    elif os.path.exists(target):
+        os.remove(target)
+    os.replace(str(output), target)
+    return target
+
+
+class PoseModel:
+    """可切换后端的 YOLOv8 姿态模型，predict 接口与 YOLO.predict 相同
+
+    - pytorch：直接加载 .pt
+    - onnxruntime / openvino：动态输入，可按批推理
+    - opencv：OpenCV DNN 读取固定尺寸 ONNX，输入尺寸固定为导出尺寸，批量输入逐帧推理
+    - int8：quantize.py 生成并通过精度校验的 INT8 ONNX（ONNX Runtime），输入尺寸固定为校准尺寸
+    """
+
+    def __init__(self, weights='yolov8n-pose.pt', backend='pytorch', imgsz=640):
+        if backend not in BACKENDS:
+            raise ValueError(f'unknown pose backend: {backend}')
+        from ultralytics import YOLO
+
+        self.weights = weights
+        self.backend = backend
+        self.imgsz = imgsz
+        if backend == 'int8':
+            report = read_quantize_report(weights)
+            if not report or not report.get('accepted') or not os.path.exists(quantized_path(weights)):
+                raise RuntimeError(f'no accepted INT8 model for {weights}, run quantize.py first')
+            self.imgsz = int(report['imgsz'])
+            self.path = quantized_path(weights)
+        elif backend == 'pytorch':
+            self.path = weights
+        else:
+            self.path = export_model(weights, backend, imgsz)
+        self.name = os.path.basename(self.path)
+        self.model = YOLO(self.path, task='pose')
+
+    def to(self, device):
+        if self.backend == 'pytorch':
+            self.model.to(device)
+        return self
+
+    def predict(self, source, stream=False, **kwargs):
+        if self.backend != 'pytorch':
+            # 精度在导出时已确定
+            kwargs.pop('half', None)
+        if self.backend in FIXED_SIZE_BACKENDS:
+            kwargs['imgsz'] = self.imgsz
+        if self.backend == 'opencv':
+            kwargs['dnn'] = True
+            if isinstance(source, (list, tuple)) and len(source) > 1:
+                results = (r for frame in source for r in self.model.predict(frame, stream=True, **kwargs))
+                return results if stream else list(results)
+        return self.model.predict(source, stream=stream, **kwargs)
+
+    __call__ = predict
+
+    def __getattr__(self, name):
+        # names / task 等属性转发给底层 YOLO 对象
+        model = self.__dict__.get('model')
+        if model is None:
+            raise AttributeError(name)
+        return getattr(model, name)
+
+
+def load_pose_model(weights='yolov8n-pose.pt', backend='pytorch', imgsz=640):
+    """按后端加载姿态模型；导出或加载失败时回退到 PyTorch"""
+    if backend != 'pytorch':
+        try:
+            return PoseModel(weights, backend, imgsz)
+        except Exception as e:
+            print(f"⚠ {backend} 后端不可用，改用 PyTorch: {e}")
+    return PoseModel(weights, 'pytorch', imgsz)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Export a YOLOv8 pose model for a CPU inference backend')
+    parser.add_argument('--weights', default='yolov8n-pose.pt', type=str, help='path to .pt model weight')
+    parser.add_argument('--backend', default='onnxruntime', choices=EXPORT_BACKENDS, help='target backend')
+    parser.add_argument('--imgsz', default=640, type=int, help='inference size')
+    parser.add_argument('--force', action='store_true', help='re-export even if a cached model exists')
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_args()
+    path = export_model(args.weights, args.backend, args.imgsz, force=args.force)
+    print(f'{args.backend} model: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+from batch_process import collect_videos
+from counting import SPORT_CONFIG, RepCounter, load_threshold_config
+from kinematics import keypoints_array, sport_angle
+from pipeline import stream_predict
+from pose_backend import PoseModel, export_model, quantize_report_path, quantized_path
+from video_io import iter_frames
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Post-training INT8 quantization of the pose model with an '
+                                                 'accuracy check against FP32')
+    parser.add_argument('--weights', default='yolov8n-pose.pt', type=str, help='path to .pt model weight')
+    parser.add_argument('--imgsz', default=640, type=int, help='inference size the INT8 model is calibrated for')
+    parser.add_argument('--calib', nargs='+', required=True, type=str,
+                        help='videos, directories or glob patterns to sample calibration frames from')
+    parser.add_argument('--calib_frames', default=300, type=int, help='number of calibration frames')
+    parser.add_argument('--check', nargs='*', default=None, type=str,
+                        help='videos for the accuracy check (default: the calibration videos)')
+    parser.add_argument('--sport', default='dir', type=str,
+                        help='"squat", "pushup", "situp", or "dir" to use each video\'s parent directory name')
+    parser.add_argument('--config', default=os.path.join('config', 'thresholds.json'), type=str,
+                        help='thresholds used for the rep count comparison')
+    parser.add_argument('--conf', default=0.5, type=float, help='confidence threshold')
+    parser.add_argument('--max_kpt_error', default=0.05, type=float,
+                        help='max mean keypoint error, as a fraction of the person height')
+    parser.add_argument('--min_detection_agreement', default=0.95, type=float,
+                        help='min fraction of frames where both models agree on whether a person is present')
+    parser.add_argument('--max_count_diff', default=0, type=int, help='max rep count difference per video')
+    args = parser.parse_args()
+    return args
+
+
+def sample_frames(videos, count, imgsz):
+    """Evenly sample about `count` frames across all videos, letterboxed to imgsz to bound memory"""
+    totals = []
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        totals.append(max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))))
+        cap.release()
+    step = max(1, sum(totals) // max(1, count))
+    frames = []
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        stream = iter_frames(cap)
+        try:
+            for i, frame in enumerate(stream):
+                if i % step == 0:
+                    frames.append(letterbox(frame, imgsz))
+        finally:
+            stream.close()
+            cap.release()
+    return frames[:count]
+
+
+def letterbox(frame, imgsz):
+    """Same resize/padding as Ultralytics preprocessing"""
+    from ultralytics.data.augment import LetterBox
+
+    return LetterBox(new_shape=(imgsz, imgsz), auto=False)(image=frame)
+
+
+def to_tensor(image):
+    """Letterboxed BGR uint8 -> (1, 3, H, W) RGB float32 in 0~1"""
+    image = image[..., ::-1].transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(image, dtype=np.float32) / 255.0
+
+
+def head_nodes(model):
+    """Non-convolution nodes of the last module (box/keypoint decoding), kept in FP32"""
+    pattern = re.compile(r'/model\.(\d+)/')
+    indexed = [(int(m.group(1)), node) for node in model.graph.node for m in [pattern.search(node.name)] if m]
+    if not indexed:
+        return []
+    last = max(i for i, _ in indexed)
+    return [node.name for i, node in indexed if i == last and node.op_type != 'Conv']
+
+
+def quantize(fp32_path, int8_path, frames):
+    """ONNX Runtime static quantization (QDQ, per-channel weights) calibrated on letterboxed frames"""
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+
+    fp32 = onnx.load(fp32_path)
+    input_name = fp32.graph.input[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.items = iter(frames)
+
+        def get_next(self):
+            frame = next(self.items, None)
+            return None if frame is None else {input_name: to_tensor(frame)}
+
+    quantize_static(fp32_path, int8_path, FrameReader(), quant_format=QuantFormat.QDQ, per_channel=True,
+                    weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8,
+                    calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=head_nodes(fp32))
+
+    # Ultralytics reads names/kpt_shape/imgsz from the ONNX metadata
+    int8 = onnx.load(int8_path)
+    del int8.metadata_props[:]
+    int8.metadata_props.extend(fp32.metadata_props)
+    onnx.save(int8, int8_path)
+
+
+def run_video(model, path, imgsz, conf, sport_config, min_reach_frames):
+    """Per-frame first-person keypoints (None when nobody is detected), rep count and inference time"""
+    cap = cv2.VideoCapture(path)
+    frames = iter_frames(cap)
+    points = []
+    counter = RepCounter(min_reach_frames)
+    start = time.perf_counter()
+    try:
+        for _, result in stream_predict(model, frames, 8, imgsz=imgsz, conf=conf, verbose=False):
+            kpts = keypoints_array(result)
+            points.append(kpts[0] if len(kpts) else None)
+            if len(kpts) and sport_config is not None:
+                counter.update(sport_angle(kpts[0], sport_config), sport_config['maintaining'],
+                               sport_config['relaxing'])
+    finally:
+        frames.close()
+        cap.release()
+    return points, counter.count, time.perf_counter() - start
+
+
+def compare(reference, candidate):
+    """Detection agreement and mean keypoint error normalised by the reference person height"""
+    agree = sum((a is None) == (b is None) for a, b in zip(reference, candidate))
+    errors = []
+    for a, b in zip(reference, candidate):
+        if a is None or b is None:
+            continue
+        visible = a[:, 2] > 0.5
+        if visible.sum() < 2:
+            continue
+        height = max(np.ptp(a[visible, 1]), np.ptp(a[visible, 0]), 1.0)
+        errors.append(float(np.linalg.norm(a[visible, :2] - b[visible, :2], axis=-1).mean() / height))
+    return agree / max(1, len(reference)), float(np.mean(errors)) if errors else 0.0
+
+
+def main():
+    args = parse_args()
+    calib_videos = collect_videos(args.calib)
+    check_videos = collect_videos(args.check) if args.check else calib_videos
+    if not calib_videos:
+        raise SystemExit('No calibration videos found')
+    config = load_threshold_config(args.config)
+    min_reach_frames = int(config.get('min_reach_frames', 3))
+
+    # FP32 ONNX with dynamic shapes is the quantization source
+    fp32_path = export_model(args.weights, 'onnxruntime', args.imgsz)
+    int8_path = quantized_path(args.weights)
+    frames = sample_frames(calib_videos, args.calib_frames, args.imgsz)
+    print(f'Calibrating on {len(frames)} frames from {len(calib_videos)} videos')
+    quantize(fp32_path, int8_path, frames)
+
+    # Accuracy check: FP32 PyTorch model vs the INT8 model on every check video
+    from ultralytics import YOLO
+    fp32 = PoseModel(args.weights, 'pytorch', args.imgsz)
+    int8 = YOLO(int8_path, task='pose')
+    videos = []
+    for path in check_videos:
+        sport = os.path.basename(os.path.dirname(os.path.abspath(path))) if args.sport == 'dir' else args.sport
+        sport_config = SPORT_CONFIG.get(sport)
+        ref_points, ref_count, ref_seconds = run_video(fp32, path, args.imgsz, args.conf, sport_config,
+                                                       min_reach_frames)
+        q_points, q_count, q_seconds = run_video(int8, path, args.imgsz, args.conf, sport_config, min_reach_frames)
+        agreement, kpt_error = compare(ref_points, q_points)
+        videos.append({
+            'video': path,
+            'sport': sport if sport_config else None,
+            'frames': len(ref_points),
+            'detection_agreement': round(agreement, 4),
+            'kpt_error': round(kpt_error, 4),
+            'fp32_count': ref_count,
+            'int8_count': q_count,
+            'fp32_seconds': round(ref_seconds, 3),
+            'int8_seconds': round(q_seconds, 3),
+        })
+        print(f"{path}: agreement={agreement:.3f} kpt_error={kpt_error:.4f} "
+              f"count fp32={ref_count} int8={q_count} time {ref_seconds:.1f}s -> {q_seconds:.1f}s")
+
+    total_frames = max(1, sum(v['frames'] for v in videos))
+    agreement = sum(v['detection_agreement'] * v['frames'] for v in videos) / total_frames
+    kpt_error = sum(v['kpt_error'] * v['frames'] for v in videos) / total_frames
+    count_ok = all(abs(v['fp32_count'] - v['int8_count']) <= args.max_count_diff for v in videos if v['sport'])
+    accepted = agreement >= args.min_detection_agreement and kpt_error <= args.max_kpt_error and count_ok
+
+    report = {
+        'accepted': accepted,
+        'model': os.path.basename(int8_path),
+        'weights': os.path.basename(args.weights),
+        'imgsz': args.imgsz,
+        'calib_frames': len(frames),
+        'detection_agreement': round(agreement, 4),
+        'kpt_error': round(kpt_error, 4),
+        'counts_match': count_ok,
+        'thresholds': {'max_kpt_error': args.max_kpt_error,
+                       'min_detection_agreement': args.min_detection_agreement,
+                       'max_count_diff': args.max_count_diff},
+        'videos': videos,
+    }
+    with open(quantize_report_path(args.weights), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if accepted:
+        print(f'INT8 model accepted: {int8_path} (use backend "int8")')
+    else:
+        # Keep the report for inspection, but the model is never picked up by the int8 backend
+        os.remove(int8_path)
+        print(f'INT8 model rejected: agreement={agreement:.3f}, kpt_error={kpt_error:.4f}, '
+              f'counts_match={count_ok}; see {quantize_report_path(args.weights)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+人体区域跟踪裁剪推理
+ROI-tracked cropped inference
+按上一帧人体范围（加边距与速度外扩）裁剪画面，在裁剪区域上以完整 imgsz 推理，
+关键点映射回原图坐标；置信度下降或定期刷新时回退为全图推理
+"""
+
+import numpy as np
+
+from kinematics import keypoints_array
+
+
+def person_box(kpts, min_kpt_conf=0.3):
+    """第一个人的关键点外接框与平均置信度，返回 ((x1, y1, x2, y2), conf)；无人时返回 (None, 0.0)"""
+    if len(kpts) == 0:
+        return None, 0.0
+    person = kpts[0]
+    visible = person[:, 2] > min_kpt_conf
+    if visible.sum() < 3:
+        return None, float(person[:, 2].mean())
+    xy = person[visible, :2]
+    x1, y1 = xy.min(axis=0)
+    x2, y2 = xy.max(axis=0)
+    return (float(x1), float(y1), float(x2), float(y2)), float(person[:, 2].mean())
+
+
+class RoiTracker:
+    """跟踪人体范围并给出下一次推理的裁剪区域
+
+    - 区域 = 关键点外接框 + margin 倍边距 + 按中心速度预测的位移与外扩
+    - 没有上一帧结果、距上次全图推理达到 refresh_interval 帧时返回 None（全图推理）
+    - 裁剪结果置信度低于 min_conf 或未检测到人时，调用方应回退为全图推理
+    """
+
+    def __init__(self, margin=0.3, min_conf=0.5, refresh_interval=30, min_size=96, velocity_smoothing=0.5):
+        self.margin = margin
+        self.min_conf = min_conf
+        self.refresh_interval = refresh_interval
+        self.min_size = min_size
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.velocity = (0.0, 0.0)
+        self.frames_since_full = 0
+        self.roi_frames = 0
+        self.full_frames = 0
+        self.fallbacks = 0
+
+    def region(self, shape, ahead=1):
+        """下一次推理的裁剪区域 (x1, y1, x2, y2)（整数，已裁剪到画面内）；需要全图推理时返回 None
+
+        ahead：区域需要覆盖的帧数（按批推理时为批大小）
+        """
+        if self.box is None or self.frames_since_full >= self.refresh_interval:
+            return None
+        h, w = shape[:2]
+        x1, y1, x2, y2 = self.box
+        vx, vy = self.velocity
+        pad = self.margin * max(x2 - x1, y2 - y1)
+        # 中心按速度预测，外扩覆盖整个预测区间的位移
+        shift_x, shift_y = vx * ahead, vy * ahead
+        x1 = min(x1, x1 + shift_x) - pad - abs(vx)
+        x2 = max(x2, x2 + shift_x) + pad + abs(vx)
+        y1 = min(y1, y1 + shift_y) - pad - abs(vy)
+        y2 = max(y2, y2 + shift_y) + pad + abs(vy)
+        # 最小尺寸
+        if x2 - x1 < self.min_size:
+            cx = (x1 + x2) / 2
+            x1, x2 = cx - self.min_size / 2, cx + self.min_size / 2
+        if y2 - y1 < self.min_size:
+            cy = (y1 + y2) / 2
+            y1, y2 = cy - self.min_size / 2, cy + self.min_size / 2
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(np.ceil(x2))), min(h, int(np.ceil(y2)))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        # 区域几乎覆盖全图时直接全图推理
+        if (x2 - x1) * (y2 - y1) > 0.8 * w * h:
+            return None
+        return x1, y1, x2, y2
+
+    def acceptable(self, kpts):
+        """裁剪推理的结果是否可信"""
+        box, conf = person_box(kpts)
+        return box is not None and conf >= self.min_conf
+
+    def update(self, kpts, from_roi):
+        """用本帧（原图坐标）关键点更新跟踪状态"""
+        if from_roi:
+            self.frames_since_full += 1
+            self.roi_frames += 1
+        else:
+            self.frames_since_full = 0
+            self.full_frames += 1
+        box, _ = person_box(kpts)
+        if box is None:
+            self.box = None
+            self.velocity = (0.0, 0.0)
+            return
+        if self.box is not None:
+            dx = (box[0] + box[2] - self.box[0] - self.box[2]) / 2
+            dy = (box[1] + box[3] - self.box[1] - self.box[3]) / 2
+            s = self.velocity_smoothing
+            self.velocity = ((1 - s) * self.velocity[0] + s * dx, (1 - s) * self.velocity[1] + s * dy)
+        self.box = box
+
+
+def predict_with_roi(model, frames, tracker, **kwargs):
+    """对一批连续帧做 ROI 推理，返回与 frames 等长的 [(result 或 None, 原图坐标关键点 (P, 17, 3))]
+
+    - 全图推理的帧返回 Ultralytics 结果对象；裁剪推理的帧 result 为 None（其坐标属于裁剪图）
+    - 裁剪结果不可信的帧统一补做一次全图批量推理
+    """
+    region = tracker.region(frames[0].shape, ahead=len(frames))
+    outputs = [None] * len(frames)
+    retry = list(range(len(frames)))
+    if region is not None:
+        x1, y1, x2, y2 = region
+        crops = [np.ascontiguousarray(frame[y1:y2, x1:x2]) for frame in frames]
+        retry = []
+        for i, result in enumerate(model.predict(crops, stream=True, **kwargs)):
+            kpts = keypoints_array(result).copy()
+            # 只平移有效关键点；置信度为 0 的 (0, 0) 占位点保持原样，避免被移到裁剪框角上像真实检测
+            kpts[kpts[..., 2] > 0, :2] += (x1, y1)
+            if tracker.acceptable(kpts):
+                outputs[i] = (None, kpts, True)
+            else:
+                retry.append(i)
+        tracker.fallbacks += len(retry)
+    if retry:
+        results = model.predict([frames[i] for i in retry], stream=True, **kwargs)
+        for i, result in zip(retry, results):
+            outputs[i] = (result, keypoints_array(result), False)
+
+    # 按帧顺序更新跟踪状态
+    for _, kpts, from_roi in outputs:
+        tracker.update(kpts, from_roi)
+    return [(result, kpts) for result, kpts, _ in outputs]
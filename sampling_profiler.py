@@ -0,0 +1,197 @@
+"""
+按需采样性能分析
+On-demand sampling profiler
+在运行中的程序里按固定间隔采样各线程的 Python 调用栈，同时记录 torch 算子耗时；
+结束后写出火焰图可用的折叠栈文件（flamegraph.pl / speedscope 可直接打开）与热点函数摘要
+"""
+
+import os
+import sys
+import time
+import datetime
+import threading
+from collections import Counter
+
+# 叶子帧是这些函数时视为空闲等待（阻塞在锁、队列或 Tk 事件循环里），不计入热点排名
+IDLE_FUNCTIONS = {
+    ('threading.py', 'wait'),
+    ('threading.py', 'join'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('queue.py', 'put'),
+    ('selectors.py', 'select'),
+    ('__init__.py', 'mainloop'),
+}
+
+
+def frame_label(code):
+    """栈帧名：函数名 (文件名:定义行号)"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def is_idle(code):
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS
+
+
+class SamplingProfiler:
+    """采样分析器：run_for() 在后台线程中采样指定秒数后写出结果
+
+    - 每 interval 秒通过 sys._current_frames() 抓取所有线程（除自身）的调用栈
+    - 同时开启 torch.profiler 统计算子耗时（支持时记录所有线程，否则只有启动线程）
+    - 同一时间只能有一次采样；finish() 可提前结束
+    """
+
+    def __init__(self, interval=0.005, torch_ops=True, max_depth=128):
+        self.interval = interval
+        self.torch_ops = torch_ops
+        self.max_depth = max_depth
+        self._finish = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self):
+        self.stacks = Counter()    # (线程名, 由根到叶的 code 元组) -> 样本数
+        self.samples = 0
+        self.duration = 0.0
+        self.torch_table = None
+        self.torch_note = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_for(self, seconds, out_dir, on_done=None):
+        """后台采样 seconds 秒（或直到 finish()），写入 out_dir 后调用 on_done(路径字典)；返回后台线程"""
+        if self.running:
+            raise RuntimeError('profiler is already running')
+        self.reset()
+        self._finish.clear()
+
+        def run():
+            torch_profiler = self._start_torch()
+            self._sample(seconds)
+            self._stop_torch(torch_profiler)
+            paths = self.write(out_dir)
+            if on_done is not None:
+                on_done(paths)
+
+        self._thread = threading.Thread(target=run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def finish(self):
+        """提前结束正在进行的采样（结果照常写出）"""
+        self._finish.set()
+
+    def _sample(self, seconds):
+        own = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_tick = start
+        while not self._finish.is_set() and time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, str(ident)), tuple(stack))] += 1
+            self.samples += 1
+            # 按固定节拍采样，采样本身的耗时不累积为漂移；落后时从当前时刻重新计时
+            now = time.perf_counter()
+            next_tick = max(next_tick + self.interval, now)
+            self._finish.wait(next_tick - now)
+        self.duration = time.perf_counter() - start
+
+    def _start_torch(self):
+        if not self.torch_ops:
+            return None
+        try:
+            from torch.profiler import profile, ProfilerActivity
+        except ImportError:
+            self.torch_note = 'torch.profiler 不可用'
+            return None
+        activities = [ProfilerActivity.CPU]
+        try:
+            import torch
+            if torch.cuda.is_available():
+                activities.append(ProfilerActivity.CUDA)
+        except Exception:
+            pass
+        try:
+            # 处理线程不是采样线程，需要记录所有线程的算子（较新的 PyTorch 支持）
+            from torch._C._profiler import _ExperimentalConfig
+            profiler = profile(activities=activities,
+                               experimental_config=_ExperimentalConfig(profile_all_threads=True))
+        except (ImportError, TypeError):
+            profiler = profile(activities=activities)
+            self.torch_note = '当前 PyTorch 只能记录采样线程自身的算子'
+        try:
+            profiler.start()
+        except Exception as e:
+            self.torch_note = f'torch.profiler 启动失败: {e}'
+            return None
+        return profiler
+
+    def _stop_torch(self, profiler):
+        if profiler is None:
+            return
+        try:
+            profiler.stop()
+            self.torch_table = profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=25)
+        except Exception as e:
+            self.torch_note = f'torch.profiler 结果读取失败: {e}'
+
+    def collapsed(self):
+        """折叠栈文本行：线程;根帧;...;叶帧 样本数"""
+        labels = {}
+        lines = []
+        for (thread, stack), count in self.stacks.most_common():
+            names = [labels.setdefault(code, frame_label(code)) for code in stack]
+            lines.append(';'.join([thread.replace(';', ':')] + [n.replace(';', ':') for n in names]) + f' {count}')
+        return lines
+
+    def summary(self, top=30):
+        """热点函数摘要：各线程忙碌比例、按自身/累计样本排序的函数、torch 算子耗时"""
+        per_thread, busy_thread = Counter(), Counter()
+        self_counts, total_counts = Counter(), Counter()
+        for (thread, stack), count in self.stacks.items():
+            per_thread[thread] += count
+            if not stack or is_idle(stack[-1]):
+                continue
+            busy_thread[thread] += count
+            self_counts[stack[-1]] += count
+            for code in set(stack):
+                total_counts[code] += count
+        busy = sum(busy_thread.values())
+
+        lines = [f'采样时长 {self.duration:.2f} s，间隔 {self.interval * 1000:.1f} ms，共 {self.samples} 次采样',
+                 '', '线程（忙碌样本 / 全部样本）:']
+        for thread, count in per_thread.most_common():
+            lines.append(f'  {thread:<32} {busy_thread[thread]:>7} / {count:<7} '
+                         f'{busy_thread[thread] / max(1, count):6.1%}')
+        for title, counts in (('自身耗时最多的函数（叶子帧，不含空闲等待）:', self_counts),
+                              ('累计耗时最多的函数（含调用的子函数）:', total_counts)):
+            lines += ['', title]
+            for code, count in counts.most_common(top):
+                lines.append(f'  {count / max(1, busy):6.1%} {count:>7}  {frame_label(code)}')
+        lines += ['', 'torch 算子耗时:']
+        if self.torch_note:
+            lines.append(f'  {self.torch_note}')
+        lines.append(self.torch_table if self.torch_table else '  无记录')
+        return lines
+
+    def write(self, out_dir, name=None):
+        """写出折叠栈文件与摘要，返回 {'collapsed': 路径, 'summary': 路径}"""
+        os.makedirs(out_dir, exist_ok=True)
+        name = name or 'profile_' + datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        paths = {'collapsed': os.path.join(out_dir, name + '.folded'),
+                 'summary': os.path.join(out_dir, name + '_summary.txt')}
+        with open(paths['collapsed'], 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        with open(paths['summary'], 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.summary()) + '\n')
+        return paths
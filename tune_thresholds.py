@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from counting import SPORT_CONFIG, DEFAULT_CONFIG_PATH, count_reps_grid, load_threshold_config, smooth_angles
+from for_detect.keypoint_store import read_csv_series
+from kinematics import joint_angles
+
+SIDE_MODES = ('avg', 'left', 'right')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Grid-search rep counting thresholds against ground-truth counts')
+    parser.add_argument('series', nargs='*', type=str,
+                        help='keypoint CSVs labelled as path=count, e.g. for_detect/data/squat/001.csv=12')
+    parser.add_argument('--labels', default=None, type=str,
+                        help='JSON file mapping CSV path to ground-truth count (paths relative to the file)')
+    parser.add_argument('--sport', default='dir', type=str,
+                        help='"squat", "pushup", "situp", or "dir" to use each CSV\'s parent directory name')
+    parser.add_argument('--config', default=DEFAULT_CONFIG_PATH, type=str, help='current thresholds file')
+    parser.add_argument('--angles', default=[60, 175, 5], nargs=3, type=int, metavar=('MIN', 'MAX', 'STEP'),
+                        help='enter/exit threshold range in degrees (inclusive)')
+    parser.add_argument('--min_reach', default=[1, 8], nargs=2, type=int, metavar=('MIN', 'MAX'),
+                        help='min_reach_frames range (inclusive)')
+    parser.add_argument('--sides', default=list(SIDE_MODES), nargs='+', choices=SIDE_MODES, help='side modes to try')
+    parser.add_argument('--mirrored', action='store_true',
+                        help='also try thresholds in the reverse direction of the configured ones')
+    parser.add_argument('--top', default=5, type=int, help='number of candidates to print per exercise')
+    parser.add_argument('--write', action='store_true', help='write the best settings to --config')
+    args = parser.parse_args()
+    return args
+
+
+def collect_labels(args):
+    """Return a list of (path, count) from positional path=count items and --labels"""
+    labels = []
+    if args.labels:
+        base = os.path.dirname(os.path.abspath(args.labels))
+        with open(args.labels, 'r', encoding='utf-8') as f:
+            for path, count in json.load(f).items():
+                labels.append((os.path.join(base, path), int(count)))
+    for item in args.series:
+        path, sep, count = item.rpartition('=')
+        if not sep:
+            raise SystemExit(f'missing ground-truth count for {item}, use path=count')
+        labels.append((path, int(count)))
+    return labels
+
+
+def side_series(points, sport_config, smoothing=0.3):
+    """Smoothed angle series for every side mode, shape (len(SIDE_MODES), N)"""
+    angles = joint_angles(points, [sport_config['left_points_idx'], sport_config['right_points_idx']])
+    raw = np.stack([angles.mean(axis=-1), angles[:, 0], angles[:, 1]])
+    return smooth_angles(raw, smoothing)
+
+
+def make_grid(args, sport_config):
+    """All (side, enter, exit, min_reach_frames) combinations, as flat parallel arrays
+
+    Only the configured direction is kept (enter > exit when maintaining > relaxing, otherwise
+    enter < exit), so the chosen thresholds never swap which posture counts as reached; --mirrored
+    keeps both directions.
+    """
+    lo, hi, step = args.angles
+    thresholds = np.arange(lo, hi + 1, step)
+    sides = np.array([SIDE_MODES.index(s) for s in args.sides])
+    reach = np.arange(args.min_reach[0], args.min_reach[1] + 1)
+    side, enter, exitv, min_reach = [g.ravel() for g in np.meshgrid(sides, thresholds, thresholds, reach,
+                                                                     indexing='ij')]
+    if args.mirrored:
+        keep = enter != exitv
+    elif sport_config['maintaining'] > sport_config['relaxing']:
+        keep = enter > exitv
+    else:
+        keep = enter < exitv
+    return {'side': side[keep], 'enter': enter[keep], 'exit': exitv[keep], 'min_reach': min_reach[keep]}
+
+
+def evaluate(series, grid, sport_config):
+    """Counts of every grid point on every series, shape (len(series), G)"""
+    counts = []
+    for points in series:
+        smoothed = side_series(points, sport_config)
+        counts.append(count_reps_grid(smoothed, grid['enter'], grid['exit'], grid['min_reach'], grid['side']))
+    return np.stack(counts)
+
+
+def rank(errors, grid, current_reach):
+    """Order grid points: lowest error, then widest hysteresis gap, then min_reach closest to the current one"""
+    gap = np.abs(grid['enter'] - grid['exit'])
+    return np.lexsort((np.abs(grid['min_reach'] - current_reach), grid['side'], -gap, errors))
+
+
+def describe(grid, i):
+    return (f"enter={int(grid['enter'][i])} exit={int(grid['exit'][i])} "
+            f"side={SIDE_MODES[grid['side'][i]]} min_reach_frames={int(grid['min_reach'][i])}")
+
+
+def main():
+    args = parse_args()
+    labels = collect_labels(args)
+    if not labels:
+        print('No labelled series, pass path=count items or --labels')
+        return
+
+    config = load_threshold_config(args.config)
+    current_reach = int(config.get('min_reach_frames', 3))
+
+    by_sport = {}
+    for path, count in labels:
+        sport = os.path.basename(os.path.dirname(os.path.abspath(path))) if args.sport == 'dir' else args.sport
+        if sport not in SPORT_CONFIG:
+            raise SystemExit(f'unknown sport for {path}: {sport}')
+        by_sport.setdefault(sport, []).append((path, count))
+
+    start = time.perf_counter()
+    results = {}
+    frames, settings = 0, 0
+    for sport, items in by_sport.items():
+        grid = make_grid(args, SPORT_CONFIG[sport])
+        settings += len(grid['enter'])
+        series = [read_csv_series(path) for path, _ in items]
+        frames += sum(len(points) for points in series)
+        truth = np.array([count for _, count in items])
+        counts = evaluate(series, grid, SPORT_CONFIG[sport])
+        errors = np.abs(counts - truth[:, None]).sum(axis=0)
+        cfg = SPORT_CONFIG[sport]
+        current = {'side': np.array([SIDE_MODES.index(cfg.get('side_mode', 'avg'))]),
+                   'enter': np.array([cfg['maintaining']]), 'exit': np.array([cfg['relaxing']]),
+                   'min_reach': np.array([current_reach])}
+        current_error = int(np.abs(evaluate(series, current, cfg)[:, 0] - truth).sum())
+        results[sport] = {'items': items, 'grid': grid, 'counts': counts, 'errors': errors, 'current_error': current_error}
+    elapsed = time.perf_counter() - start
+    print(f'Evaluated {settings} settings on {frames} frames in {elapsed:.2f} s')
+
+    # min_reach_frames is shared by all exercises, pick the value with the lowest total error
+    reach_values = np.arange(args.min_reach[0], args.min_reach[1] + 1)
+    totals = np.array([sum(r['errors'][r['grid']['min_reach'] == d].min() for r in results.values())
+                       for d in reach_values])
+    best_total = totals.min()
+    candidates = reach_values[totals == best_total]
+    best_reach = int(candidates[np.argmin(np.abs(candidates - current_reach))])
+
+    best = {}
+    for sport, r in results.items():
+        cfg, grid = SPORT_CONFIG[sport], r['grid']
+        order = rank(r['errors'], grid, current_reach)
+        print(f"\n{sport} ({cfg['name']}), {len(r['items'])} series, current: enter={cfg['maintaining']} "
+              f"exit={cfg['relaxing']} side={cfg.get('side_mode', 'avg')} min_reach_frames={current_reach} "
+              f"error={r['current_error']}")
+        for i in order[:args.top]:
+            print(f"  error={int(r['errors'][i])}  {describe(grid, i)}  counts={r['counts'][:, i].tolist()}")
+        shared = order[grid['min_reach'][order] == best_reach][0]
+        best[sport] = shared
+        print(f"  chosen (min_reach_frames={best_reach}): error={int(r['errors'][shared])}  {describe(grid, shared)}")
+        for (path, count), got in zip(r['items'], r['counts'][:, shared]):
+            print(f'    {path}: truth={count} counted={int(got)}')
+
+    if args.write:
+        for sport, i in best.items():
+            grid = results[sport]['grid']
+            config.setdefault('sports', {})[sport] = {
+                'maintaining': int(grid['enter'][i]),
+                'relaxing': int(grid['exit'][i]),
+                'side_mode': SIDE_MODES[grid['side'][i]],
+            }
+        config['min_reach_frames'] = best_reach
+        os.makedirs(os.path.dirname(os.path.abspath(args.config)), exist_ok=True)
+        with open(args.config, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        print(f'\nSaved to {args.config}')
+
+
+if __name__ == '__main__':
+    main()
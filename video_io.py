@@ -0,0 +1,213 @@
+"""
+视频输入输出工具
+Video I/O helpers
+独立采集线程与有界环形缓冲，避免推理阻塞导致画面滞后；
+后台编码线程与有界队列，避免录制拖慢处理循环
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+
+WRITER_POLICIES = ('block', 'drop', 'downscale')
+
+
+class FrameGrabber:
+    """独立采集线程：持续读取视频源并写入有界环形缓冲
+
+    - 实时模式（摄像头）：缓冲满时丢弃最旧帧，read() 总是返回最新帧，
+      被跳过的旧帧计入 frames_dropped，而不是排队等待推理
+    - 无损模式（视频文件）：缓冲满时采集线程等待，read() 按顺序逐帧返回
+    """
+
+    def __init__(self, cap, capacity=2, lossless=False):
+        self.cap = cap
+        self.capacity = max(1, int(capacity))
+        self.lossless = lossless
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.last_index = -1
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._eof = False
+        self._thread = None
+
+    def start(self):
+        """启动采集线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='frame-grabber', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        index = 0
+        while not self._stopped:
+            ret, frame = self.cap.read()
+            with self._cond:
+                if not ret:
+                    self._eof = True
+                    self._cond.notify_all()
+                    break
+                if self.lossless:
+                    # 无损：等待消费者取走帧，形成背压
+                    while len(self._buffer) >= self.capacity and not self._stopped:
+                        self._cond.wait(0.1)
+                elif len(self._buffer) >= self.capacity:
+                    # 实时：覆盖最旧帧
+                    self._buffer.popleft()
+                    self.frames_dropped += 1
+                self._buffer.append((index, frame))
+                self.frames_read += 1
+                index += 1
+                self._cond.notify_all()
+
+    def read(self, timeout=None):
+        """取一帧，返回 (ret, frame)，与 cv2.VideoCapture.read 保持一致"""
+        with self._cond:
+            while not self._buffer and not self._eof and not self._stopped:
+                if not self._cond.wait(timeout):
+                    break
+            if not self._buffer:
+                return False, None
+            if self.lossless:
+                index, frame = self._buffer.popleft()
+            else:
+                index, frame = self._buffer.pop()
+                # 仍在缓冲中的旧帧已过时，直接丢弃
+                self.frames_dropped += len(self._buffer)
+                self._buffer.clear()
+            self.last_index = index
+            self._cond.notify_all()
+            return True, frame
+
+    def is_alive(self):
+        """是否还有帧可读"""
+        with self._cond:
+            return bool(self._buffer) or not (self._eof or self._stopped)
+
+    def stop(self, timeout=1.0):
+        """停止采集线程（调用方随后负责释放 cap）"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def negotiate_resolution(cap, candidates):
+    """依次请求候选分辨率，返回摄像头实际接受的 (宽, 高)
+
+    摄像头可能忽略或就近调整请求的分辨率，因此以读回的实际值为准；
+    实际分辨率不超过某个候选时即接受
+    """
+    actual = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    for width, height in candidates:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        actual = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if actual[0] <= width and actual[1] <= height:
+            break
+    return actual
+
+
+def iter_frames(cap, lossless=True, capacity=8):
+    """在后台线程预解码，逐帧产出；生成器关闭时停止采集线程"""
+    grabber = FrameGrabber(cap, capacity=capacity, lossless=lossless).start()
+    try:
+        while grabber.is_alive():
+            ret, frame = grabber.read(timeout=0.5)
+            if ret:
+                yield frame
+    finally:
+        grabber.stop()
+
+
+class AsyncVideoWriter:
+    """后台编码的视频写入器，接口与 cv2.VideoWriter 的 write/release 一致
+
+    编码队列满时的策略：
+    - block：等待编码线程腾出位置，保留全部帧（处理循环会被拖慢）
+    - drop：丢弃当前帧并计数，处理循环不受影响
+    - downscale：按 downscale 比例缩小分辨率录制（编码开销约降为 1/4），
+      在编码线程中缩放，队列仍满时等待
+    写入的帧交给编码线程后不应再被修改
+    """
+
+    def __init__(self, path, fourcc, fps, size, capacity=32, policy='block', downscale=0.5):
+        if policy not in WRITER_POLICIES:
+            raise ValueError(f'unknown writer policy: {policy}')
+        self.policy = policy
+        width, height = size
+        if policy == 'downscale':
+            # 编码器要求偶数尺寸
+            width = max(2, int(width * downscale) // 2 * 2)
+            height = max(2, int(height * downscale) // 2 * 2)
+        self.size = (width, height)
+        self.writer = cv2.VideoWriter(path, fourcc, fps, self.size)
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.encode_seconds = 0.0
+        self.max_queued = 0
+
+        self._closed = False
+        self._queue = queue.Queue(maxsize=max(1, int(capacity)))
+        self._thread = threading.Thread(target=self._run, name='video-writer', daemon=True)
+        self._thread.start()
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def write(self, frame):
+        """投递一帧，返回是否进入编码队列"""
+        if self._closed:
+            return False
+        if self.policy == 'drop':
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                self.frames_dropped += 1
+                return False
+        else:
+            self._queue.put(frame)
+        self.max_queued = max(self.max_queued, self._queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            start = time.perf_counter()
+            if (frame.shape[1], frame.shape[0]) != self.size:
+                frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+            self.writer.write(frame)
+            self.encode_seconds += time.perf_counter() - start
+            self.frames_written += 1
+
+    def release(self, timeout=None):
+        """写完队列中剩余的帧后关闭文件，返回统计信息"""
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+        self.writer.release()
+        return self.stats()
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'size': list(self.size),
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'max_queued': self.max_queued,
+            'encode_seconds': round(self.encode_seconds, 3),
+            'encode_fps': round(self.frames_written / self.encode_seconds, 2) if self.encode_seconds > 0 else 0.0,
+        }